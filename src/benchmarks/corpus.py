@@ -0,0 +1,61 @@
+import os
+
+import numpy as np
+
+_SYLLABLES = ["ka", "lo", "mi", "ra", "te", "su", "no", "vi", "da", "pe", "zu", "ri", "sa", "to", "me", "ul"]
+
+
+def make_vocabulary(size: int, seed: int = 0) -> list[str]:
+    """
+    `size` distinct pseudo-words of 2-4 syllables.
+    """
+    rng = np.random.default_rng(seed)
+    words, seen = [], set()
+    while len(words) < size:
+        word = "".join(rng.choice(_SYLLABLES, size=int(rng.integers(2, 5))))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def make_corpus(directory: str, num_docs: int = 200, words_per_doc: int = 2000, vocab_size: int = 20_000,
+                seed: int = 0) -> list[str]:
+    """
+    Write num_docs .txt files of Zipf-distributed words in 8-20 word
+    sentences. Same arguments, same files. Returns the file paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    vocab = np.array(make_vocabulary(vocab_size, seed))
+    # Zipf-like word frequencies, like natural text
+    weights = 1.0 / np.arange(1, vocab_size + 1)
+    weights /= weights.sum()
+
+    paths = []
+    for d in range(num_docs):
+        words = vocab[rng.choice(vocab_size, size=words_per_doc, p=weights)]
+        sentences, pos = [], 0
+        while pos < len(words):
+            n = int(rng.integers(8, 21))
+            sentence = " ".join(words[pos:pos + n])
+            sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+            pos += n
+        path = os.path.join(directory, f"doc_{d:05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(" ".join(sentences))
+        paths.append(path)
+    return paths
+
+
+def sample_queries(paths: list[str], num_queries: int = 200, seed: int = 0) -> list[str]:
+    """
+    Random sentences from the corpus, used as search / RAG questions.
+    """
+    rng = np.random.default_rng(seed + 1)
+    queries = []
+    for i in rng.choice(len(paths), size=num_queries, replace=True):
+        with open(paths[i], "r", encoding="utf-8") as f:
+            sentences = f.read().split(". ")
+        queries.append(sentences[int(rng.integers(len(sentences)))].rstrip("."))
+    return queries
@@ -0,0 +1,74 @@
+import re
+import zlib
+
+import numpy as np
+
+from inference.context import pack_context
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class FakeEmbeddingModel:
+    """
+    Deterministic stand-in for EmbeddingModel: hashed bag-of-words vectors,
+    so texts sharing words land close together and results are the same on
+    every run. No model files needed. Same methods as EmbeddingModel.
+    """
+
+    def __init__(self, model_name: str = "bench/fake-hash-embedder", dim: int = 384):
+        self.model_name = model_name
+        self.dim = dim
+        self._buckets = {}      # word -> (bucket, sign)
+
+    def _bucket(self, word: str):
+        hit = self._buckets.get(word)
+        if hit is None:
+            h = zlib.crc32(word.encode("utf-8"))
+            hit = self._buckets[word] = (h % self.dim, 1.0 if (h >> 16) & 1 else -1.0)
+        return hit
+
+    def embed_texts(self, texts: list[str], use_cache: bool = True) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in _WORD_RE.findall(text.lower()):
+                bucket, sign = self._bucket(word)
+                out[row, bucket] += sign
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+    def embed_queries(self, queries: list[str]) -> np.ndarray:
+        return self.embed_texts(queries)
+
+    def embed_query(self, query: str) -> np.ndarray:
+        return self.embed_texts([query])[0]
+
+
+class FakeLLM:
+    """
+    Stand-in for inference.local_llm.LLM: packs the context the same way
+    (whitespace tokens) and "answers" with the first words of the best
+    chunk, so RAG timings cover everything except the model itself.
+    """
+
+    def __init__(self, n_ctx: int = 4096, max_new_tokens: int = 200):
+        self.n_ctx = n_ctx
+        self.max_new_tokens = max_new_tokens
+        self.last_context_report = None
+
+    def count_tokens(self, text: str) -> int:
+        return len(text.split())
+
+    def stream(self, question, chunks, max_new_tokens=None, timings: dict = None):
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        budget = self.n_ctx - max_new_tokens - self.count_tokens(question)
+        packed, self.last_context_report = pack_context(question, chunks, self.count_tokens, max(budget, 0))
+        words = packed[0]["text"].split()[:max_new_tokens] if packed else ["I", "don't", "know."]
+        for word in words:
+            yield word + " "
+        if timings is not None:
+            timings.update(prompt_tokens=self.last_context_report["used_tokens"] + self.count_tokens(question),
+                           completion_tokens=len(words), queue_s=0.0, prefill_s=0.0, decode_s=0.0)
+
+    def generate(self, question, chunks, max_new_tokens=None, timings: dict = None):
+        return "".join(self.stream(question, chunks, max_new_tokens, timings)).strip()
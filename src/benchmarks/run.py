@@ -0,0 +1,292 @@
+"""
+Offline performance benchmark: synthetic corpus, fake embedder + LLM, no
+model files. Times every ingest stage, index save / load, search latency,
+recall against exact flat search and RAG overhead, and writes the numbers
+as JSON so two commits can be compared.
+
+Run from the project root:
+    PYTHONPATH=src python -m benchmarks.run --docs 200 --words 2000 --out bench_results.json
+    PYTHONPATH=src python -m benchmarks.run --index-type hnsw --compare bench_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import faiss
+import numpy as np
+
+from benchmarks.corpus import make_corpus, sample_queries
+from benchmarks.fakes import FakeEmbeddingModel, FakeLLM
+from ingestion.chunker import chunk_stream
+from ingestion.parallel import ingest_paths_parallel
+from ingestion.text_loader import load_text
+from storage.faiss_store import FaissStore, INDEX_TYPES
+from storage.versioned_store import VersionedStore
+
+# metric name suffixes compared by --compare; other fields (counts, sizes) are context
+LOWER_IS_BETTER = ("seconds_s", "_ms")
+HIGHER_IS_BETTER = ("_per_s", "_qps")
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Keep per-file progress prints out of the timings and the report."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _percentiles(seconds: list[float]) -> dict:
+    ms = np.array(seconds) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "mean_ms": round(float(ms.mean()), 4),
+    }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(workdir: str, num_docs: int = 200, words_per_doc: int = 2000, dim: int = 384,
+                  index_type: str = "flat", num_queries: int = 200, k: int = 10, batch_size: int = 256,
+                  seed: int = 0, parallel: bool = True, publish_every: float = 1.0) -> dict:
+    """
+    Runs every stage inside workdir and returns the results dict.
+    """
+    embedder = FakeEmbeddingModel(dim=dim)
+    results = {}
+
+    paths = make_corpus(os.path.join(workdir, "corpus"), num_docs, words_per_doc, seed=seed)
+    corpus_bytes = sum(os.path.getsize(p) for p in paths)
+
+    # ----- ingest stages, one at a time -----
+    t0 = time.perf_counter()
+    texts = [load_text(p) for p in paths]
+    t = time.perf_counter() - t0
+    results["load_text"] = {"seconds_s": round(t, 4), "files_per_s": round(len(paths) / t, 2),
+                            "mb_per_s": round(corpus_bytes / t / 1e6, 2)}
+
+    t0 = time.perf_counter()
+    chunked = [[c for c, _ in chunk_stream([text])] for text in texts]
+    t = time.perf_counter() - t0
+    num_chunks = sum(len(c) for c in chunked)
+    results["chunk_text"] = {"seconds_s": round(t, 4), "chunks": num_chunks,
+                             "chunks_per_s": round(num_chunks / t, 2)}
+
+    flat_chunks = [c for doc in chunked for c in doc]
+    t0 = time.perf_counter()
+    vectors = np.vstack([embedder.embed_texts(flat_chunks[i:i + batch_size])
+                         for i in range(0, len(flat_chunks), batch_size)])
+    t = time.perf_counter() - t0
+    results["embed_texts"] = {"seconds_s": round(t, 4), "chunks_per_s": round(num_chunks / t, 2)}
+
+    index_path = os.path.join(workdir, "index", "bench.faiss")
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    store = FaissStore(dim, index_path=index_path, model_name=embedder.model_name, index_type=index_type)
+    pos = 0
+    t0 = time.perf_counter()
+    with _quiet():
+        for path, chunks in zip(paths, chunked):
+            store.add_vectors(vectors[pos:pos + len(chunks)], chunks, file_path=path, embedder_model=embedder.model_name)
+            pos += len(chunks)
+    t = time.perf_counter() - t0
+    results["add_vectors"] = {"seconds_s": round(t, 4), "vectors_per_s": round(num_chunks / t, 2)}
+
+    t0 = time.perf_counter()
+    with _quiet():
+        store.save_index(compact=True)
+    t = time.perf_counter() - t0
+    index_bytes = sum(os.path.getsize(os.path.join(os.path.dirname(index_path), f))
+                      for f in os.listdir(os.path.dirname(index_path)))
+    results["save_index"] = {"seconds_s": round(t, 4), "disk_mb": round(index_bytes / 1e6, 2)}
+
+    t0 = time.perf_counter()
+    with _quiet():
+        store = FaissStore(dim, index_path=index_path, model_name=embedder.model_name, index_type=index_type)
+    results["load_index"] = {"seconds_s": round(time.perf_counter() - t0, 4), "vectors": store.ntotal}
+
+    # ----- search -----
+    queries = sample_queries(paths, num_queries, seed)
+    query_vectors = embedder.embed_queries(queries)
+
+    times = []
+    for q in query_vectors:
+        t0 = time.perf_counter()
+        store.search_vectors(q.copy(), k=k)
+        times.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    store.search_many_vectors(query_vectors.copy(), k=k)
+    t = time.perf_counter() - t0
+    results["search_vectors"] = {**_percentiles(times), "batch_qps": round(len(queries) / t, 2)}
+
+    times = []
+    for q in queries:
+        t0 = time.perf_counter()
+        store.search_lexical(q, k=k)
+        times.append(time.perf_counter() - t0)
+    results["search_lexical"] = _percentiles(times)
+
+    # recall of the index itself (no score thresholds) against exact flat search
+    ids, all_vectors = store.get_all_vectors()
+    q = np.ascontiguousarray(query_vectors, dtype=np.float32)
+    faiss.normalize_L2(q)
+    truth = ids[np.argsort(-(q @ all_vectors.T), axis=1, kind="stable")[:, :k]]
+    _, found = store.index.search(q, k)
+    hits = sum(len(set(f[f >= 0]) & set(t)) for f, t in zip(found, truth))
+    results["recall"] = {f"recall_at_{k}": round(hits / truth.size, 4)}
+
+    # ----- RAG overhead: embed + search + context packing, fake generation -----
+    llm = FakeLLM()
+    times = []
+    for question in queries:
+        t0 = time.perf_counter()
+        chunks = store.search_vectors(embedder.embed_query(question), k=5)
+        llm.generate(question, chunks)
+        times.append(time.perf_counter() - t0)
+    results["rag"] = _percentiles(times)
+
+    # ----- search latency while a writer thread ingests and publishes snapshots -----
+    live_path = os.path.join(workdir, "index", "live.faiss")
+    with _quiet():
+        live = FaissStore(dim, index_path=live_path, model_name=embedder.model_name, index_type=index_type)
+        half = len(paths) // 2
+        pos = sum(len(c) for c in chunked[:half])
+        live.add_vectors(vectors[:pos], [c for doc in chunked[:half] for c in doc],
+                         file_path=paths[0], embedder_model=embedder.model_name)
+        versions = VersionedStore(live, publish_every=publish_every)
+
+    def write():
+        start = pos
+        for path, chunks in zip(paths[half:], chunked[half:]):
+            live.add_vectors(vectors[start:start + len(chunks)], chunks, file_path=path,
+                             embedder_model=embedder.model_name)
+            start += len(chunks)
+            versions.maybe_publish()
+
+    times = []
+    with _quiet():
+        writer = threading.Thread(target=write)
+        writer.start()
+        while writer.is_alive():
+            for q in query_vectors:
+                t0 = time.perf_counter()
+                versions.current().search_vectors(q.copy(), k=k)
+                times.append(time.perf_counter() - t0)
+        writer.join()
+        versions.close()
+    results["search_during_ingest"] = {**_percentiles(times), "publishes": versions.version}
+
+    # ----- the real staged ingest (process pool + batching) end to end -----
+    if parallel:
+        pipeline_path = os.path.join(workdir, "index", "pipeline.faiss")
+        pipeline_store = FaissStore(dim, index_path=pipeline_path, model_name=embedder.model_name, index_type=index_type)
+        with _quiet():
+            stats = ingest_paths_parallel(paths, pipeline_store, embedder, batch_size=batch_size, report_every=1e9)
+            pipeline_store.save_index()
+        s = stats.to_dict()
+        results["ingest_pipeline"] = {"seconds_s": round(s["seconds"], 4), "files_per_s": round(s["files_per_s"], 2),
+                                      "chunks_per_s": round(s["chunks_per_s"], 2), "failed": len(s["failed"]),
+                                      "dedup_ratio": round(s["dedup_ratio"], 4)}
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "faiss": getattr(faiss, "__version__", None),
+            "cpus": os.cpu_count(),
+        },
+        "params": {
+            "docs": num_docs, "words_per_doc": words_per_doc, "dim": dim, "index_type": index_type,
+            "queries": num_queries, "k": k, "batch_size": batch_size, "seed": seed, "publish_every": publish_every,
+            "corpus_mb": round(corpus_bytes / 1e6, 2), "chunks": num_chunks,
+        },
+        "results": results,
+    }
+
+
+def compare(current: dict, baseline: dict) -> list[dict]:
+    """
+    Per-metric change against an earlier results file. `better` is True
+    when the metric moved in the right direction.
+    """
+    if current["params"] != baseline["params"]:
+        print("[Bench] Warning: parameters differ from the baseline, numbers are not directly comparable.")
+    rows = []
+    for stage, metrics in current["results"].items():
+        for name, value in metrics.items():
+            old = baseline.get("results", {}).get(stage, {}).get(name)
+            lower = name.endswith(LOWER_IS_BETTER)
+            if not (lower or name.endswith(HIGHER_IS_BETTER) or name.startswith("recall_at_")):
+                continue
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or old == 0:
+                continue
+            change = (value - old) / old
+            rows.append({"stage": stage, "metric": name, "baseline": old, "current": value,
+                         "change": round(change, 4), "better": change < 0 if lower else change > 0})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Lura performance benchmark")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--words", type=int, default=2000, help="words per document")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-parallel", action="store_true", help="skip the process-pool ingest stage")
+    parser.add_argument("--publish-every", type=float, default=1.0,
+                        help="snapshot interval (s) while searching during ingest")
+    parser.add_argument("--out", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    parser.add_argument("--keep", action="store_true", help="keep the generated corpus and index")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="lura-bench-")
+    try:
+        report = run_benchmark(workdir, args.docs, args.words, args.dim, args.index_type, args.queries,
+                               args.k, args.batch_size, args.seed, parallel=not args.no_parallel,
+                               publish_every=args.publish_every)
+    finally:
+        if args.keep:
+            print(f"[Bench] Corpus and index kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    p = report["params"]
+    print(f"\n[Bench] {p['docs']} docs, {p['chunks']} chunks, {p['corpus_mb']} MB, {p['index_type']} index, dim {p['dim']}\n")
+    for stage, metrics in report["results"].items():
+        print(f"  {stage:<16} " + "  ".join(f"{name}={value}" for name, value in metrics.items()))
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n[Bench] Against {args.compare} (commit {baseline.get('meta', {}).get('commit')})\n")
+        for r in compare(report, baseline):
+            mark = "+" if r["better"] else "-"
+            print(f"  {mark} {r['stage'] + '.' + r['metric']:<36} {r['baseline']:>12} -> {r['current']:<12} ({r['change']:+.1%})")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n[Bench] Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
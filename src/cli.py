@@ -1,14 +1,102 @@
-from encoder.embedder import EmbeddingModel
-from ingestion.text_loader import load_text
-from ingestion.chunker import chunk_text
-from storage.faiss_store import FaissStore
-from pipeline.retrieve import Retriever
+import argparse
+import json
 import os
-from InquirerPy import inquirer
-from rich.console import Console
+import sys
 
+# Heavy modules (sentence_transformers / torch, faiss, llama_cpp, InquirerPy, rich)
+# are imported inside the functions that need them, so scripted calls like
+# `python src/cli.py stats` start in a fraction of a second.
 
 MODEL_NAME = 'sentence-transformers/all-MiniLM-L12-v2'
+# same as storage.faiss_store.INDEX_PATH (not imported here: it pulls in faiss)
+INDEX_PATH = 'src/faiss/vector_index.faiss'
+
+_embedder = None
+
+
+def get_embedder():
+    """
+    One EmbeddingModel per process, shared by every ingest / sync in the menu.
+    """
+    global _embedder
+    if _embedder is None:
+        from encoder.embedder import EmbeddingModel
+        _embedder = EmbeddingModel()
+    return _embedder
+
+
+def index_changed():
+    """
+    Drop state built on the old index: the warm Retriever and cached RAG answers.
+    Only touches modules that are already loaded.
+    """
+    if "pipeline.retrieve" in sys.modules:
+        sys.modules["pipeline.retrieve"].Retriever._instance = None
+    if "pipeline.answer_cache" in sys.modules:
+        sys.modules["pipeline.answer_cache"].get_answer_cache().invalidate()
+
+
+def read_index_header(index_path: str = INDEX_PATH) -> dict:
+    """
+    Index stats from the .meta header and file sizes only: no vectors,
+    chunk text or models are loaded. Returns None if there is no index.
+    """
+    meta_path = index_path + ".meta"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+
+    files = {}
+    for suffix in ("", ".log", ".db", ".bm25"):
+        path = index_path + suffix
+        if os.path.exists(path):
+            files[os.path.basename(path)] = os.path.getsize(path)
+    return {
+        "index_path": index_path,
+        "embedding_model": meta.get("embedding_model"),
+        "dim": meta.get("dim"),
+        "index_type": meta.get("index_type", "flat"),
+        # index.ntotal at save time: already includes the vectors appended to the log
+        "vectors": meta.get("count", 0),
+        "next_id": meta.get("next_id"),
+        "generation": meta.get("generation"),
+        "files_bytes": files,
+    }
+
+
+def print_stats(index_path: str = INDEX_PATH, as_json: bool = False):
+    header = read_index_header(index_path)
+    if as_json:
+        print(json.dumps(header))
+        return
+    if header is None:
+        print(f"No index at {index_path}.")
+        return
+    print("\nIndex Stats\n")
+    print("  Embedding model:", header["embedding_model"])
+    print("  Vector dimension:", header["dim"])
+    print("  Vectors indexed:", header["vectors"])
+    print("  Index type:", header["index_type"])
+    print("  FAISS index path:", header["index_path"])
+    print("  Size on disk: %.1f MB" % (sum(header["files_bytes"].values()) / 1e6))
+
+    from telemetry import tracing
+    if tracing.enabled():
+        print("\nStage timings (this session)\n")
+        for name, st in tracing.stats().items():
+            extra = f", {st['tokens_per_s']} tokens/s" if "tokens_per_s" in st else ""
+            print(f"  {name:<18} {st['count']:>6} calls  p50 {st['p50_ms']:>9} ms  p99 {st['p99_ms']:>9} ms{extra}")
+
+
+def reset_index(index_path: str = INDEX_PATH):
+    if not os.path.exists(index_path):
+        print(f"No index at {index_path}, nothing to reset.")
+        return
+    from storage.faiss_store import FaissStore
+    FaissStore.reset_index(index_path=index_path, model_name=MODEL_NAME)
+    index_changed()
+
 class MetaData:
     def __init__(self,file_path=None,texts=None,chunks=None,vectors=None):
         self.file_path = file_path
@@ -28,58 +116,112 @@ class MetaData:
             "total_chars": self.total_chars
         }
 
-def ingest_directory(folder_path: str):
+def ingest_directory(folder_path: str, workers: int = None, dedup: bool = True):
+    from ingestion.jobs import start_job
+    from storage.faiss_store import FaissStore
 
     fs = FaissStore()
-    embedder = EmbeddingModel()
+    embedder = get_embedder()
 
-    supported_extensions = {".txt", ".md", ".pdf", ".docx"}
+    # load + chunk in a process pool, embed in cross-file batches; runs as a
+    # job that saves checkpoints, so a crash can be resumed by job id
+    start_job(folder_path, fs, embedder, workers=workers, dedup=dedup)
 
-    all_files = []
-    for root, _, files in os.walk(folder_path):
-        for file in files:
-            all_files.append(os.path.join(root, file))
+    if embedder.cache:
+        embedder.cache.report()
+    print("\n>>> Directory ingestion complete.\n")
 
-    print(f"[Scan] Found {len(all_files)} files.")
 
-    for path in all_files:
-        ext = os.path.splitext(path)[1].lower()
-        if ext not in supported_extensions:
-            continue
+def resume_job_cli(job_id: str, workers: int = None, retry_failed: bool = False):
+    from ingestion.jobs import resume_job
+    from storage.faiss_store import FaissStore
 
-        try:
-            text = load_text(path)
-        except:
-            continue
+    fs = FaissStore()
+    embedder = get_embedder()
+    resume_job(job_id, fs, embedder, workers=workers, retry_failed=retry_failed)
+    if embedder.cache:
+        embedder.cache.report()
+    print("\n>>> Directory ingestion complete.\n")
 
-        chunks = chunk_text(text)
 
-        vectors = embedder.model.encode(chunks, show_progress_bar=True)
+def show_jobs(job_id: str = None, index_path: str = INDEX_PATH):
+    from ingestion.jobs import job_summary, print_summary, print_jobs
+    from storage.job_store import JobStore
 
-        fs.add_vectors(vectors, chunks, file_path=path, embedder_model=embedder.model_name)
+    jobs = JobStore(index_path + ".db")
+    if job_id is None:
+        print_jobs(jobs)
+    elif jobs.get(job_id) is None:
+        print(f"No ingest job {job_id!r}.")
+    else:
+        print_summary(job_summary(jobs, job_id))
+    jobs.close()
 
-    fs.save_index()
-    print("\n>>> Directory ingestion complete.\n")
 
+def sync_directory_cli(folder_path: str, workers: int = None, dedup: bool = True):
+    from ingestion.sync import sync_directory
+    from storage.faiss_store import FaissStore
+
+    fs = FaissStore()
+    embedder = get_embedder()
+    sync_directory(folder_path, fs, embedder, workers=workers, dedup=dedup)
+    if embedder.cache:
+        embedder.cache.report()
+    print("\n>>> Directory sync complete.\n")
+
+
+def ingest_file(path:str, batch_size:int = 256, dedup: bool = True):
+    from ingestion.chunker import chunk_stream
+    from ingestion.text_loader import iter_text
+    from storage.faiss_store import FaissStore
+
+    embeds = None
+    fs = None
+    total = 0
+    duplicates = 0
+    batch, offsets = [], []
+
+    def flush():
+        nonlocal duplicates
+        texts, spans, keys = batch, offsets, None
+        if dedup:
+            keep, keys = fs.dedup_chunks(batch, file_path=path, offsets=offsets)
+            duplicates += len(batch) - len(keep)
+            texts, spans = [batch[i] for i in keep], [offsets[i] for i in keep]
+        if texts:
+            vectors = embeds.embed_texts(texts)
+            fs.add_vectors(vectors,texts,file_path=path,embedder_model=embeds.model_name,offsets=spans,dedup_keys=keys)
+
+    # stream the document: only one batch of chunks is held at a time
+    for chunk, span in chunk_stream(iter_text(path)):
+        if embeds is None:
+            embeds = get_embedder()
+            fs = FaissStore()
+        batch.append(chunk)
+        offsets.append(span)
+        if len(batch) >= batch_size:
+            flush()
+            total += len(batch)
+            batch, offsets = [], []
+
+    if batch:
+        flush()
+        total += len(batch)
 
-def ingest_file(path:str):
-    texts = load_text(path)
-    chunks = chunk_text(texts)
-    if not chunks or len(chunks) == 0:
+    if total == 0:
         print(f'[File Skipped] No text found in {path}')
         return
-    
-    embeds = EmbeddingModel()
-    vectors = embeds.embed_texts(chunks)
-    data = MetaData(path,texts,chunks,vectors)
-    fs = FaissStore()
-    # print(len(data.vectors),len(data.chunks))
-    # print(data.chunks)
-    fs.add_vectors(data.vectors,data.chunks,embedder_model=embeds.model_name)
+
     fs.save_index()
-    print(f"[OK] Ingested {path} — {len(chunks)} chunks")
+    print(f"[OK] Ingested {path} — {total} chunks ({duplicates} near-duplicates stored as sources)")
+
+def menu():
+    """
+    Interactive menu (python src/cli.py with no arguments).
+    """
+    from InquirerPy import inquirer
+    from rich.console import Console
 
-def main():
     try:
         console = Console()
         
@@ -105,7 +247,9 @@ def main():
                     "4. Run semantic search",
                     "5. Run RAG query",
                     "6. Show index stats",
-                    "7. Exit"
+                    "7. Rebuild index (flat / ivf / hnsw / sq8 / pq)",
+                    "8. Sync a directory (skip unchanged, drop deleted)",
+                    "9. Exit"
                 ],
                 default=None,
                 pointer=">",
@@ -119,21 +263,31 @@ def main():
                 file_path = input("Enter file path: ").strip()
                 
                 ingest_file(file_path)
+                index_changed()
         
             elif choice == "2":
                 folder = input("Enter directory path: ").strip()
                 ingest_directory(folder)
+                index_changed()
 
             elif choice == "3":
-                index_path = 'src/faiss/vector_index.faiss'
-                if os.path.exists(index_path):
-                    FaissStore.reset_index(index_path=index_path,model_name=MODEL_NAME)
-                    Retriever._instance = None
+                reset_index()
 
             elif choice == "4":
+                from pipeline.retrieve import Retriever, SEARCH_MODES
                 query = input("Enter your query: ").strip()
+                mode = inquirer.select(
+                    message="Search mode:",
+                    choices=list(SEARCH_MODES),
+                    pointer=">",
+                ).execute()
                 
-                result = Retriever().search(query)
+                scope = input("Only search paths starting with / matching (glob), blank = all: ").strip()
+                filters = None
+                if scope:
+                    filters = {"path_glob": scope} if any(ch in scope for ch in "*?[") else {"path_prefix": scope}
+                
+                result = Retriever().search(query, mode=mode, filters=filters)
                 
                 print("\n----- Query Response -----\n")
                 
@@ -151,12 +305,15 @@ def main():
 
             # LLM (RAG)
             elif choice == "5":
-                from pipeline.rag import run_rag
+                from pipeline.rag import stream_rag
                 question = input("Enter your question: ").strip()
                 console.print("\n[dim]Loading...[/]\n")
-                answer, chunks = run_rag(question)
+                tokens, chunks = stream_rag(question)
 
-                print('Answer:\n>',answer)
+                print('Answer:\n> ', end='', flush=True)
+                for token in tokens:
+                    print(token, end='', flush=True)
+                print()
                 input('\nPress Enter to see sources ')
                 print("\nSources:\n")
                 for i,c in enumerate(chunks,start=1):
@@ -166,15 +323,26 @@ def main():
             
                 # 6. Show index stats
             elif choice == "6":
+                print_stats()
+
+            elif choice == "7":
+                from storage.faiss_store import FaissStore, INDEX_TYPES
+                index_type = inquirer.select(
+                    message="Index type:",
+                    choices=list(INDEX_TYPES),
+                    pointer=">",
+                ).execute()
                 fs = FaissStore()
-                print("\nIndex Stats\n")
-                print("  Embedding model:", fs.model_name)
-                print("  Vector dimension:", fs.dim)
-                print("  Chunks indexed:", len(fs.documents))
-                print("  FAISS index path:", fs.index_path)
-            
+                fs.rebuild_index(index_type)
+                fs.save_index()
+                index_changed()
             
-            elif choice == "7":
+            elif choice == "8":
+                folder = input("Enter directory path: ").strip()
+                sync_directory_cli(folder)
+                index_changed()
+
+            elif choice == "9":
                 print("Shutting down operational workflow.")
                 # sys.exit(0)
                 return
@@ -186,5 +354,152 @@ def main():
     except KeyboardInterrupt as keyboardintp:
         print('\n[Ctrl + C pressed] Exiting...')
 
+
+def _filters(args) -> dict:
+    if args.prefix:
+        return {"path_prefix": args.prefix}
+    if args.glob:
+        return {"path_glob": args.glob}
+    return None
+
+
+def _print_results(results: list[dict]):
+    if not results:
+        print("No relevant results found.")
+        return
+    for i, r in enumerate(results):
+        print(f"[{i}] id:{r['id']} Score: {r['score']:.4f}  {r['doc_path']}")
+        print("    Text :", (r['text'].replace('\n', ' '))[:300])
+
+
+def cmd_ingest(args):
+    for path in args.paths:
+        if os.path.isdir(path):
+            ingest_directory(path, workers=args.workers, dedup=not args.no_dedup)
+        else:
+            ingest_file(path, dedup=not args.no_dedup)
+
+
+def cmd_resume(args):
+    resume_job_cli(args.job_id, workers=args.workers, retry_failed=args.retry_failed)
+
+
+def cmd_jobs(args):
+    show_jobs(args.job_id, args.index)
+
+
+def cmd_sync(args):
+    sync_directory_cli(args.folder, workers=args.workers, dedup=not args.no_dedup)
+
+
+def cmd_search(args):
+    from pipeline.retrieve import Retriever
+    retriever = Retriever(mode=args.mode)
+    if args.mmr_lambda is not None:
+        retriever.mmr_lambda = args.mmr_lambda
+    results = retriever.search(args.query, k=args.k, mode=args.mode, filters=_filters(args), diversify=not args.no_mmr)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False))
+    else:
+        _print_results(results)
+
+
+def cmd_ask(args):
+    if args.json:
+        from pipeline.rag import run_rag
+        answer, chunks = run_rag(args.question, k=args.k)
+        print(json.dumps({"answer": answer, "sources": chunks}, ensure_ascii=False))
+        return
+    from pipeline.rag import stream_rag
+    tokens, chunks = stream_rag(args.question, k=args.k)
+    print('Answer:\n> ', end='', flush=True)
+    for token in tokens:
+        print(token, end='', flush=True)
+    print("\n\nSources:\n")
+    _print_results(chunks)
+
+
+def cmd_batch(args):
+    from pipeline.batch_rag import run_batch
+    run_batch(args.questions, args.out, k=args.k, mode=args.mode, workers=args.workers, resume=args.resume)
+
+
+def cmd_stats(args):
+    print_stats(args.index, as_json=args.json)
+
+
+def cmd_reset(args):
+    reset_index(args.index)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cli.py", description="Lura: offline search and RAG. No command opens the interactive menu.")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("ingest", help="ingest files and/or directories")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--no-dedup", action="store_true", help="embed near-duplicate chunks again instead of folding them")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("resume", help="continue an interrupted directory ingest by job id")
+    p.add_argument("job_id")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--retry-failed", action="store_true", help="also try the files that failed again")
+    p.set_defaults(func=cmd_resume)
+
+    p = sub.add_parser("jobs", help="list ingest jobs, or show one job's status and failures")
+    p.add_argument("job_id", nargs="?")
+    p.add_argument("--index", default=INDEX_PATH)
+    p.set_defaults(func=cmd_jobs)
+
+    p = sub.add_parser("sync", help="ingest new / changed files, drop deleted ones")
+    p.add_argument("folder")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--no-dedup", action="store_true", help="embed near-duplicate chunks again instead of folding them")
+    p.set_defaults(func=cmd_sync)
+
+    p = sub.add_parser("search", help="semantic / keyword search")
+    p.add_argument("query")
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--mode", default="dense", choices=("dense", "hybrid", "lexical"))
+    p.add_argument("--prefix", default=None, help="only documents under this path")
+    p.add_argument("--glob", default=None, help="only documents matching this glob")
+    p.add_argument("--mmr-lambda", type=float, default=None, help="relevance vs. diversity, 0..1 (default 0.7)")
+    p.add_argument("--no-mmr", action="store_true", help="plain relevance order, near-duplicates included")
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_search)
+
+    p = sub.add_parser("ask", help="RAG question answering")
+    p.add_argument("question")
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--json", action="store_true", help="print {answer, sources} once done")
+    p.set_defaults(func=cmd_ask)
+
+    p = sub.add_parser("batch", help="answer a JSONL file of questions, with timings")
+    p.add_argument("questions")
+    p.add_argument("--out", default="answers.jsonl")
+    p.add_argument("--k", type=int, default=5)
+    p.add_argument("--mode", default=None, choices=("dense", "hybrid", "lexical"))
+    p.add_argument("--workers", type=int, default=1, help="threads sharing the one LLM")
+    p.add_argument("--resume", action="store_true", help="skip questions already answered in --out")
+    p.set_defaults(func=cmd_batch)
+
+    p = sub.add_parser("stats", help="index stats from the header (no vectors loaded)")
+    p.add_argument("--index", default=INDEX_PATH)
+    p.add_argument("--json", action="store_true")
+    p.set_defaults(func=cmd_stats)
+
+    p = sub.add_parser("reset", help="delete every vector and chunk")
+    p.add_argument("--index", default=INDEX_PATH)
+    p.set_defaults(func=cmd_reset)
+
+    args = parser.parse_args(argv)
+    if args.command is None:
+        menu()
+    else:
+        args.func(args)
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,289 @@
+"""
+Embedding backends for EmbeddingModel, all CPU:
+- torch      sentence-transformers in float32 (the reference, the default)
+- int8       the same model with every Linear layer dynamically quantized to int8
+- onnx       ONNX Runtime on an export of the model (<model dir>/onnx/model.onnx)
+- onnx-int8  ONNX Runtime on an int8 dynamically quantized copy of that export
+
+int8 / onnx backends must produce vectors close enough to the float32 model
+that they can share an index with it: validate() checks the cosine between
+both on sample chunks. autotune() picks the batch size and thread count with
+the best throughput on this machine.
+
+Compare backends on this machine:
+    PYTHONPATH=src python -m encoder.backends --backend all
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+DEFAULT_BATCH_SIZE = 32
+# 1 - cosine(backend vector, float32 vector) allowed on any sample text
+COSINE_TOLERANCE = 0.02
+# autotune / validation results, so they run once per model, backend and machine
+TUNING_PATH = "src/faiss/embedder_tuning.json"
+AUTOTUNE_BATCH_SIZES = (8, 16, 32, 64, 128)
+
+_SAMPLE = (
+    "The maintenance schedule lists every inspection the device needs during its service life. "
+    "Filters are replaced every six months, and the pump housing is checked for wear once a year. "
+    "If the pressure warning appears, switch the unit off, wait until it has cooled down and follow "
+    "the reset procedure described in section four. Warranty claims require the original invoice "
+    "and the serial number printed on the label next to the power connector. Error code E-104 means "
+    "the sensor cable is loose; error code E-221 points to a blocked intake. "
+)
+
+
+def sample_texts(n: int = 128) -> list[str]:
+    """
+    Chunk-like texts of mixed length (mostly full ~400 word chunks, some
+    short tails), the same on every run.
+    """
+    words = (_SAMPLE * 8).split()
+    rng = np.random.default_rng(0)
+    lengths = np.where(rng.random(n) < 0.8, 380, rng.integers(10, 380, n))
+    starts = rng.integers(0, len(words) - 380, n)
+    return [" ".join(words[s:s + n_words]) for s, n_words in zip(starts, lengths)]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class TorchBackend:
+    """
+    sentence-transformers in float32.
+    """
+
+    name = "torch"
+
+    def __init__(self, local_path: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(local_path, local_files_only=True)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: list[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, show_progress_bar=False,
+                                 convert_to_numpy=True, normalize_embeddings=True)
+
+    def set_threads(self, threads: int):
+        import torch
+        torch.set_num_threads(threads)
+
+
+class Int8Backend(TorchBackend):
+    """
+    Linear weights quantized to int8 once at load; activations are quantized
+    per batch. Most of a MiniLM / mpnet forward pass is Linear layers, so
+    this is usually 1.5-2.5x faster than float32 on AVX2 / VNNI CPUs.
+    """
+
+    name = "int8"
+
+    def __init__(self, local_path: str):
+        super().__init__(local_path)
+        import torch
+        self.model = torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+class OnnxBackend:
+    """
+    ONNX Runtime session over the model's transformer, with the pooling
+    from the sentence-transformers config (mean or CLS) and L2 norm done
+    in NumPy. The export (and the int8 copy) is written next to the model
+    on first use; that step needs torch, serving afterwards does not.
+    """
+
+    def __init__(self, local_path: str, quantized: bool = False):
+        from transformers import AutoTokenizer
+        self.name = "onnx-int8" if quantized else "onnx"
+        self.local_path = local_path
+        self.path = os.path.join(local_path, "onnx", "model_int8.onnx" if quantized else "model.onnx")
+        if not os.path.exists(self.path):
+            export_onnx(local_path, quantized=quantized)
+        self.tokenizer = AutoTokenizer.from_pretrained(local_path, local_files_only=True)
+        self.max_length, self.cls_pooling = _sentence_config(local_path)
+        self.threads = 0        # 0 = let ONNX Runtime decide
+        self._load_session()
+
+    def _load_session(self):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+        self._inputs = {i.name for i in self.session.get_inputs()}
+        self.dim = self.session.get_outputs()[0].shape[-1]
+
+    def encode(self, texts: list[str], batch_size: int = DEFAULT_BATCH_SIZE) -> np.ndarray:
+        out = []
+        for i in range(0, len(texts), batch_size):
+            enc = self.tokenizer(texts[i:i + batch_size], padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors="np")
+            hidden = self.session.run(None, {k: v.astype(np.int64) for k, v in enc.items() if k in self._inputs})[0]
+            if self.cls_pooling:
+                out.append(hidden[:, 0])
+            else:
+                mask = enc["attention_mask"][..., None].astype(np.float32)
+                out.append((hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9))
+        if not out:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return _normalize(np.vstack(out))
+
+    def set_threads(self, threads: int):
+        if threads != self.threads:
+            self.threads = threads
+            self._load_session()
+
+
+def _sentence_config(local_path: str):
+    """
+    (max sequence length, CLS pooling?) from the sentence-transformers files.
+    """
+    max_length, cls_pooling = 256, False
+    try:
+        with open(os.path.join(local_path, "sentence_bert_config.json"), "r", encoding="utf-8") as f:
+            max_length = json.load(f).get("max_seq_length", max_length)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(local_path, "1_Pooling", "config.json"), "r", encoding="utf-8") as f:
+            cls_pooling = bool(json.load(f).get("pooling_mode_cls_token"))
+    except (OSError, ValueError):
+        pass
+    return max_length, cls_pooling
+
+
+def export_onnx(local_path: str, quantized: bool = False):
+    """
+    Write <local_path>/onnx/model.onnx (and model_int8.onnx with quantized=True).
+    """
+    out_dir = os.path.join(local_path, "onnx")
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    os.makedirs(out_dir, exist_ok=True)
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        print(f"[EmbeddingModel] Exporting {local_path} to ONNX...")
+        model = AutoModel.from_pretrained(local_path, local_files_only=True).eval()
+        dummy = AutoTokenizer.from_pretrained(local_path, local_files_only=True)(["export"], return_tensors="pt")
+        # positional order of BertModel.forward and friends
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+        axes = {n: {0: "batch", 1: "sequence"} for n in names + ["last_hidden_state"]}
+        with torch.no_grad():
+            torch.onnx.export(model, tuple(dummy[n] for n in names), fp32_path + ".tmp", input_names=names,
+                              output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=14)
+        os.replace(fp32_path + ".tmp", fp32_path)
+
+    if quantized:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        int8_path = os.path.join(out_dir, "model_int8.onnx")
+        quantize_dynamic(fp32_path, int8_path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(int8_path + ".tmp", int8_path)
+
+
+def load_backend(name: str, local_path: str):
+    if name == "torch":
+        return TorchBackend(local_path)
+    if name == "int8":
+        return Int8Backend(local_path)
+    if name in ("onnx", "onnx-int8"):
+        return OnnxBackend(local_path, quantized=name == "onnx-int8")
+    raise ValueError(f"Unknown embedding backend '{name}'. Choose one of {BACKENDS}.")
+
+
+def autotune(backend, texts: list[str] = None, batch_sizes=AUTOTUNE_BATCH_SIZES, thread_counts=None) -> dict:
+    """
+    Time backend.encode over texts for every batch size x thread count and
+    leave the backend on the fastest thread count. Returns
+    {"batch_size", "threads", "texts_per_s", "runs": [...]}.
+    """
+    texts = texts or sample_texts()
+    cpus = os.cpu_count() or 1
+    thread_counts = thread_counts or sorted({1, max(1, cpus // 2), cpus})
+    runs = []
+    for threads in thread_counts:
+        backend.set_threads(threads)
+        backend.encode(texts[:batch_sizes[0]], batch_sizes[0])     # warm-up
+        for batch_size in batch_sizes:
+            t0 = time.perf_counter()
+            backend.encode(texts, batch_size)
+            runs.append({"threads": threads, "batch_size": batch_size,
+                         "texts_per_s": round(len(texts) / (time.perf_counter() - t0), 2)})
+    best = max(runs, key=lambda r: r["texts_per_s"])
+    backend.set_threads(best["threads"])
+    return {**best, "runs": runs}
+
+
+def validate(backend, reference, texts: list[str] = None, tolerance: float = COSINE_TOLERANCE) -> dict:
+    """
+    Cosine between backend and reference vectors for the same texts.
+    ok is False when any text drifts by more than tolerance.
+    """
+    texts = texts or sample_texts()
+    a = _normalize(backend.encode(texts))
+    b = _normalize(reference.encode(texts))
+    cosine = (a * b).sum(axis=1)
+    return {"min_cosine": round(float(cosine.min()), 5), "mean_cosine": round(float(cosine.mean()), 5),
+            "tolerance": tolerance, "ok": bool(1.0 - cosine.min() <= tolerance)}
+
+
+def _tuning_key(model_name: str, backend: str) -> str:
+    return f"{model_name}|{backend}|{os.cpu_count()}cpu"
+
+
+def load_tuning(model_name: str, backend: str, path: str = TUNING_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get(_tuning_key(model_name, backend), {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tuning(model_name: str, backend: str, entry: dict, path: str = TUNING_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[_tuning_key(model_name, backend)] = entry
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Autotune and validate embedding backends on this machine")
+    parser.add_argument("--backend", default="all", choices=BACKENDS + ("all",))
+    parser.add_argument("--model", default="sentence-transformers/all-MiniLM-L12-v2")
+    parser.add_argument("--texts", type=int, default=128, help="sample chunks per timing run")
+    parser.add_argument("--tolerance", type=float, default=COSINE_TOLERANCE)
+    args = parser.parse_args()
+
+    local_path = './models/embeddings/' + args.model.rstrip('/').split('/')[-1]
+    texts = sample_texts(args.texts)
+    reference = load_backend("torch", local_path)
+    for name in (BACKENDS if args.backend == "all" else (args.backend,)):
+        backend = reference if name == "torch" else load_backend(name, local_path)
+        tuned = autotune(backend, texts)
+        entry = {"batch_size": tuned["batch_size"], "threads": tuned["threads"], "texts_per_s": tuned["texts_per_s"]}
+        line = f"[Backends] {name:<10} {tuned['texts_per_s']:>8} texts/s  batch {tuned['batch_size']:>3}  threads {tuned['threads']:>2}"
+        if name != "torch":
+            entry["validation"] = validate(backend, reference, texts, args.tolerance)
+            v = entry["validation"]
+            line += f"  min cosine {v['min_cosine']} ({'ok' if v['ok'] else 'FAILS tolerance ' + str(args.tolerance)})"
+        save_tuning(args.model, name, entry)
+        print(line)
+    print(f"[Backends] Results saved to {TUNING_PATH}")
+
+
+if __name__ == "__main__":
+    main()
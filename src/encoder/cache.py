@@ -0,0 +1,170 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_PATH = "src/faiss/embedding_cache.db"
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    On-disk cache of (model name, chunk text hash) -> embedding vector.
+    Least-recently-used entries are evicted once max_entries is exceeded.
+    Kept separate from the index files so it survives reset_index.
+    """
+
+    def __init__(self, db_path: str = CACHE_PATH, max_entries: int = 1_000_000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " hash TEXT NOT NULL,"
+            " dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (model, hash))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self.conn.commit()
+        self._count = self.conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, hashes: list[str]) -> dict:
+        """
+        Returns {hash: vector} for the hashes present in the cache.
+        """
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            for i in range(0, len(unique), 900):    # SQLite host-parameter limit
+                part = unique[i:i + 900]
+                placeholders = ",".join("?" * len(part))
+                cur = self.conn.execute(
+                    f"SELECT hash, dim, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *part],
+                )
+                for h, dim, blob in cur:
+                    found[h] = np.frombuffer(blob, dtype=np.float32, count=dim)
+
+            if found:
+                now = time.time()
+                with self.conn:
+                    self.conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                        [(now, model, h) for h in found],
+                    )
+
+        hit = sum(1 for h in hashes if h in found)
+        self.hits += hit
+        self.misses += len(hashes) - hit
+        return found
+
+    def put_many(self, model: str, hashes: list[str], vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        now = time.time()
+        rows = [(model, h, int(v.shape[0]), v.tobytes(), now) for h, v in zip(hashes, vectors)]
+        with self._lock:
+            with self.conn:
+                before = self.conn.total_changes
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO embeddings (model, hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._count += self.conn.total_changes - before
+            self._evict()
+
+    def _evict(self):
+        excess = self._count - self.max_entries
+        if excess <= 0:
+            return
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                (excess,),
+            )
+        self._count -= excess
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._count,
+            "max_entries": self.max_entries,
+        }
+
+    def report(self):
+        s = self.stats()
+        print(f"[EmbeddingCache] {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.1%} hit rate), "
+              f"{s['entries']}/{s['max_entries']} entries")
+
+    def clear(self):
+        with self._lock:
+            with self.conn:
+                self.conn.execute("DELETE FROM embeddings")
+            self._count = 0
+
+    def close(self):
+        self.conn.close()
+
+
+class QueryEmbeddingLRU:
+    """
+    In-memory exact-match cache of query string -> embedding, for repeated
+    questions. Queries are not written to the on-disk chunk cache.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query: str):
+        with self._lock:
+            vec = self._entries.get(query)
+            if vec is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(query)
+            self.hits += 1
+            return vec
+
+    def put(self, query: str, vector: np.ndarray):
+        vector = np.array(vector, dtype=np.float32)     # own copy: callers normalize in place
+        with self._lock:
+            self._entries[query] = vector
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
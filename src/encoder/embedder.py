@@ -1,36 +1,154 @@
 
-from sentence_transformers import SentenceTransformer
+import os
+
 import numpy as np
 
+from encoder.backends import (DEFAULT_BATCH_SIZE, COSINE_TOLERANCE, load_backend, autotune as run_autotune,
+                              validate as run_validate, load_tuning, save_tuning)
+from encoder.cache import EmbeddingCache, QueryEmbeddingLRU, CACHE_PATH, text_hash
+from telemetry.tracing import traced, annotate
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() in ("1", "true", "on", "yes")
+
+
 class EmbeddingModel:
     """
     Handles embedding generation for text using a local model.
+    backend picks the runtime (see encoder/backends.py; default "torch",
+    or LURA_EMBED_BACKEND). autotune=True (or LURA_EMBED_AUTOTUNE=1) picks
+    batch size and thread count by measurement once per machine; int8 /
+    onnx backends are checked once against the float32 model and refused
+    if their vectors drift more than COSINE_TOLERANCE.
     """
 
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L12-v2"):
+    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L12-v2",
+                 cache_path: str = CACHE_PATH, cache_size: int = 1_000_000, query_cache_size: int = 10_000,
+                 backend: str = None, batch_size: int = None, threads: int = None, sort_by_length: bool = True,
+                 autotune: bool = None, validate: bool = True):
+        backend = backend or os.environ.get("LURA_EMBED_BACKEND", "torch")
         # Load the model locally (no API calls)
-        print(f"[EmbeddingModel] Loading model: {model_name}")
-        local_path = './models/embeddings/all-MiniLM-L12-v2'
-        self.model = SentenceTransformer(local_path,local_files_only=True)
+        print(f"[EmbeddingModel] Loading model: {model_name} ({backend})")
+        # models/embeddings/<last part of the model name>, e.g. all-MiniLM-L12-v2
+        self.local_path = './models/embeddings/' + model_name.rstrip('/').split('/')[-1]
+        self.backend = load_backend(backend, self.local_path)
         self.model_name = model_name
-        self.dim = self.model.get_sentence_embedding_dimension()
+        self.dim = self.backend.dim
+        # quantized / onnx vectors differ slightly from torch ones: cache them apart
+        self.cache_key = model_name if self.backend.name == "torch" else f"{model_name}:{self.backend.name}"
+        # sorting a call's texts by length keeps short chunks out of batches padded to long ones
+        self.sort_by_length = sort_by_length
+        # cache_path=None turns the on-disk embedding cache off
+        self.cache = EmbeddingCache(cache_path, max_entries=cache_size) if cache_path else None
+        self.query_cache = QueryEmbeddingLRU(query_cache_size) if query_cache_size else None
+
+        tuning = load_tuning(model_name, backend)
+        if validate and backend != "torch":
+            self._check_against_reference(tuning)
+        if autotune is None:
+            autotune = _env_flag("LURA_EMBED_AUTOTUNE")
+        if autotune:
+            self._autotune(tuning)
+        self.batch_size = batch_size or tuning.get("batch_size") or DEFAULT_BATCH_SIZE
+        threads = threads or tuning.get("threads")
+        if threads:
+            self.backend.set_threads(threads)
 
-    def embed_texts(self, texts: list[str]) -> np.ndarray:
+    def _check_against_reference(self, tuning: dict):
+        """
+        Once per model / backend / machine: embed sample chunks with this
+        backend and the float32 model and compare.
+        """
+        result = tuning.get("validation")
+        if result is None:
+            reference = load_backend("torch", self.local_path)
+            result = run_validate(self.backend, reference, tolerance=COSINE_TOLERANCE)
+            del reference
+            tuning["validation"] = result
+            save_tuning(self.model_name, self.backend.name, tuning)
+        print(f"[EmbeddingModel] {self.backend.name} vs float32: min cosine {result['min_cosine']}, "
+              f"mean {result['mean_cosine']} (tolerance {result['tolerance']})")
+        if not result["ok"]:
+            raise ValueError(
+                f"\n[ERROR] The {self.backend.name} backend drifts too far from {self.model_name} in float32 "
+                f"(min cosine {result['min_cosine']}).\n"
+                f"Its vectors would not match the ones already in the index. Use backend='torch'.\n"
+            )
+
+    def _autotune(self, tuning: dict):
+        if "batch_size" in tuning:
+            return
+        print(f"[EmbeddingModel] Autotuning batch size / threads for {self.backend.name}...")
+        best = run_autotune(self.backend)
+        tuning.update(batch_size=best["batch_size"], threads=best["threads"], texts_per_s=best["texts_per_s"])
+        save_tuning(self.model_name, self.backend.name, tuning)
+        print(f"[EmbeddingModel] Batch size {best['batch_size']}, {best['threads']} threads: {best['texts_per_s']} texts/s")
+
+    @traced("embed_texts")
+    def embed_texts(self, texts: list[str], use_cache: bool = True) -> np.ndarray:
         """
         Takes a list of strings and returns a NumPy array of embeddings.
+        Chunks already embedded by this model and backend are read from the cache.
         """
-        embeddings = self.model.encode(
-            texts,
-            show_progress_bar=False,
-            convert_to_numpy=True,
-            normalize_embeddings=True
-        )
+        annotate(texts=len(texts))
+        if not use_cache or self.cache is None or not texts:
+            return self._encode(texts)
+
+        hashes = [text_hash(t) for t in texts]
+        cached = self.cache.get_many(self.cache_key, hashes)
+
+        missing = [i for i, h in enumerate(hashes) if h not in cached]
+        annotate(cache_hits=len(texts) - len(missing))
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        if missing:
+            fresh = self._encode([texts[i] for i in missing])
+            embeddings[missing] = fresh
+            self.cache.put_many(self.cache_key, [hashes[i] for i in missing], fresh)
+
+        for i, h in enumerate(hashes):
+            if h in cached:
+                embeddings[i] = cached[h]
+        return embeddings
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        if not self.sort_by_length or len(texts) <= 1:
+            return self.backend.encode(texts, self.batch_size)
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.dim), dtype=np.float32)
+        embeddings[order] = self.backend.encode([texts[i] for i in order], self.batch_size)
         return embeddings
 
     def embed_query(self, query: str) -> np.ndarray:
         """
         Embeds a single query string for vector search.
         """
-        return self.embed_texts([query])
+        return self.embed_queries([query])
+
+    @traced("embed_queries")
+    def embed_queries(self, queries: list[str]) -> np.ndarray:
+        """
+        Embeds many query strings in one encode call. Repeated queries are
+        served from the in-memory LRU.
+        """
+        if self.query_cache is None:
+            return self.embed_texts(queries, use_cache=False)
+
+        embeddings = np.empty((len(queries), self.dim), dtype=np.float32)
+        missing = []
+        for i, q in enumerate(queries):
+            vec = self.query_cache.get(q)
+            if vec is None:
+                missing.append(i)
+            else:
+                embeddings[i] = vec
+        annotate(queries=len(queries), cache_hits=len(queries) - len(missing))
+        if missing:
+            unique = list(dict.fromkeys(queries[i] for i in missing))
+            fresh = dict(zip(unique, self.embed_texts(unique, use_cache=False)))
+            for i in missing:
+                embeddings[i] = fresh[queries[i]]
+            for q, vec in fresh.items():
+                self.query_cache.put(q, vec)
+        return embeddings
 
 
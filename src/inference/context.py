@@ -0,0 +1,85 @@
+import re
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w+")
+
+# sentences sharing at least this fraction of words with one already packed are dropped
+DUPLICATE_JACCARD = 0.8
+
+
+def split_sentences(text: str) -> list[str]:
+    return [s for s in _SENTENCE_END.split(" ".join(text.split())) if s]
+
+
+def _words(text: str) -> set[str]:
+    return set(w.lower() for w in _WORD.findall(text))
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def chunk_header(i: int) -> str:
+    return f"[Chunk {i}] "
+
+
+def pack_context(question: str, chunks: list[dict], count_tokens, budget: int):
+    """
+    Fit the most useful retrieved text into `budget` tokens.
+
+    Chunks are split into sentences; each sentence is ranked by its chunk's
+    retrieval score plus how many question words it contains. Sentences are
+    taken in that order while they fit, near-duplicates of already packed
+    sentences (e.g. from the 50-token chunk overlap) are skipped, and the
+    survivors are put back in their original order within each chunk.
+
+    count_tokens(text) -> int must use the generating model's tokenizer.
+    Returns (packed chunks, report dict).
+    """
+    q_words = _words(question)
+    candidates = []     # (priority, chunk rank, sentence position, sentence, words)
+    ranked = sorted(enumerate(chunks), key=lambda ic: -ic[1].get("score", 0.0))
+    for rank, (_, chunk) in enumerate(ranked):
+        for pos, sentence in enumerate(split_sentences(chunk["text"])):
+            words = _words(sentence)
+            overlap = len(words & q_words) / len(q_words) if q_words else 0.0
+            candidates.append((chunk.get("score", 0.0) + 0.5 * overlap, rank, pos, sentence, words))
+    candidates.sort(key=lambda c: (-c[0], c[1], c[2]))
+
+    used = 0
+    duplicates = 0
+    over_budget = 0
+    kept = {}           # chunk rank -> [(position, sentence)]
+    kept_words = []
+    for _, rank, pos, sentence, words in candidates:
+        if any(_jaccard(words, w) >= DUPLICATE_JACCARD for w in kept_words):
+            duplicates += 1
+            continue
+        cost = count_tokens(" " + sentence)
+        if rank not in kept:
+            cost += count_tokens(chunk_header(len(kept)) + "\n\n")
+        if used + cost > budget:
+            over_budget += 1
+            continue
+        used += cost
+        kept.setdefault(rank, []).append((pos, sentence))
+        kept_words.append(words)
+
+    packed = []
+    for rank in sorted(kept):
+        chunk = ranked[rank][1]
+        text = " ".join(s for _, s in sorted(kept[rank]))
+        packed.append({**chunk, "text": text})
+
+    report = {
+        "budget": budget,
+        "used_tokens": used,
+        "chunks_in": len(chunks),
+        "chunks_used": len(packed),
+        "sentences_in": len(candidates),
+        "duplicates_dropped": duplicates,
+        "over_budget_dropped": over_budget,
+    }
+    return packed, report
@@ -1,28 +1,109 @@
+import threading
+import time
+
 from llama_cpp import Llama
 
+from inference.context import pack_context
+from telemetry import tracing
+
+MODEL_PATH = "models/model.gguf"
+N_CTX = 4096
+MAX_NEW_TOKENS = 200
+# tokens held back for the chat template's role markers
+TEMPLATE_MARGIN = 32
+
+# Kept constant and first in every prompt: llama.cpp reuses the KV cache for
+# the longest prompt prefix it has already evaluated, so this part is only
+# prefilled once per process.
+SYSTEM_PROMPT = (
+    "You are a retrieval based assistant."
+    "Use ONLY the provided context to answer"
+    "If the answer is not in the context, reply exactly: 'I don't know, its not in the context index, provide me with appropriate context'"
+)
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_llm(model_path: str = MODEL_PATH) -> "LLM":
+    """
+    Process-wide warm LLM. The GGUF weights are loaded on first use only.
+    """
+    global _instance
+    with _instance_lock:
+        if _instance is None or _instance.model_path != model_path:
+            _instance = LLM(model_path)
+    return _instance
+
+
 class LLM:
-    def __init__(self, model_path="models/model.gguf"):
+    def __init__(self, model_path=MODEL_PATH, context_budget: int = None):
+        """
+        context_budget caps the retrieved-context tokens per prompt (prefill
+        time grows with every token); None means whatever fits in n_ctx.
+        """
         print("Loading GGUF model...")
+        self.model_path = model_path
+        self.n_ctx = N_CTX
+        self.context_budget = context_budget
+        self.last_context_report = None
+        self.last_prompt_tokens = 0
         self.llm = Llama(
             model_path=model_path,
             n_threads=8,
-            n_ctx=4096,
+            n_ctx=self.n_ctx,
             chat_format='qwen',
             verbose=False
         )
+        # one llama.cpp context: generations must not interleave
+        self._lock = threading.Lock()
+        self._warm_prefix()
         print("Model loaded.")
+
+    def _warm_prefix(self):
+        """
+        Prefill the constant system prompt now, so the first real question
+        only pays for its own context + question tokens.
+        """
+        with self._lock:
+            self.llm.create_chat_completion(self._build_prompt("", []), max_tokens=1, temperature=0.0)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=False))
+
+    def _fit_question(self, question: str, limit: int) -> str:
+        tokens = self.llm.tokenize(question.encode("utf-8"), add_bos=False, special=False)
+        if len(tokens) <= limit:
+            return question
+        print(f"[WARN] Question is {len(tokens)} tokens, truncated to {limit} to fit the context window.")
+        return self.llm.detokenize(tokens[:max(limit, 0)]).decode("utf-8", errors="ignore")
     
-    def _build_prompt(self,question, chunks):
+    def _build_prompt(self,question, chunks, max_new_tokens=MAX_NEW_TOKENS, timings: dict = None):
+        # everything except the retrieved context has to fit first
+        fixed = self.count_tokens(SYSTEM_PROMPT) + self.count_tokens(
+            "### Context ###\n\n### Question ###\n\n### Answer ###\n"
+        ) + TEMPLATE_MARGIN
+        available = self.n_ctx - max_new_tokens - fixed
+        question = self._fit_question(question, available)
+        question_tokens = self.count_tokens(question)
+        budget = available - question_tokens
+        if self.context_budget is not None:
+            budget = min(budget, self.context_budget)
+
+        packed, report = pack_context(question, chunks, self.count_tokens, max(budget, 0))
+        self.last_context_report = report
+        self.last_prompt_tokens = fixed + question_tokens + report["used_tokens"]
+        if timings is not None:
+            # per call, unlike last_*: safe when several threads share the model
+            timings["prompt_tokens"] = self.last_prompt_tokens
+        if chunks:
+            print(f"[Context] {report['used_tokens']}/{report['budget']} tokens from "
+                  f"{report['chunks_used']}/{report['chunks_in']} chunks "
+                  f"({report['duplicates_dropped']} duplicate, {report['over_budget_dropped']} over-budget sentences dropped)")
+
         context = ''
-        for i, c in enumerate(chunks):
-            clean = ' '.join(c['text'].split())
-            context += f'[Chunk {i}] {clean}\n\n'
-        
-        system_prompt = (
-            "You are a retrieval based assistant."
-            "Use ONLY the provided context to answer"
-            "If the answer is not in the context, reply exactly: 'I don't know, its not in the context index, provide me with appropriate context'"
-        )
+        for i, c in enumerate(packed):
+            context += f'[Chunk {i}] {c["text"]}\n\n'
 
         user_prompt = (
             f"### Context ###\n{context}\n"
@@ -31,11 +112,43 @@ class LLM:
         )
 
         return [
-            {"role":"system","content":system_prompt},
+            {"role":"system","content":SYSTEM_PROMPT},
             {"role":"user","content":user_prompt}
         ]
 
-    def generate(self, question, chunks, max_new_tokens=200):
-        messages = self._build_prompt(question,chunks)
-        result = self.llm.create_chat_completion(messages, max_tokens=max_new_tokens, temperature=0.0)
-        return result["choices"][0]["message"]["content"].strip()
+    def stream(self, question, chunks, max_new_tokens=MAX_NEW_TOKENS, timings: dict = None):
+        """
+        Yield the answer piece by piece as llama.cpp produces tokens.
+        A timings dict, if given, receives prompt_tokens, completion_tokens
+        and queue_s / prefill_s / decode_s once the generation ends.
+        """
+        timings = timings if timings is not None else {}
+        with tracing.span("llm.build_prompt"):
+            messages = self._build_prompt(question,chunks,max_new_tokens,timings)
+        # timed by hand: a span can't stay open across yields to the caller
+        started = locked = time.perf_counter()
+        first = None
+        tokens = 0
+        try:
+            with self._lock:
+                locked = time.perf_counter()
+                for part in self.llm.create_chat_completion(messages, max_tokens=max_new_tokens, temperature=0.0, stream=True):
+                    text = part["choices"][0]["delta"].get("content")
+                    if text:
+                        if first is None:
+                            first = time.perf_counter()
+                        tokens += 1     # llama.cpp streams one token per chunk
+                        yield text
+        finally:
+            done = time.perf_counter()
+            decode_s = done - first if first else 0.0
+            timings.update(completion_tokens=tokens,
+                           queue_s=round(locked - started, 6),
+                           prefill_s=round((first or done) - locked, 6),
+                           decode_s=round(decode_s, 6))
+            if tracing.enabled():
+                tracing.record("llm.generate", done - started, **timings,
+                               tokens_per_s=round(tokens / decode_s, 2) if decode_s else 0.0)
+
+    def generate(self, question, chunks, max_new_tokens=MAX_NEW_TOKENS, timings: dict = None):
+        return "".join(self.stream(question, chunks, max_new_tokens, timings)).strip()
@@ -1,27 +1,77 @@
+from functools import lru_cache
+
 import tiktoken
 
-def chunk_text(text: str, max_tokens: int = 500, overlap: int = 50) -> list[str]:
+from telemetry.tracing import traced, annotate
+
+
+@lru_cache(maxsize=None)
+def get_encoding(name: str = "cl100k_base"):
+    """Load a tiktoken encoding once per process."""
+    return tiktoken.get_encoding(name)
+
+
+def chunk_stream(blocks, max_tokens: int = 500, overlap: int = 50):
+    """
+    Streaming version of chunk_text(): takes an iterable of text blocks
+    (e.g. iter_text()) and yields (chunk, (start, end)) token windows.
+    Only a rolling window of tokens is held in memory, and every token is
+    decoded once, no matter how many overlapping chunks it lands in.
+    """
+    if overlap >= max_tokens:
+        raise ValueError("overlap must be smaller than max_tokens")
+    encoding = get_encoding()
+    stride = max_tokens - overlap
+
+    tokens = []         # token bytes of the current window, starting at token `base`
+    base = 0
+    first = True
+
+    for block in blocks:
+        if not block:
+            continue
+        ids = encoding.encode(block if first else " " + block)
+        first = False
+        tokens.extend(encoding.decode_tokens_bytes(ids))
+
+        while len(tokens) >= max_tokens:
+            yield _decode(tokens[:max_tokens]), (base, base + max_tokens)
+            del tokens[:stride]
+            base += stride
+
+    # tail: same windows the whole-text version would produce past the last full one
+    while tokens:
+        yield _decode(tokens[:max_tokens]), (base, base + min(max_tokens, len(tokens)))
+        if len(tokens) <= stride:
+            break
+        del tokens[:stride]
+        base += stride
+
+
+def _decode(token_bytes: list[bytes]) -> str:
+    return b"".join(token_bytes).decode("utf-8", errors="replace")
+
+
+@traced("chunk_text")
+def chunk_text(text: str, max_tokens: int = 500, overlap: int = 50, with_offsets: bool = False):
     """
     Split text into overlapping chunks.
     - chunk_size: number of words per chunk
     - overlap: how many words overlap between consecutive chunks
+    - with_offsets: also return (start, end) token offsets of every chunk
     """
-    encoding = tiktoken.get_encoding("cl100k_base")
-    tokens = encoding.encode(text)
-    num_tokens = len(tokens)
-
     chunks = []
-    start = 0
-    
-    while start<num_tokens:
-        end = min(start + max_tokens, num_tokens)
-        chunk_tokens = tokens[start:end]
-        chunk_text = encoding.decode(chunk_tokens)
-        chunks.append(chunk_text)
-        start += max_tokens-overlap
-    
+    offsets = []
+    for chunk, span in chunk_stream([text], max_tokens, overlap):
+        chunks.append(chunk)
+        offsets.append(span)
+
+    num_tokens = offsets[-1][1] if offsets else 0
+    annotate(chunks=len(chunks), tokens=num_tokens)
     print(f"[Chunks created] {len(chunks)} chunks (~{num_tokens} tokens total).")
 
+    if with_offsets:
+        return chunks, offsets
     return chunks
 
 if __name__=="__main__":
@@ -29,4 +79,4 @@ if __name__=="__main__":
     Machine learning is a subset of AI focused on building systems that learn from data. 
     Deep learning, a branch of ML, uses neural networks to model complex patterns.
     """
-    chunk_text(words,5,3)
\ No newline at end of file
+    chunk_text(words,5,3)
@@ -0,0 +1,220 @@
+"""
+Checkpointed, resumable directory ingests. A job records every file it
+has to ingest; during the run the index is saved every CHECKPOINT_EVERY
+seconds (or CHECKPOINT_FILES finished files) and only then are the files
+it holds marked done. After a crash or Ctrl+C, resuming the job by id
+ingests just the files that were not committed yet.
+
+Run from the project root:
+    PYTHONPATH=src python -m ingestion.jobs start ./docs --workers 4
+    PYTHONPATH=src python -m ingestion.jobs resume 3f2a9c1e
+    PYTHONPATH=src python -m ingestion.jobs status 3f2a9c1e
+    PYTHONPATH=src python -m ingestion.jobs list
+"""
+import argparse
+import os
+import time
+
+from storage.job_store import JobStore, PENDING, DONE, FAILED
+
+CHECKPOINT_EVERY = 60.0     # seconds between index saves during a job
+CHECKPOINT_FILES = 500      # ... or after this many finished files
+
+RUNNING, INTERRUPTED = "running", "interrupted"
+
+# same as storage.faiss_store.INDEX_PATH (not imported here: it pulls in faiss)
+INDEX_PATH = "src/faiss/vector_index.faiss"
+
+
+def start_job(folder_path: str, fs, embedder, **kwargs) -> dict:
+    """
+    Scan folder_path, record the files as a new job and run it.
+    """
+    from ingestion.parallel import scan_files
+
+    root = os.path.abspath(folder_path)
+    paths = scan_files(root)
+    jobs = JobStore(fs.db_path)
+    job_id = jobs.create(root, paths, {"workers": kwargs.get("workers"), "dedup": kwargs.get("dedup", True)})
+    jobs.close()
+    print(f"[Job {job_id}] {len(paths)} supported files under {root}.")
+    print(f"[Job {job_id}] If this run stops, continue it with: PYTHONPATH=src python -m ingestion.jobs resume {job_id}")
+    return run_job(job_id, fs, embedder, **kwargs)
+
+
+def run_job(job_id: str, fs, embedder, workers: int = None, dedup: bool = True, retry_failed: bool = False,
+            checkpoint_every: float = CHECKPOINT_EVERY, checkpoint_files: int = CHECKPOINT_FILES,
+            **ingest_kwargs) -> dict:
+    """
+    Ingest the job's pending files (and failed ones with retry_failed=True),
+    saving the index and the finished files' status at every checkpoint.
+    On an exception or Ctrl+C the work done so far is checkpointed before
+    the error propagates. Returns the job summary.
+    """
+    # imported here so status / list don't load the file parsers
+    from ingestion.parallel import ingest_paths_parallel
+
+    jobs = JobStore(fs.db_path)
+    if jobs.get(job_id) is None:
+        jobs.close()
+        raise ValueError(f"[ERROR] No ingest job {job_id!r} in {fs.db_path}.")
+    if retry_failed:
+        jobs.requeue_failed(job_id)
+
+    todo = jobs.paths(job_id, PENDING)
+    print(f"[Job {job_id}] {len(todo)} files to ingest.")
+
+    # vectors of pending files that reached the index before the crash
+    # (parts of a large file, or a save the status update didn't follow)
+    for path in todo:
+        if fs.has_doc(path):
+            fs.remove_doc(path)
+
+    finished = []       # (path, status, error, num_chunks) since the last checkpoint
+    last = {"at": time.perf_counter()}
+    jobs.update(job_id, status=RUNNING, new_run=True)
+
+    def checkpoint(status: str = None):
+        fs.save_index()
+        jobs.mark(job_id, finished)
+        now = time.perf_counter()
+        jobs.update(job_id, status=status, seconds=now - last["at"])
+        print(f"[Job {job_id}] Checkpoint: {len(finished)} files committed.")
+        finished.clear()
+        last["at"] = now
+
+    def on_file_done(path, num_chunks, error):
+        if error is None:
+            finished.append((path, DONE, None, num_chunks))
+        else:
+            # drop parts of a streamed file that were added before it failed
+            if fs.has_doc(path):
+                fs.remove_doc(path)
+            finished.append((path, FAILED, error, 0))
+        if len(finished) >= checkpoint_files or time.perf_counter() - last["at"] >= checkpoint_every:
+            checkpoint()
+
+    try:
+        if todo:
+            ingest_paths_parallel(todo, fs, embedder, workers=workers, dedup=dedup,
+                                  on_file_done=on_file_done, **ingest_kwargs)
+        checkpoint(DONE)
+    except BaseException:
+        # files that finished are complete in the store; a file cut off
+        # mid-way stays pending and is cleared on resume
+        try:
+            checkpoint(INTERRUPTED)
+        except Exception as e:
+            print(f"[Job {job_id}] Could not save a checkpoint: {type(e).__name__}: {e}")
+        print(f"[Job {job_id}] Interrupted. Resume with: PYTHONPATH=src python -m ingestion.jobs resume {job_id}")
+        jobs.close()
+        raise
+
+    summary = job_summary(jobs, job_id)
+    jobs.close()
+    print_summary(summary)
+    return summary
+
+
+def resume_job(job_id: str, fs, embedder, **kwargs) -> dict:
+    """
+    Continue a job with the options it was started with, unless overridden.
+    """
+    jobs = JobStore(fs.db_path)
+    job = jobs.get(job_id)
+    jobs.close()
+    if job is None:
+        raise ValueError(f"[ERROR] No ingest job {job_id!r} in {fs.db_path}.")
+    options = {**job["options"], **{k: v for k, v in kwargs.items() if v is not None}}
+    return run_job(job_id, fs, embedder, **options)
+
+
+def job_summary(jobs: JobStore, job_id: str) -> dict:
+    job = jobs.get(job_id)
+    seconds = job["seconds"]
+    return {
+        "id": job["id"],
+        "root": job["root"],
+        "status": job["status"],
+        "runs": job["runs"],
+        "files": job[PENDING] + job[DONE] + job[FAILED],
+        "done": job[DONE],
+        "failed": jobs.failures(job_id),
+        "pending": job[PENDING],
+        "chunks": job["chunks"],
+        "seconds": round(seconds, 3),
+        "files_per_s": round(job[DONE] / seconds, 3) if seconds else 0.0,
+        "chunks_per_s": round(job["chunks"] / seconds, 3) if seconds else 0.0,
+    }
+
+
+def print_summary(summary: dict, max_failures: int = 20):
+    print(
+        f"[Job {summary['id']}] {summary['status']}: {summary['done']}/{summary['files']} files done, "
+        f"{len(summary['failed'])} failed, {summary['pending']} pending | {summary['chunks']} chunks in "
+        f"{summary['seconds']:.1f}s over {summary['runs']} run(s) "
+        f"({summary['files_per_s']:.1f} files/s, {summary['chunks_per_s']:.1f} chunks/s)"
+    )
+    for path, error in list(summary["failed"].items())[:max_failures]:
+        print(f"    FAILED {path}: {error}")
+    if len(summary["failed"]) > max_failures:
+        print(f"    ... and {len(summary['failed']) - max_failures} more")
+
+
+def print_jobs(jobs: JobStore):
+    for job in jobs.list_jobs():
+        print(f"  {job['id']}  {job['status']:<12} {job[DONE]:>6} done {job[FAILED]:>5} failed "
+              f"{job[PENDING]:>6} pending  {job['root']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Checkpointed, resumable directory ingest")
+    parser.add_argument("--index", default=INDEX_PATH)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("start", help="ingest a directory as a new job")
+    p.add_argument("folder")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--no-dedup", action="store_true")
+    p.add_argument("--checkpoint-every", type=float, default=CHECKPOINT_EVERY, help="seconds between index saves")
+
+    p = sub.add_parser("resume", help="continue a job where its last checkpoint left off")
+    p.add_argument("job_id")
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--retry-failed", action="store_true", help="also try the files that failed again")
+    p.add_argument("--checkpoint-every", type=float, default=CHECKPOINT_EVERY, help="seconds between index saves")
+
+    p = sub.add_parser("status", help="per-file status counts and failures of a job")
+    p.add_argument("job_id")
+
+    sub.add_parser("list", help="all jobs of this index")
+    args = parser.parse_args()
+
+    if args.command in ("status", "list"):
+        # reads the job tables only: no index or model is loaded
+        jobs = JobStore(args.index + ".db")
+        if args.command == "status":
+            if jobs.get(args.job_id) is None:
+                print(f"No ingest job {args.job_id!r}.")
+            else:
+                print_summary(job_summary(jobs, args.job_id))
+        else:
+            print_jobs(jobs)
+        jobs.close()
+        return
+
+    from encoder.embedder import EmbeddingModel
+    from storage.faiss_store import FaissStore
+
+    fs = FaissStore(index_path=args.index)
+    embedder = EmbeddingModel()
+    if args.command == "start":
+        start_job(args.folder, fs, embedder, workers=args.workers, dedup=not args.no_dedup,
+                  checkpoint_every=args.checkpoint_every)
+    else:
+        resume_job(args.job_id, fs, embedder, workers=args.workers, retry_failed=args.retry_failed,
+                   checkpoint_every=args.checkpoint_every)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+import os
+import queue
+from collections import deque
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from ingestion.text_loader import iter_text
+from ingestion.chunker import chunk_stream
+from telemetry import tracing
+
+SUPPORTED_EXTENSIONS = {".txt", ".md", ".pdf", ".docx"}
+
+# Files above this size are streamed through the pipeline in parts instead of
+# being chunked whole in a worker, so peak memory doesn't grow with file size.
+LARGE_FILE_BYTES = 32 * 1024 * 1024
+
+_DONE = object()
+
+
+def scan_files(folder_path: str) -> list[str]:
+    """
+    Recursively list the files under folder_path that load_text() supports.
+    """
+    found = []
+    for root, _, files in os.walk(folder_path):
+        for file in files:
+            if os.path.splitext(file)[1].lower() in SUPPORTED_EXTENSIONS:
+                found.append(os.path.join(root, file))
+    return found
+
+
+def _chunk_file(path: str, timings: dict = None):
+    """
+    chunk_stream(iter_text(path)). With a timings dict (tracing on), the
+    time spent reading / parsing and the total are added to it, so worker
+    processes can hand load_text / chunk_text timings back to the parent.
+    """
+    if timings is None:
+        yield from chunk_stream(iter_text(path))
+        return
+
+    started = time.perf_counter()
+    blocks = iter_text(path)
+
+    def timed_blocks():
+        while True:
+            t0 = time.perf_counter()
+            block = next(blocks, None)
+            timings["load_s"] += time.perf_counter() - t0
+            if block is None:
+                return
+            timings["chars"] += len(block)
+            yield block
+
+    for chunk, span in chunk_stream(timed_blocks()):
+        timings["chunks"] += 1
+        timings["tokens"] = span[1]
+        yield chunk, span
+    timings["total_s"] += time.perf_counter() - started
+
+
+def _new_timings(trace: bool) -> dict:
+    return {"load_s": 0.0, "total_s": 0.0, "chars": 0, "chunks": 0, "tokens": 0} if trace else None
+
+
+def _record_timings(timings: dict):
+    if timings:
+        tracing.record("load_text", timings["load_s"], chars=timings["chars"])
+        tracing.record("chunk_text", max(timings["total_s"] - timings["load_s"], 0.0),
+                       chunks=timings["chunks"], tokens=timings["tokens"])
+
+
+def _load_and_chunk(path: str, trace: bool = False):
+    """
+    Worker-process stage: parse one file and split it into chunks.
+    Errors are returned, not raised, so one bad file can't stop the pool.
+    """
+    timings = _new_timings(trace)
+    try:
+        chunks, offsets = [], []
+        for chunk, span in _chunk_file(path, timings):
+            chunks.append(chunk)
+            offsets.append(span)
+        return path, chunks, offsets, None, True, timings
+    except Exception as e:
+        return path, [], [], f"{type(e).__name__}: {e}", True, None
+
+
+def _stream_large_file(path: str, out_q: queue.Queue, part_size: int):
+    """
+    Producer-side stage for large files: push the file's chunks in parts of
+    part_size as they are produced. The last item for a file has final=True.
+    """
+    chunks, offsets = [], []
+    timings = _new_timings(tracing.enabled())
+    try:
+        for chunk, span in _chunk_file(path, timings):
+            chunks.append(chunk)
+            offsets.append(span)
+            if len(chunks) >= part_size:
+                out_q.put((path, chunks, offsets, None, False, None))
+                chunks, offsets = [], []
+        out_q.put((path, chunks, offsets, None, True, timings))
+    except Exception as e:
+        out_q.put((path, [], [], f"{type(e).__name__}: {e}", True, None))
+
+
+class IngestStats:
+    """
+    Running counters + throughput report for a directory ingest.
+    """
+
+    def __init__(self, total_files: int):
+        self.total_files = total_files
+        self.files = 0
+        self.chunks = 0
+        self.duplicates = 0     # near-duplicate chunks stored as sources, not embedded
+        self.failed = {}        # path -> reason
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def elapsed(self) -> float:
+        return max(time.perf_counter() - self.started, 1e-9)
+
+    def dedup_ratio(self) -> float:
+        seen = self.chunks + self.duplicates
+        return self.duplicates / seen if seen else 0.0
+
+    def report(self, final: bool = False):
+        t = self.elapsed()
+        tag = "[Ingest done]" if final else "[Ingest]"
+        print(
+            f"{tag} {self.files}/{self.total_files} files, {self.chunks} chunks, "
+            f"{self.duplicates} duplicates ({self.dedup_ratio():.1%}), "
+            f"{len(self.failed)} failed | {self.files / t:.1f} files/s, {self.chunks / t:.1f} chunks/s, {t:.1f}s"
+        )
+        self._last_report = time.perf_counter()
+
+    def maybe_report(self, every: float):
+        if time.perf_counter() - self._last_report >= every:
+            self.report()
+
+    def to_dict(self) -> dict:
+        t = self.elapsed()
+        return {
+            "files": self.files,
+            "chunks": self.chunks,
+            "duplicates": self.duplicates,
+            "dedup_ratio": self.dedup_ratio(),
+            "failed": dict(self.failed),
+            "seconds": t,
+            "files_per_s": self.files / t,
+            "chunks_per_s": self.chunks / t,
+        }
+
+
+def _load_stage(paths, out_q: queue.Queue, workers: int, errors: list, part_size: int):
+    """
+    Producer thread: fan files out to a process pool, keeping at most
+    2 * workers files in flight so parsed text can't pile up in memory.
+    Large files are streamed from this thread in parts instead.
+    """
+    trace = tracing.enabled()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = set()
+            for path in paths:
+                if _file_size(path) > LARGE_FILE_BYTES:
+                    _stream_large_file(path, out_q, part_size)
+                    continue
+                in_flight.add(pool.submit(_load_and_chunk, path, trace))
+                if len(in_flight) >= 2 * workers:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        out_q.put(fut.result())
+            for fut in in_flight:
+                out_q.put(fut.result())
+    except Exception as e:
+        errors.append(e)
+    finally:
+        out_q.put(_DONE)
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def ingest_paths_parallel(paths: list[str], fs, embedder, workers: int = None, batch_size: int = 256,
+                          queue_size: int = 64, report_every: float = 5.0, on_file_done=None,
+                          dedup: bool = True) -> IngestStats:
+    """
+    Staged ingest: process pool (load + chunk) -> bounded queue -> near-duplicate
+    check (fs.dedup_chunks) -> embedding stage that packs chunks from many
+    files into fixed-size batches -> FaissStore.
+    on_file_done(path, num_chunks, error) is called as each file finishes;
+    num_chunks counts the file's chunks including near-duplicates.
+    Does not save the index; the caller decides when to persist.
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    stats = IngestStats(len(paths))
+
+    chunk_q = queue.Queue(maxsize=queue_size)
+    errors = []
+    producer = threading.Thread(target=_load_stage, args=(paths, chunk_q, workers, errors, batch_size), daemon=True)
+    producer.start()
+
+    # file parts whose chunks are (partly) waiting for embedding, in arrival order:
+    # [path, chunks, offsets, embedded vector parts, number of chunks embedded, final part, dedup keys, duplicates]
+    open_files = deque()
+    batch = []
+    file_chunks = {}    # path -> chunks added so far (files streamed in parts)
+
+    def finish_file(path, chunks, offsets, vectors, final, keys=None, duplicates=0):
+        if len(chunks):
+            fs.add_vectors(vectors, chunks, file_path=path, embedder_model=embedder.model_name, offsets=offsets,
+                           dedup_keys=keys)
+        stats.chunks += len(chunks)
+        stats.duplicates += duplicates
+        total = file_chunks.pop(path, 0) + len(chunks) + duplicates
+        if not final:
+            file_chunks[path] = total
+            return
+        stats.files += 1
+        if on_file_done:
+            on_file_done(path, total, None)
+
+    def flush():
+        vectors = np.asarray(embedder.embed_texts(batch), dtype=np.float32) if batch else None
+        batch.clear()
+        pos = 0
+        while open_files:
+            entry = open_files[0]
+            take = min(len(entry[1]) - entry[4], len(vectors) - pos) if vectors is not None else 0
+            if take:
+                entry[3].append(vectors[pos:pos + take])
+                entry[4] += take
+                pos += take
+            if entry[4] < len(entry[1]):
+                break
+            open_files.popleft()
+            finish_file(entry[0], entry[1], entry[2], np.vstack(entry[3]) if entry[3] else None, entry[5],
+                        entry[6], entry[7])
+
+    try:
+        while True:
+            item = chunk_q.get()
+            if item is _DONE:
+                break
+
+            path, chunks, offsets, error, final, timings = item
+            _record_timings(timings)
+            if error:
+                flush()     # earlier parts of a streamed file must land first
+                file_chunks.pop(path, None)
+                stats.failed[path] = error
+                print(f"[Ingest] Skipped {path}: {error}")
+                if on_file_done:
+                    on_file_done(path, 0, error)
+                continue
+
+            keys, duplicates = None, 0
+            if dedup and chunks:
+                with tracing.span("dedup", chunks=len(chunks)) as s:
+                    keep, keys = fs.dedup_chunks(chunks, file_path=path, offsets=offsets)
+                    duplicates = len(chunks) - len(keep)
+                    s.set(duplicates=duplicates)
+                if duplicates:
+                    chunks = [chunks[i] for i in keep]
+                    offsets = [offsets[i] for i in keep]
+
+            if not chunks:
+                if open_files:
+                    # keep completion order: queue behind parts still being embedded
+                    open_files.append([path, chunks, offsets, [], 0, final, keys, duplicates])
+                else:
+                    finish_file(path, [], [], None, final, duplicates=duplicates)
+                continue
+
+            open_files.append([path, chunks, offsets, [], 0, final, keys, duplicates])
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= batch_size:
+                    flush()
+
+            stats.maybe_report(report_every)
+
+        flush()
+    except BaseException:
+        if dedup:
+            fs.cancel_dedup()
+        raise
+    producer.join()
+    if errors:
+        raise errors[0]
+
+    stats.report(final=True)
+    return stats
+
+
+def ingest_directory_parallel(folder_path: str, fs, embedder, **kwargs) -> IngestStats:
+    paths = scan_files(folder_path)
+    print(f"[Scan] Found {len(paths)} supported files.")
+    return ingest_paths_parallel(paths, fs, embedder, **kwargs)
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import time
+
+from ingestion.parallel import scan_files, ingest_paths_parallel
+from storage.manifest import Manifest
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def sync_directory(folder_path: str, fs, embedder, workers: int = None, **ingest_kwargs) -> dict:
+    """
+    Bring the index in line with folder_path:
+    - unchanged files (same size + mtime, or same content hash) are skipped
+    - new and changed files are (re-)embedded; old vectors of changed files are removed
+    - files gone from disk have their vectors removed
+    Paths are stored absolute so repeated syncs match regardless of cwd.
+    Saves the index; returns a summary dict.
+    """
+    started = time.perf_counter()
+    root = os.path.abspath(folder_path)
+    manifest = Manifest(fs.db_path)
+    known = manifest.entries(prefix=root + os.sep)
+
+    paths = scan_files(root)
+    on_disk = set(paths)
+    print(f"[Sync] Found {len(paths)} supported files, {len(known)} in manifest.")
+
+    to_ingest = {}      # path -> (size, mtime, sha256)
+    unchanged = 0
+    touched = []
+    for path in paths:
+        st = os.stat(path)
+        entry = known.get(path)
+        still_indexed = entry is not None and (entry["num_chunks"] == 0 or fs.has_doc(path))
+
+        if entry and still_indexed and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime:
+            unchanged += 1
+            continue
+
+        digest = file_sha256(path)
+        if entry and still_indexed and entry["sha256"] == digest:
+            # content identical, only the timestamp moved
+            unchanged += 1
+            touched.append((path, st.st_size, st.st_mtime, digest, entry["num_chunks"]))
+            continue
+
+        to_ingest[path] = (st.st_size, st.st_mtime, digest)
+
+    deleted = [p for p in known if p not in on_disk]
+
+    removed_vectors = 0
+    for path in deleted:
+        removed_vectors += fs.remove_doc(path)
+    for path in to_ingest:
+        # also clears vectors left by an earlier failed or interrupted ingest
+        removed_vectors += fs.remove_doc(path)
+
+    done = {}
+
+    def on_file_done(path, num_chunks, error):
+        if error is None:
+            done[path] = num_chunks
+
+    stats = None
+    if to_ingest:
+        stats = ingest_paths_parallel(list(to_ingest), fs, embedder, workers=workers,
+                                      on_file_done=on_file_done, **ingest_kwargs)
+
+    fs.save_index()
+
+    # manifest is written only after the index is saved, so a crash makes
+    # the next sync redo the work instead of skipping it
+    for path, num_chunks in done.items():
+        size, mtime, digest = to_ingest[path]
+        manifest.upsert(path, size, mtime, digest, num_chunks)
+    for row in touched:
+        manifest.upsert(*row)
+    manifest.remove(deleted)
+    manifest.close()
+
+    summary = {
+        "unchanged": unchanged,
+        "new": sum(1 for p in done if p not in known),
+        "changed": sum(1 for p in done if p in known),
+        "deleted": len(deleted),
+        "failed": dict(stats.failed) if stats else {},
+        "duplicates": stats.duplicates if stats else 0,
+        "dedup_ratio": stats.dedup_ratio() if stats else 0.0,
+        "vectors_removed": removed_vectors,
+        "seconds": time.perf_counter() - started,
+    }
+    print(
+        f"[Sync] {summary['new']} new, {summary['changed']} changed, {summary['deleted']} deleted, "
+        f"{summary['unchanged']} unchanged, {len(summary['failed'])} failed "
+        f"({removed_vectors} vectors removed, {summary['duplicates']} near-duplicate chunks "
+        f"({summary['dedup_ratio']:.1%}) stored as sources) in {summary['seconds']:.1f}s"
+    )
+    return summary
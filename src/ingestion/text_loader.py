@@ -3,8 +3,29 @@ import PyPDF2
 import docx
 import os
 
+from telemetry.tracing import traced, annotate
 
+# .txt / .md files are read in blocks of this many characters
+TXT_BLOCK_CHARS = 256 * 1024
+
+
+@traced("load_text")
 def load_text(file_path: str):
+    """
+    Whole document as one whitespace-normalized string.
+    Prefer iter_text() for large files.
+    """
+    text = " ".join(iter_text(file_path))
+    annotate(chars=len(text))
+    return text
+
+
+def iter_text(file_path: str):
+    """
+    Stream a document as whitespace-normalized blocks (pages for PDF,
+    paragraphs for DOCX, fixed-size blocks for text), so memory stays
+    bounded by one block instead of the whole file.
+    """
     path = Path(file_path)
     if not path.exists():
         raise FileNotFoundError(f"{file_path} not found")
@@ -12,33 +33,51 @@ def load_text(file_path: str):
     ext = path.suffix.lower()
 
     if ext == ".txt" or ext == ".md":
-        return _load_txt(path)
+        return _iter_txt(path)
 
     elif ext == ".pdf":
-        return _load_pdf(path)
+        return _iter_pdf(path)
 
     elif ext == ".docx":
-        return _load_docx(path)
+        return _iter_docx(path)
 
     else:
         raise ValueError(f"Unsupported file type: {ext}")
 
 
-def _load_txt(path: Path):
+def _iter_txt(path: Path):
+    carry = ""
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        text = f.read()
-    return " ".join(text.split())
+        while True:
+            block = f.read(TXT_BLOCK_CHARS)
+            if not block:
+                break
+            block = carry + block
+            # hold back a trailing partial word so it isn't split across blocks
+            cut = max(block.rfind(" "), block.rfind("\n"), block.rfind("\t"))
+            if cut == -1:
+                carry = block
+                continue
+            carry = block[cut:]
+            text = " ".join(block[:cut].split())
+            if text:
+                yield text
+    text = " ".join(carry.split())
+    if text:
+        yield text
 
-def _load_pdf(path: Path):
+def _iter_pdf(path: Path):
     reader = PyPDF2.PdfReader(str(path))
-    pages = []
     for page in reader.pages:
         text = page.extract_text()
         if text:
-            pages.append(text)
-    return " ".join(" ".join(pages).split())
+            text = " ".join(text.split())
+            if text:
+                yield text
 
-def _load_docx(path: Path):
+def _iter_docx(path: Path):
     doc = docx.Document(str(path))
-    paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-    return " ".join(" ".join(paragraphs).split())
+    for p in doc.paragraphs:
+        text = " ".join(p.text.split())
+        if text:
+            yield text
@@ -1 +1,487 @@
- 
\ No newline at end of file
+"""
+Local HTTP service: search, RAG and ingest over one warm embedder, index and LLM.
+
+Run:  PYTHONPATH=src python -m interface.api --port 8000
+
+  GET  /health
+  GET  /stats
+  GET  /metrics  (Prometheus text; start with --trace)
+  POST /search  {"query": "...", "k": 5, "mode": "dense|hybrid|lexical", "filters": {...}, "mmr": true}
+  POST /rag     {"question": "...", "k": 5, "stream": false}
+  POST /ingest  {"path": "file or directory"}
+
+Stdlib asyncio only. Concurrent queries are embedded together in
+micro-batches; index access, ingest and LLM generation run on worker
+threads so the event loop never blocks. Queries read an immutable index
+snapshot, so ingest runs alongside them and new versions are swapped in
+atomically (storage.versioned_store).
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pipeline.answer_cache import AnswerCache, get_answer_cache
+from pipeline.retrieve import Retriever, SEARCH_MODES, HYBRID_FETCH, reciprocal_rank_fusion, mmr_pool, diversify_results
+from storage.faiss_store import FILTER_KEYS
+from storage.versioned_store import VersionedStore
+from telemetry import tracing
+
+MAX_BODY_BYTES = 1 << 20
+BATCH_WINDOW_MS = 5         # how long the first query of a batch waits for company
+MAX_BATCH = 64
+LLM_QUEUE_LIMIT = 8         # RAG requests waiting for the LLM before we answer 503
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryBatcher:
+    """
+    Collects search requests arriving within BATCH_WINDOW_MS (up to
+    MAX_BATCH) and answers them with one embed call and one FAISS search
+    per distinct (k, filters) group.
+    """
+
+    def __init__(self, service, window_ms: float = BATCH_WINDOW_MS, max_batch: int = MAX_BATCH):
+        self.service = service
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.queries = 0
+
+    async def search(self, query: str, k: int, mode: str, filters: dict, diversify: bool = True):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((query, k, mode, filters, diversify, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.batches += 1
+            self.queries += len(batch)
+            try:
+                results, errors = await loop.run_in_executor(self.service.search_pool, self._search_batch, batch)
+            except Exception as e:
+                # embedding the batch failed: nothing to hand back to anyone
+                results, errors = [None] * len(batch), [e] * len(batch)
+            for (*_, future), result, error in zip(batch, results, errors):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+    def _search_batch(self, batch):
+        """
+        Returns (results, errors), one entry per query. A query that fails
+        (e.g. a filter the store rejects) only fails its own group.
+        """
+        retriever = self.service.retriever
+        # one snapshot for the whole batch; a concurrent ingest never shows up half-way
+        store = self.service.versions.current()
+        results = [None] * len(batch)
+        errors = [None] * len(batch)
+
+        dense = [i for i, (_, _, mode, *_) in enumerate(batch) if mode != "lexical"]
+        vecs = None
+        if dense:
+            vecs = retriever.embedder.embed_queries([batch[i][0] for i in dense])
+            vecs = np.asarray(vecs, dtype=np.float32).reshape(len(dense), -1)
+
+        if store.ntotal == 0:
+            return [[] for _ in batch], errors
+
+        # MMR re-ranks a larger candidate pool down to k at the end
+        lam = retriever.mmr_lambda
+        pools = [mmr_pool(k) if diversify and lam is not None else k for _, k, _, _, diversify, _ in batch]
+
+        groups = {}
+        for row, i in enumerate(dense):
+            mode, filters = batch[i][2], batch[i][3]
+            fetch = pools[i] * HYBRID_FETCH if mode == "hybrid" else pools[i]
+            key = (fetch, json.dumps(filters, sort_keys=True))
+            groups.setdefault(key, []).append((row, i))
+        for (fetch, _), members in groups.items():
+            filters = batch[members[0][1]][3]
+            rows = [row for row, _ in members]
+            try:
+                found = store.search_many_vectors(vecs[rows], k=fetch, filters=filters)
+            except Exception as e:
+                for _, i in members:
+                    errors[i] = e
+                continue
+            for (_, i), hits in zip(members, found):
+                results[i] = hits
+
+        for i, (query, k, mode, filters, _, _) in enumerate(batch):
+            if errors[i] is not None:
+                continue
+            try:
+                if mode == "lexical":
+                    results[i] = store.search_lexical(query, k=pools[i], filters=filters)
+                elif mode == "hybrid":
+                    lexical = store.search_lexical(query, k=pools[i] * HYBRID_FETCH, filters=filters)
+                    results[i] = reciprocal_rank_fusion([results[i], lexical], pools[i])
+            except Exception as e:
+                errors[i] = e
+
+        todo = [i for i in range(len(batch)) if pools[i] > batch[i][1] and errors[i] is None]
+        if todo:
+            try:
+                picked = diversify_results([results[i] for i in todo], [batch[i][1] for i in todo], store, lam,
+                                           [batch[i][2] != "dense" for i in todo])
+            except Exception:
+                # find the culprit(s): re-rank one query at a time
+                picked = []
+                for i in todo:
+                    try:
+                        picked += diversify_results([results[i]], [batch[i][1]], store, lam, [batch[i][2] != "dense"])
+                    except Exception as e:
+                        errors[i] = e
+                        picked.append(None)
+            for i, hits in zip(todo, picked):
+                if errors[i] is None:
+                    results[i] = hits
+        return results, errors
+
+
+class LuraService:
+    """
+    Holds the warm models and the worker pools behind the HTTP handlers.
+    """
+
+    def __init__(self, index_path: str = 'src/faiss/vector_index.faiss', mode: str = "dense",
+                 load_llm: bool = True, batch_window_ms: float = BATCH_WINDOW_MS, collection: str = None):
+        self.batch_window_ms = batch_window_ms
+        self.retriever = Retriever(index_path=index_path, mode=mode, collection=collection)
+        # writes go to retriever.store on a background thread; queries read snapshots
+        self.versions = VersionedStore(self.retriever.store)
+        self.search_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        # one llama.cpp context -> one generation at a time
+        self.llm_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="llm")
+        self.llm = None
+        if load_llm:
+            from inference.local_llm import get_llm
+            self.llm = get_llm()
+        self.batcher = None
+        self._llm_waiting = 0
+        self.started = time.time()
+        self.requests = 0
+
+    # ----- handlers -----
+
+    async def search(self, body: dict):
+        query = body.get("query")
+        if not isinstance(query, str) or not query.strip():
+            raise HTTPError(400, "'query' (non-empty string) is required")
+        k, mode, filters = self._search_params(body, self.retriever.top_k)
+        results = await self.batcher.search(query, k, mode, filters, bool(body.get("mmr", True)))
+        return {"query": query, "results": results}
+
+    async def rag(self, body: dict, writer=None):
+        question = body.get("question")
+        if not isinstance(question, str) or not question.strip():
+            raise HTTPError(400, "'question' (non-empty string) is required")
+        if self.llm is None:
+            raise HTTPError(503, "LLM not loaded (service started with --no-llm)")
+
+        k, mode, filters = self._search_params(body, 5)
+        stream = body.get("stream") and writer is not None
+        loop = asyncio.get_running_loop()
+
+        # the query LRU makes the batcher's embedding of the same question free
+        query_vector = await loop.run_in_executor(self.search_pool, self.retriever.embedder.embed_query, question)
+        version = self.versions.current().version
+        params = AnswerCache.params_key(k=k, mode=mode, filters=filters)
+        hit = get_answer_cache().lookup(query_vector, version, params)
+        if hit:
+            if stream:
+                data = hit["answer"].encode("utf-8")
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                             b"Transfer-Encoding: chunked\r\n\r\n"
+                             + f"{len(data):x}\r\n".encode() + data + b"\r\n0\r\n\r\n")
+                await writer.drain()
+                return None
+            return {"question": question, "answer": hit["answer"], "sources": hit["sources"],
+                    "cached": True, "similarity": hit["similarity"]}
+
+        if self._llm_waiting >= LLM_QUEUE_LIMIT:
+            raise HTTPError(503, "LLM busy, try again later")
+        # reserve the slot before the first await, so requests suspended in
+        # the search can't all pass the check above
+        self._llm_waiting += 1
+        try:
+            chunks = await self.batcher.search(question, k, mode, filters)
+            if stream:
+                answer = await self._stream_answer(writer, self.llm.stream(question, chunks))
+            else:
+                answer = await loop.run_in_executor(self.llm_pool, self.llm.generate, question, chunks)
+        finally:
+            self._llm_waiting -= 1
+        get_answer_cache().put(question, query_vector, answer, chunks, version, params)
+        if stream:
+            return None
+        return {"question": question, "answer": answer, "sources": chunks, "cached": False}
+
+    def _search_params(self, body: dict, default_k: int):
+        """
+        (k, mode, filters) from a request body, checked here so a bad request
+        is answered 400 before it can join (and fail) a shared search batch.
+        """
+        k = body.get("k")
+        if k is None:
+            k = default_k
+        if isinstance(k, bool) or not isinstance(k, int) or k < 1:
+            raise HTTPError(400, "'k' must be a positive integer")
+        mode = body.get("mode") or self.retriever.mode
+        if mode not in SEARCH_MODES:
+            raise HTTPError(400, f"'mode' must be one of {SEARCH_MODES}")
+        filters = body.get("filters")
+        if filters is not None:
+            if not isinstance(filters, dict):
+                raise HTTPError(400, "'filters' must be an object")
+            unknown = set(filters) - set(FILTER_KEYS)
+            if unknown:
+                raise HTTPError(400, f"Unknown filter(s) {sorted(unknown)}. Choose from {FILTER_KEYS}.")
+        return k, mode, filters or None
+
+    async def _stream_answer(self, writer, token_iter) -> str:
+        """
+        Chunked transfer: one HTTP chunk per generated token. The iterator is
+        consumed on the LLM worker. Returns the full answer.
+        """
+        loop = asyncio.get_running_loop()
+        tokens = asyncio.Queue()
+        parts = []
+
+        def produce():
+            try:
+                for token in token_iter:
+                    loop.call_soon_threadsafe(tokens.put_nowait, token)
+            finally:
+                loop.call_soon_threadsafe(tokens.put_nowait, None)
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; charset=utf-8\r\n"
+                     b"Transfer-Encoding: chunked\r\n\r\n")
+        done = loop.run_in_executor(self.llm_pool, produce)
+        while (token := await tokens.get()) is not None:
+            parts.append(token)
+            data = token.encode("utf-8")
+            writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        await done
+        return "".join(parts).strip()
+
+    async def ingest(self, body: dict):
+        path = body.get("path")
+        if not isinstance(path, str) or not os.path.exists(path):
+            raise HTTPError(400, "'path' must be an existing file or directory")
+        from ingestion.parallel import scan_files
+
+        if os.path.isdir(path):
+            paths = await asyncio.get_running_loop().run_in_executor(None, scan_files, path)
+        else:
+            paths = [os.path.abspath(path)]
+        future = self.versions.ingest_paths(paths, self.retriever.embedder)
+        stats = await asyncio.wrap_future(future)
+        get_answer_cache().invalidate()
+        return {**stats.to_dict(), "version": self.versions.version}
+
+    def stats(self) -> dict:
+        store = self.versions.current()
+        return {
+            "version": self.versions.version,
+            "collection": self.retriever.collection or "default",
+            "embedding_model": store.model_name,
+            "dim": store.dim,
+            "index_type": store.index_type,
+            "vectors": store.ntotal,
+            "chunks": len(store.chunks),
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "search_batches": self.batcher.batches if self.batcher else 0,
+            "avg_batch_size": round(self.batcher.queries / self.batcher.batches, 2) if self.batcher and self.batcher.batches else 0.0,
+            "llm_loaded": self.llm is not None,
+            "answer_cache": get_answer_cache().stats(),
+            "query_cache": self.retriever.embedder.query_cache.stats() if getattr(self.retriever.embedder, "query_cache", None) else None,
+            "trace": tracing.stats() if tracing.enabled() else None,
+        }
+
+    # ----- HTTP plumbing -----
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "malformed request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "body too large"}, keep_alive=False)
+                    break
+                raw = await reader.readexactly(length) if length else b""
+
+                self.requests += 1
+                streamed = await self._dispatch(method, target.split("?", 1)[0], raw, writer, keep_alive)
+                if streamed or not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, raw: bytes, writer, keep_alive: bool) -> bool:
+        """
+        Returns True when the handler wrote a streamed response itself.
+        """
+        routes = {
+            ("GET", "/health"): None,
+            ("GET", "/stats"): None,
+            ("GET", "/metrics"): None,
+            ("POST", "/search"): self.search,
+            ("POST", "/rag"): self.rag,
+            ("POST", "/ingest"): self.ingest,
+        }
+        try:
+            if (method, path) not in routes:
+                known = {p for _, p in routes}
+                raise HTTPError(405 if path in known else 404, f"{method} {path} not supported")
+            if path == "/health":
+                payload = {"status": "ok"}
+            elif path == "/stats":
+                payload = self.stats()
+            elif path == "/metrics":
+                await self._respond_text(writer, 200, tracing.prometheus_text(), keep_alive)
+                return False
+            else:
+                try:
+                    body = json.loads(raw or b"{}")
+                except json.JSONDecodeError:
+                    raise HTTPError(400, "body must be JSON")
+                if not isinstance(body, dict):
+                    raise HTTPError(400, "body must be a JSON object")
+                if path == "/rag":
+                    payload = await self.rag(body, writer)
+                    if payload is None:
+                        return True
+                else:
+                    payload = await routes[(method, path)](body)
+            await self._respond(writer, 200, payload, keep_alive)
+        except HTTPError as e:
+            await self._respond(writer, e.status, {"error": str(e)}, keep_alive)
+        except ValueError as e:
+            # bad filters, read-only (mmap) index, ...
+            await self._respond(writer, 400, {"error": str(e)}, keep_alive)
+        except Exception as e:
+            print(f"[API] {method} {path} failed: {e!r}")
+            await self._respond(writer, 500, {"error": str(e)}, keep_alive)
+        return False
+
+    @staticmethod
+    async def _respond(writer, status: int, payload: dict, keep_alive: bool = True):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    @staticmethod
+    async def _respond_text(writer, status: int, text: str, keep_alive: bool = True):
+        body = text.encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            "Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8000):
+        self.batcher = QueryBatcher(self, window_ms=self.batch_window_ms)
+        batch_task = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"[API] Serving on http://{host}:{port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lura HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--index", default='src/faiss/vector_index.faiss')
+    parser.add_argument("--collection", default=None, help="serve a named collection instead of --index")
+    parser.add_argument("--mode", default="dense", choices=SEARCH_MODES)
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS)
+    parser.add_argument("--no-llm", action="store_true", help="serve search / ingest only")
+    parser.add_argument("--trace", action="store_true", help="record per-stage spans for /metrics and /stats")
+    parser.add_argument("--trace-log", default=None, help="also write one JSON line per span here ('-' = stderr)")
+    parser.add_argument("--embed-backend", default=None, choices=("torch", "int8", "onnx", "onnx-int8"),
+                        help="embedding runtime (default torch; see encoder/backends.py)")
+    parser.add_argument("--embed-autotune", action="store_true", help="measure the best embedding batch size / threads")
+    args = parser.parse_args()
+
+    if args.trace or args.trace_log:
+        tracing.enable(args.trace_log)
+    # read by EmbeddingModel, which the Retriever creates
+    if args.embed_backend:
+        os.environ["LURA_EMBED_BACKEND"] = args.embed_backend
+    if args.embed_autotune:
+        os.environ["LURA_EMBED_AUTOTUNE"] = "1"
+
+    service = LuraService(index_path=args.index, mode=args.mode, load_llm=not args.no_llm,
+                          batch_window_ms=args.batch_window_ms, collection=args.collection)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\n[API] Stopped.")
+
+
+if __name__ == "__main__":
+    main()
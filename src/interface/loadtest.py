@@ -0,0 +1,118 @@
+"""
+Load test for the HTTP service: concurrent clients on keep-alive
+connections, reports achieved QPS and latency percentiles.
+
+Run:  PYTHONPATH=src python -m interface.loadtest --endpoint search --concurrency 16 --requests 2000
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+DEFAULT_QUERIES = [
+    "how do I reset the device",
+    "what is the warranty period",
+    "error code E42 meaning",
+    "summary of the quarterly report",
+    "steps to change a flat tire",
+    "benefits of regular exercise",
+    "installation requirements",
+    "who wrote the introduction",
+]
+
+
+def run_load(url: str, endpoint: str = "search", queries: list[str] = None, concurrency: int = 16,
+             requests: int = 1000, k: int = 5, mode: str = None) -> dict:
+    queries = queries or DEFAULT_QUERIES
+    target = urlparse(url)
+    path = "/" + endpoint.strip("/")
+    field = "question" if path == "/rag" else "query"
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=300)
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    break
+            body = {field: rng.choice(queries), "k": k}
+            if mode:
+                body["mode"] = mode
+            started = time.perf_counter()
+            try:
+                conn.request("POST", path, json.dumps(body), {"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                resp.read()
+                ok = resp.status == 200
+                status = resp.status
+            except (OSError, http.client.HTTPException) as e:
+                ok, status = False, repr(e)
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=300)
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors.append(status)
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    lat_ms = np.array(latencies) * 1000
+    return {
+        "endpoint": path,
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": len(errors),
+        "seconds": round(wall, 3),
+        "qps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50_ms": round(float(np.percentile(lat_ms, 50)), 2) if len(lat_ms) else None,
+        "p90_ms": round(float(np.percentile(lat_ms, 90)), 2) if len(lat_ms) else None,
+        "p99_ms": round(float(np.percentile(lat_ms, 99)), 2) if len(lat_ms) else None,
+        "max_ms": round(float(lat_ms.max()), 2) if len(lat_ms) else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Lura HTTP service")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", default="search", choices=["search", "rag"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--mode", default=None, help="dense / hybrid / lexical (search only)")
+    parser.add_argument("--queries", default=None, help="text file, one query per line")
+    args = parser.parse_args()
+
+    queries = None
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    report = run_load(args.url, args.endpoint, queries, args.concurrency, args.requests, args.k, args.mode)
+    print(f"[LoadTest] {report['ok']}/{report['requests']} ok, {report['errors']} errors in {report['seconds']}s")
+    print(f"[LoadTest] {report['qps']} QPS | p50 {report['p50_ms']} ms | p90 {report['p90_ms']} ms | "
+          f"p99 {report['p99_ms']} ms | max {report['max_ms']} ms")
+    print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+SIMILARITY_THRESHOLD = 0.95     # cosine similarity between question embeddings
+TTL_SECONDS = 3600.0
+MAX_ENTRIES = 1000
+
+
+class AnswerCache:
+    """
+    Semantic cache of RAG answers. A question whose embedding is within
+    `threshold` cosine similarity of a cached question, asked with the same
+    retrieval settings against the same index version, gets the cached
+    answer + sources instead of a search and a full LLM generation.
+    Entries expire after `ttl` seconds; least-recently-used entries are
+    evicted beyond `max_entries`. Entries for an older index version are
+    dropped as soon as they are seen, and invalidate() drops everything.
+    """
+
+    def __init__(self, threshold: float = SIMILARITY_THRESHOLD, ttl: float = TTL_SECONDS,
+                 max_entries: int = MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()   # key -> entry dict, least recently used first
+        self._next_key = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def params_key(**params) -> str:
+        return json.dumps(params, sort_keys=True, default=str)
+
+    def lookup(self, query_vector: np.ndarray, version: str, params: str = "") -> dict:
+        """
+        Returns {"question", "answer", "sources", "similarity"} or None.
+        """
+        q = _unit(query_vector)
+        with self._lock:
+            self._drop_stale(version)
+            keys = [key for key, e in self._entries.items() if e["params"] == params]
+            if not keys:
+                self.misses += 1
+                return None
+
+            sims = np.stack([self._entries[key]["vector"] for key in keys]) @ q
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            key = keys[best]
+            self._entries.move_to_end(key)
+            self.hits += 1
+            e = self._entries[key]
+            return {"question": e["question"], "answer": e["answer"], "sources": e["sources"],
+                    "similarity": float(sims[best])}
+
+    def put(self, question: str, query_vector: np.ndarray, answer: str, sources: list[dict],
+            version: str, params: str = ""):
+        with self._lock:
+            self._entries[self._next_key] = {
+                "question": question,
+                "vector": _unit(query_vector),
+                "answer": answer,
+                "sources": sources,
+                "version": version,
+                "params": params,
+                "created": time.monotonic(),
+            }
+            self._next_key += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _drop_stale(self, version: str):
+        now = time.monotonic()
+        stale = [key for key, e in self._entries.items()
+                 if e["version"] != version or now - e["created"] > self.ttl]
+        for key in stale:
+            del self._entries[key]
+
+    def invalidate(self):
+        """
+        Forget every answer (after ingest, sync, rebuild or reset_index).
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_s": self.ttl,
+        }
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = np.linalg.norm(v)
+    return v / norm if norm else v
+
+
+_instance = None
+_instance_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """
+    Process-wide answer cache shared by the CLI and the HTTP service.
+    """
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = AnswerCache()
+    return _instance
@@ -0,0 +1,192 @@
+"""
+Batch RAG over a question file, for regression-testing answer quality and
+latency. Questions are retrieved in blocks (one batched embed + search per
+block) and answered by one warm LLM; every answer is written to the output
+JSONL as soon as it is done, so an interrupted run can be resumed.
+
+Input: one JSON object per line with "question" and optionally "id"
+(default: line number); other fields (e.g. "expected") are copied to the
+output. Output: the input fields plus "answer", "sources" and per-question
+timings. The answer cache is not used, so every timing is a real run.
+
+Run from the project root:
+    PYTHONPATH=src python -m pipeline.batch_rag questions.jsonl --out answers.jsonl --workers 2
+    PYTHONPATH=src python -m pipeline.batch_rag questions.jsonl --out answers.jsonl --resume
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from pipeline.retrieve import Retriever, SEARCH_MODES
+
+BLOCK_SIZE = 256        # questions per batched retrieval
+
+
+def read_questions(path: str) -> list[dict]:
+    items, seen = [], set()
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            if not item.get("question"):
+                raise ValueError(f"{path}:{n}: no \"question\" field")
+            item.setdefault("id", n)
+            if item["id"] in seen:
+                raise ValueError(f"{path}:{n}: duplicate id {item['id']!r}")
+            seen.add(item["id"])
+            items.append(item)
+    return items
+
+
+def load_done(out_path: str) -> set:
+    """
+    Ids already answered in out_path. Lines cut off by a crash and answers
+    that failed are dropped from the file, so they are run again.
+    """
+    if not os.path.exists(out_path):
+        return set()
+    kept, done = [], set()
+    with open(out_path, "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if "error" not in record:
+            kept.append(line)
+            done.add(record["id"])
+    if len(kept) != len([l for l in lines if l]):
+        with open(out_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("".join(l + "\n" for l in kept))
+        os.replace(out_path + ".tmp", out_path)
+    return done
+
+
+def _source(chunk: dict, with_text: bool) -> dict:
+    source = {key: chunk.get(key) for key in ("id", "doc_path", "chunk_id", "score")}
+    if chunk.get("also_in"):
+        source["also_in"] = chunk["also_in"]
+    if with_text:
+        source["text"] = chunk.get("text")
+    return source
+
+
+def run_batch(questions_path: str, out_path: str, k: int = 5, mode: str = None, workers: int = 1,
+              resume: bool = False, block_size: int = BLOCK_SIZE, source_text: bool = False,
+              retriever=None, llm=None) -> dict:
+    """
+    Answer every question in questions_path into out_path (JSONL).
+    workers threads share the one LLM: generation itself is serialized
+    (one llama.cpp context), but prompt packing and writing results
+    overlap with it. With resume=True questions already answered in
+    out_path are skipped. Returns a summary dict.
+    """
+    items = read_questions(questions_path)
+    done = load_done(out_path) if resume else set()
+    todo = [item for item in items if item["id"] not in done]
+    print(f"[Batch] {len(items)} questions, {len(items) - len(todo)} already answered, {len(todo)} to run.")
+
+    retriever = retriever or Retriever()
+    if llm is None:
+        from inference.local_llm import get_llm
+        llm = get_llm()
+
+    records = []
+    write_lock = threading.Lock()
+
+    def answer(item, chunks, retrieve_ms, out):
+        timings = {}
+        t0 = time.perf_counter()
+        try:
+            text, error = llm.generate(item["question"], chunks, timings=timings), None
+        except Exception as e:
+            text, error = None, f"{type(e).__name__}: {e}"
+        record = {
+            **item,
+            "answer": text,
+            "sources": [_source(c, source_text) for c in chunks],
+            "retrieve_ms": round(retrieve_ms, 3),
+            "generate_ms": round((time.perf_counter() - t0) * 1000, 3),
+        }
+        for key in ("queue_s", "prefill_s", "decode_s"):
+            if key in timings:
+                record[key[:-2] + "_ms"] = round(timings[key] * 1000, 3)
+        for key in ("prompt_tokens", "completion_tokens"):
+            if key in timings:
+                record[key] = timings[key]
+        if error:
+            record["error"] = error
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with write_lock:
+            out.write(line + "\n")
+            out.flush()
+            records.append(record)
+
+    started = time.perf_counter()
+    with open(out_path, "a" if resume else "w", encoding="utf-8") as out, \
+            ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="batch-rag") as pool:
+        for b in range(0, len(todo), block_size):
+            block = todo[b:b + block_size]
+            t0 = time.perf_counter()
+            results = retriever.search_many([item["question"] for item in block], k=k, mode=mode)
+            # one embed + search for the whole block: each question gets its share
+            retrieve_ms = (time.perf_counter() - t0) * 1000 / len(block)
+            list(pool.map(lambda pair: answer(pair[0], pair[1], retrieve_ms, out), zip(block, results)))
+            print(f"[Batch] {min(b + block_size, len(todo))}/{len(todo)} answered.")
+
+    summary = summarize(records, time.perf_counter() - started)
+    summary["skipped"] = len(items) - len(todo)
+    print(f"[Batch] {summary['answered']} answered, {summary['errors']} failed in {summary['seconds']:.1f}s "
+          f"({summary['questions_per_s']:.2f} questions/s) | retrieve p50 {summary['retrieve_p50_ms']} ms, "
+          f"generate p50 {summary['generate_p50_ms']} ms / p99 {summary['generate_p99_ms']} ms")
+    print(f"[Batch] Answers written to {out_path}")
+    return summary
+
+
+def summarize(records: list[dict], seconds: float) -> dict:
+    def pct(key, q):
+        values = [r[key] for r in records if key in r]
+        return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+    completion = sum(r.get("completion_tokens", 0) for r in records)
+    decode_ms = sum(r.get("decode_ms", 0.0) for r in records)
+    return {
+        "answered": sum(1 for r in records if "error" not in r),
+        "errors": sum(1 for r in records if "error" in r),
+        "seconds": round(seconds, 3),
+        "questions_per_s": round(len(records) / seconds, 3) if seconds > 0 else 0.0,
+        "retrieve_p50_ms": pct("retrieve_ms", 50),
+        "retrieve_p99_ms": pct("retrieve_ms", 99),
+        "generate_p50_ms": pct("generate_ms", 50),
+        "generate_p99_ms": pct("generate_ms", 99),
+        "tokens_per_s": round(completion / (decode_ms / 1000), 2) if decode_ms else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions with RAG")
+    parser.add_argument("questions", help="JSONL, one {\"question\": ...} per line")
+    parser.add_argument("--out", default="answers.jsonl")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--mode", default=None, choices=SEARCH_MODES)
+    parser.add_argument("--workers", type=int, default=1, help="threads sharing the one LLM")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="questions per batched retrieval")
+    parser.add_argument("--resume", action="store_true", help="skip questions already answered in --out")
+    parser.add_argument("--source-text", action="store_true", help="include chunk text in the sources")
+    args = parser.parse_args()
+    run_batch(args.questions, args.out, k=args.k, mode=args.mode, workers=args.workers, resume=args.resume,
+              block_size=args.block_size, source_text=args.source_text)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,55 @@
 from .retrieve import Retriever
-from inference.local_llm import LLM
+from .answer_cache import AnswerCache, get_answer_cache
+from inference.local_llm import get_llm
+from telemetry.tracing import traced
 
-def run_rag(question:str):
+def _cached(retriever, question:str, k:int):
+    """
+    Returns (query vector, cache params, cached hit or None).
+    """
+    query_vector = retriever._embed(question)
+    params = AnswerCache.params_key(k=k, mode=retriever.mode, mmr=retriever.mmr_lambda)
+    hit = get_answer_cache().lookup(query_vector, retriever.store.version, params)
+    if hit:
+        print(f"[AnswerCache] Hit (similarity {hit['similarity']:.3f}) for: {hit['question'][:80]}")
+    return query_vector, params, hit
+
+
+@traced("rag")
+def run_rag(question:str, k:int = 5):
     retriever = Retriever()
+    query_vector, params, hit = _cached(retriever, question, k)
+    if hit:
+        return hit["answer"], hit["sources"]
 
-    chunks = retriever.search(question,k=5)
+    chunks = retriever.search(question,k=k)
 
-    llm = LLM()
+    llm = get_llm()
     response = llm.generate(question,chunks)
-    
-    
+    get_answer_cache().put(question, query_vector, response, chunks, retriever.store.version, params)
+
     return response,chunks
-    
+
+
+def stream_rag(question:str, k:int = 5):
+    """
+    Like run_rag, but returns (token generator, chunks) so the answer can be
+    printed while it is generated.
+    """
+    retriever = Retriever()
+    query_vector, params, hit = _cached(retriever, question, k)
+    if hit:
+        return iter([hit["answer"]]), hit["sources"]
+
+    chunks = retriever.search(question,k=k)
+    version = retriever.store.version
+
+    def tokens():
+        parts = []
+        for token in get_llm().stream(question,chunks):
+            parts.append(token)
+            yield token
+        # only complete answers are cached
+        get_answer_cache().put(question, query_vector, "".join(parts).strip(), chunks, version, params)
+
+    return tokens(),chunks
@@ -1,31 +1,82 @@
 from encoder.embedder import EmbeddingModel
-from storage.faiss_store import FaissStore
+from storage.faiss_store import FaissStore, INDEX_PATH
+from storage.collections import load_config, open_collection
+from telemetry.tracing import traced
 import numpy as np
 
+# "dense" = FAISS only, "lexical" = BM25 only, "hybrid" = both, merged by reciprocal-rank fusion
+SEARCH_MODES = ("dense", "hybrid", "lexical")
+RRF_K = 60              # rank damping constant of reciprocal-rank fusion
+HYBRID_FETCH = 2        # candidates fetched per side, as a multiple of k
+# maximal-marginal-relevance re-ranking: drops near-duplicate chunks (overlap, revisions) from the top-k
+MMR_LAMBDA = 0.7        # relevance vs. novelty; 1.0 = plain relevance order, None = MMR off
+MMR_FETCH = 4           # candidates re-ranked, as a multiple of k
+MMR_MAX_CANDIDATES = 400
+
+_UNSET = object()       # mmr_lambda=None means "MMR off", so "not given" needs its own marker
+
 
 class Retriever:
     _instance = None
 
-    def __init__(self, index_path='src/faiss/vector_index.faiss',top_k:int = 5,chunks=None):
+    def __init__(self, index_path:str=None,top_k:int=None,chunks=None,mmap:bool=None,mode:str=None,collection:str=None,
+                 mmr_lambda=_UNSET):
+        # singleton: keep the warm embedder + index instead of reloading per query.
+        # Set Retriever._instance = None after the index changes on disk.
+        # Passing a different collection swaps in that collection's store + model.
+        # On the live instance, mode / top_k / mmr_lambda given here replace the
+        # current ones; a different index_path or mmap raises instead of being ignored.
+        if mode is not None and mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}'. Choose one of {SEARCH_MODES}.")
+        if getattr(self, "_initialized", False) and (collection is None or collection == self.collection):
+            for name, value in (("index_path", index_path), ("mmap", mmap)):
+                if value is not None and value != getattr(self, name):
+                    raise ValueError(
+                        f"[ERROR] Retriever is already open with {name}={getattr(self, name)!r}, not {value!r}. "
+                        f"Set Retriever._instance = None to reopen it."
+                    )
+            if mode is not None:
+                self.mode = mode
+            if top_k is not None:
+                self.top_k = top_k
+            if mmr_lambda is not _UNSET:
+                self.mmr_lambda = mmr_lambda
+            return
+        index_path = index_path or INDEX_PATH
+        mmap = bool(mmap)
         self.index_path = index_path
-        self.top_k = top_k
-        
+        self.mmap = mmap
+        self.top_k = top_k or 5
+        self.mode = mode or "dense"
+        self.collection = collection
+        self.mmr_lambda = MMR_LAMBDA if mmr_lambda is _UNSET else mmr_lambda
+
+        if collection is not None:
+            config = load_config(collection)
+            if not getattr(self, "embedder", None) or self.embedder.model_name != config["embedding_model"]:
+                self.embedder = EmbeddingModel(config["embedding_model"])
+            self.dim = config["dim"]
+            self.store = open_collection(collection, mmap=mmap)
+            self._initialized = True
+            return
+
         self.embedder = EmbeddingModel()
         try:
             self.dim = self.embedder.dim
         except:
             self.dim = 384
         
-        self.store = FaissStore(self.dim,index_path=index_path)
+        # mmap=True shares one read-only copy of the index between processes
         try:
-            self.store.load_index()
+            self.store = FaissStore(self.dim,index_path=index_path,mmap=mmap)
         except:
             print('[Retriever] Warning: Index failed to load')
+            self.store = FaissStore(self.dim,index_path='')
+        self._initialized = True
     
-    def __new__(cls):
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance.store = FaissStore()
         return cls._instance
     
 
@@ -42,17 +93,179 @@ class Retriever:
         return vec
     
 
-    def search(self, query:str, k:int=None):
-        """Embed query, search FAISS, returns top-k text chunks"""
+    @traced("retrieve")
+    def search(self, query:str, k:int=None, mode:str=None, filters:dict=None, diversify:bool=True):
+        """
+        Embed query, search FAISS (and/or BM25), returns top-k text chunks.
+        filters: e.g. {"path_prefix": "/docs/manuals/", "extensions": [".pdf"], "ingested_after": ts}
+        diversify: MMR re-rank an over-fetched candidate pool (see MMR_LAMBDA).
+        """
         k = k or self.top_k
+        mode = mode or self.mode
+        use_mmr = diversify and self.mmr_lambda is not None
+        pool = mmr_pool(k) if use_mmr else k
 
-        if not self.store.index or self.store.index.ntotal == 0:
+        if self.store.ntotal == 0:
             print('[Retriever Error]: No vectors inside FAISS index.')
             return []
-        
-        query_vector = self._embed(query)
-        results = self.store.search_vectors(query_vector,k=k)
-        
-        # results = [(self.chunks[i],float(scores[0][j])) for j, i in enumerate(ids[0])]
+
+        if mode == "lexical":
+            results = self.store.search_lexical(query, k=pool, filters=filters)
+        else:
+            fetch = pool * HYBRID_FETCH if mode == "hybrid" else pool
+            query_vector = self._embed(query)
+            results = self.store.search_vectors(query_vector,k=fetch,filters=filters)
+
+            # results = [(self.chunks[i],float(scores[0][j])) for j, i in enumerate(ids[0])]
+            if mode == "hybrid":
+                results = reciprocal_rank_fusion([results, self.store.search_lexical(query, k=fetch, filters=filters)], pool)
+
+        if use_mmr:
+            results = diversify_results([results], k, self.store, self.mmr_lambda, relative=mode != "dense")[0]
         return results
-        
\ No newline at end of file
+
+    def search_many(self, queries: list[str], k: int = None, batch_size: int = 1024, mode: str = None, filters: dict = None,
+                    diversify: bool = True):
+        """
+        Embed queries in batches and run one FAISS search per batch.
+        Returns one result list per query, in input order.
+        """
+        k = k or self.top_k
+        mode = mode or self.mode
+        use_mmr = diversify and self.mmr_lambda is not None
+        pool = mmr_pool(k) if use_mmr else k
+
+        if self.store.ntotal == 0:
+            print('[Retriever Error]: No vectors inside FAISS index.')
+            return [[] for _ in queries]
+
+        if mode == "lexical":
+            results = [self.store.search_lexical(q, k=pool, filters=filters) for q in queries]
+            if use_mmr:
+                results = diversify_results(results, k, self.store, self.mmr_lambda, relative=True)
+            return results
+
+        fetch = pool * HYBRID_FETCH if mode == "hybrid" else pool
+        results = []
+        for i in range(0, len(queries), batch_size):
+            batch = list(queries[i:i + batch_size])
+            if hasattr(self.embedder, "embed_queries"):
+                vecs = self.embedder.embed_queries(batch)
+            else:
+                vecs = self.embedder.embed_texts(batch)
+            vecs = np.asarray(vecs, dtype=np.float32).reshape(len(batch), -1)
+            dense = self.store.search_many_vectors(vecs, k=fetch, filters=filters)
+            if mode == "hybrid":
+                dense = [reciprocal_rank_fusion([d, self.store.search_lexical(q, k=fetch, filters=filters)], pool)
+                         for d, q in zip(dense, batch)]
+            if use_mmr:
+                dense = diversify_results(dense, k, self.store, self.mmr_lambda, relative=mode != "dense")
+            results.extend(dense)
+        return results
+
+
+def reciprocal_rank_fusion(result_lists: list[list[dict]], k: int) -> list[dict]:
+    """
+    Merge ranked result lists by sum of 1 / (RRF_K + rank). The fused value
+    becomes "score"; each side's own score is kept as "dense_score" /
+    "lexical_score" (first list = dense, second = lexical).
+    """
+    fused = {}
+    for side, results in zip(("dense_score", "lexical_score"), result_lists):
+        for rank, r in enumerate(results, start=1):
+            entry = fused.get(r["id"])
+            if entry is None:
+                entry = fused[r["id"]] = {**r, "score": 0.0}
+            entry["score"] += 1.0 / (RRF_K + rank)
+            entry[side] = r["score"]
+    return sorted(fused.values(), key=lambda r: -r["score"])[:k]
+
+
+def mmr_pool(k: int) -> int:
+    """
+    Candidates to fetch for an MMR re-ranked top-k.
+    """
+    return max(k, min(k * MMR_FETCH, MMR_MAX_CANDIDATES))
+
+
+def mmr_select(relevance: np.ndarray, vectors: np.ndarray, k: int, lambda_: float = MMR_LAMBDA) -> list[int]:
+    """
+    Maximal marginal relevance: repeatedly pick the candidate with the best
+    lambda * relevance - (1 - lambda) * (max cosine similarity to the picks so far).
+    The pairwise similarities come from one (n, n) matrix product; each of
+    the k picks is then a vector update. Returns positions in pick order.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    vectors = np.asarray(vectors, dtype=np.float32)
+    # stored vectors are normalized; sq8 / pq reconstructions only roughly
+    vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    sim = vectors @ vectors.T
+
+    gain = lambda_ * np.asarray(relevance, dtype=np.float32)
+    first = int(np.argmax(relevance))
+    picked = [first]
+    max_sim = sim[first].copy()
+    taken = np.zeros(n, dtype=bool)
+    taken[first] = True
+    for _ in range(k - 1):
+        score = gain - (1.0 - lambda_) * max_sim
+        score[taken] = -np.inf
+        j = int(np.argmax(score))
+        picked.append(j)
+        taken[j] = True
+        np.maximum(max_sim, sim[j], out=max_sim)
+    return picked
+
+
+def _reconstruct_known(store, ids: list[int]):
+    """
+    One id at a time, skipping ids the index can't reconstruct (lexical hits
+    from a snapshot taken before IVF / PQ training, or from an untrained shard).
+    Returns (vectors, {id: row}).
+    """
+    vectors, row = [], {}
+    for i in ids:
+        try:
+            vectors.append(store.reconstruct_vectors([i])[0])
+        except RuntimeError:
+            continue
+        row[i] = len(vectors) - 1
+    return np.asarray(vectors, dtype=np.float32).reshape(len(vectors), store.dim), row
+
+
+def diversify_results(result_lists: list[list[dict]], k, store, lambda_: float = MMR_LAMBDA,
+                      relative=False) -> list[list[dict]]:
+    """
+    MMR re-rank candidate lists down to k results each. The vectors of all
+    candidates are reconstructed from the store in one call.
+    relative: scores are not cosine similarities (BM25, RRF), so each list's
+    scores are divided by its best score first.
+    k and relative may also be given per list. A list holding hits the store
+    has no vector for yet keeps its relevance order.
+    """
+    ks = k if isinstance(k, (list, tuple)) else [k] * len(result_lists)
+    relatives = relative if isinstance(relative, (list, tuple)) else [relative] * len(result_lists)
+    ids = list(dict.fromkeys(r["id"] for results in result_lists for r in results))
+    if not ids:
+        return [results[:k] for results, k in zip(result_lists, ks)]
+    try:
+        vectors = store.reconstruct_vectors(ids)
+        row = {i: n for n, i in enumerate(ids)}
+    except RuntimeError:
+        vectors, row = _reconstruct_known(store, ids)
+
+    out = []
+    for results, k, relative in zip(result_lists, ks, relatives):
+        if len(results) <= 1 or any(r["id"] not in row for r in results):
+            # nothing to diversify, or hits without a vector: keep relevance order
+            out.append(results[:k])
+            continue
+        relevance = np.array([r["score"] for r in results], dtype=np.float32)
+        if relative and relevance.max() > 0:
+            relevance /= relevance.max()
+        picks = mmr_select(relevance, vectors[[row[r["id"]] for r in results]], k, lambda_)
+        out.append([results[i] for i in picks])
+    return out
@@ -0,0 +1,338 @@
+import io
+import math
+import os
+import re
+import struct
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# segment record = header (b"BSEG", payload bytes) + .npz of the docs added in one save
+# delete record  = header (b"BDEL", payload bytes) + int64 ids
+_HEADER = struct.Struct("<4sQ")
+_MAGIC_SEGMENT = b"BSEG"
+_MAGIC_DELETE = b"BDEL"
+
+# words, plus identifiers such as ERR-1042, v2.3.1 or AB_12/7 kept whole
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART = re.compile(r"\w+")
+
+# posting ids are stored as uint32, term frequencies as uint16
+MAX_TF = 65535
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercased terms. Compound identifiers are indexed whole and by their
+    parts, so "ERR-1042" is found by "err-1042" as well as by "1042".
+    """
+    terms = []
+    for m in _TOKEN.finditer(text.lower()):
+        tok = m.group()
+        terms.append(tok)
+        if not tok.isalnum():
+            terms.extend(_PART.findall(tok))
+    return terms
+
+
+class BM25Index:
+    """
+    Inverted index for lexical (BM25) search over the chunk store's chunks,
+    keyed by the same vector ids as the FAISS index.
+    Posting lists are flat uint32 id / uint16 tf arrays, appended in place
+    as chunks are ingested. Removed ids are masked out at query time and
+    purged on compaction.
+    Persisted like the vector log: every save appends one record to
+    <index_path>.bm25; compact() rewrites the file with live postings only.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._reset()
+
+    def _reset(self):
+        self._epoch = object()                    # replaced whenever posting lists are rewritten, not appended to
+        self.postings = {}                        # term -> (array('I') ids, array('H') tfs)
+        self.doc_len = np.zeros(0, dtype=np.uint32)   # by id, 0 = absent / removed
+        self.num_docs = 0
+        self.total_len = 0
+        self.num_removed = 0                      # removed ids still inside posting lists
+        self._unsaved = []                        # (ids, counters) added since the last save
+        self._unsaved_deletes = []                # id arrays removed since the last save
+        self._good_bytes = 0
+
+    def __len__(self):
+        return self.num_docs
+
+    def doc_ids(self) -> np.ndarray:
+        return np.flatnonzero(self.doc_len).astype(np.int64)
+
+    def copy(self, base: "BM25Index" = None) -> "BM25Index":
+        """
+        Independent copy (for read-only snapshots); later adds to this index don't show through.
+        base: an earlier copy of this index. Posting lists nothing was appended
+        to since then are shared with it instead of copied again.
+        """
+        other = BM25Index(self.path, self.k1, self.b)
+        shared = base.postings if base is not None and base._epoch is self._epoch else {}
+        for term, (ids, tfs) in self.postings.items():
+            old = shared.get(term)
+            if old is not None and len(old[0]) == len(ids):
+                other.postings[term] = old
+            else:
+                other.postings[term] = (array("I", ids), array("H", tfs))
+        other._epoch = self._epoch
+        other.doc_len = self.doc_len.copy()
+        other.num_docs = self.num_docs
+        other.total_len = self.total_len
+        other.num_removed = self.num_removed
+        return other
+
+    def add(self, ids, texts: list[str]):
+        counters = [Counter(tokenize(t)) for t in texts]
+        ids = [int(i) for i in ids]
+        self._index(ids, counters)
+        self._unsaved.append((ids, counters))
+
+    def _index(self, ids: list[int], counters: list[Counter]):
+        if ids and max(ids) >= len(self.doc_len):
+            grown = np.zeros(max(max(ids) + 1, 2 * len(self.doc_len)), dtype=np.uint32)
+            grown[:len(self.doc_len)] = self.doc_len
+            self.doc_len = grown
+
+        for doc_id, counts in zip(ids, counters):
+            if self.doc_len[doc_id]:
+                continue
+            length = max(sum(counts.values()), 1)
+            self.doc_len[doc_id] = length
+            self.num_docs += 1
+            self.total_len += length
+            for term, tf in counts.items():
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = (array("I"), array("H"))
+                posting[0].append(doc_id)
+                posting[1].append(min(tf, MAX_TF))
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < len(self.doc_len))]
+        if len(ids) == 0:
+            return
+        self._drop(ids)
+        self._unsaved_deletes.append(ids)
+
+    def _drop(self, ids: np.ndarray):
+        ids = np.unique(ids[ids < len(self.doc_len)])
+        lengths = self.doc_len[ids]
+        live = lengths > 0
+        self.num_docs -= int(live.sum())
+        self.total_len -= int(lengths.sum())
+        self.num_removed += int(live.sum())
+        self.doc_len[ids] = 0
+
+    def search(self, query: str, k: int = 10, allowed: np.ndarray = None) -> list[tuple[int, float]]:
+        """
+        Top-k (id, BM25 score) for the query terms. allowed is an optional
+        boolean mask by id (a metadata filter); other ids are skipped.
+        """
+        if self.num_docs == 0:
+            return []
+        avg_len = self.total_len / self.num_docs
+
+        all_ids = []
+        all_scores = []
+        for term, qtf in Counter(tokenize(query)).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids = np.frombuffer(posting[0], dtype=np.uint32)
+            tfs = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            lengths = self.doc_len[ids]
+            if self.num_removed:
+                live = lengths > 0
+                ids, tfs, lengths = ids[live], tfs[live], lengths[live]
+            if allowed is not None:
+                # df / idf stay corpus-wide, only the candidates are filtered
+                df_all = len(ids)
+                keep = np.zeros(len(ids), dtype=bool)
+                inside = ids < len(allowed)
+                keep[inside] = allowed[ids[inside]]
+                ids, tfs, lengths = ids[keep], tfs[keep], lengths[keep]
+            df = df_all if allowed is not None else len(ids)
+            if len(ids) == 0:
+                continue
+            idf = math.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * lengths / avg_len)
+            all_ids.append(ids)
+            all_scores.append(qtf * idf * tfs * (self.k1 + 1.0) / (tfs + norm))
+
+        if not all_ids:
+            return []
+        ids, inverse = np.unique(np.concatenate(all_ids), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(all_scores))
+
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    # ----- persistence -----
+
+    def save(self, compact: bool = False):
+        if compact:
+            self._write_compacted()
+        else:
+            if self._unsaved:
+                ids = [i for part, _ in self._unsaved for i in part]
+                counters = [c for _, part in self._unsaved for c in part]
+                self._append(_MAGIC_SEGMENT, _pack_segment(ids, counters))
+            if self._unsaved_deletes:
+                self._append(_MAGIC_DELETE, np.concatenate(self._unsaved_deletes).astype(np.int64).tobytes())
+        self._unsaved = []
+        self._unsaved_deletes = []
+
+    def _write_compacted(self):
+        """
+        Rewrite the file as one segment holding only live postings.
+        """
+        if self.num_removed:
+            for term in list(self.postings):
+                ids, tfs = self.postings[term]
+                ids_np = np.frombuffer(ids, dtype=np.uint32)
+                live = self.doc_len[ids_np] > 0
+                if live.all():
+                    continue
+                if not live.any():
+                    del self.postings[term]
+                    continue
+                self.postings[term] = (
+                    array("I", ids_np[live].tobytes()),
+                    array("H", np.frombuffer(tfs, dtype=np.uint16)[live].tobytes()),
+                )
+            self.num_removed = 0
+            self._epoch = object()
+
+        buf = io.BytesIO()
+        terms = list(self.postings)
+        np.savez(
+            buf,
+            doc_ids=self.doc_ids(),
+            doc_len=self.doc_len[self.doc_ids()],
+            terms=_pack_terms(terms),
+            offsets=np.cumsum([0] + [len(self.postings[t][0]) for t in terms]).astype(np.int64),
+            post_ids=np.concatenate([np.frombuffer(self.postings[t][0], dtype=np.uint32) for t in terms]) if terms else np.zeros(0, dtype=np.uint32),
+            post_tfs=np.concatenate([np.frombuffer(self.postings[t][1], dtype=np.uint16) for t in terms]) if terms else np.zeros(0, dtype=np.uint16),
+        )
+        payload = buf.getvalue()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC_SEGMENT, len(payload)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            self._good_bytes = f.tell()
+        os.replace(tmp, self.path)
+
+    def _append(self, magic: bytes, payload: bytes):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            if f.tell() != self._good_bytes:
+                f.truncate(self._good_bytes)
+                f.seek(self._good_bytes)
+            f.write(_HEADER.pack(magic, len(payload)))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            self._good_bytes = f.tell()
+
+    def load(self):
+        """
+        Replay every complete record of the .bm25 file. A torn record at the
+        tail (crash mid-append) is ignored and cut off before the next append.
+        """
+        self._reset()
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                magic, size = _HEADER.unpack(header)
+                payload = f.read(size)
+                if magic not in (_MAGIC_SEGMENT, _MAGIC_DELETE) or len(payload) < size:
+                    print(f"[WARN] Ignoring torn record at the end of {self.path}")
+                    break
+                self._good_bytes = f.tell()
+                if magic == _MAGIC_SEGMENT:
+                    self._load_segment(payload)
+                else:
+                    self._drop(np.frombuffer(payload, dtype=np.int64))
+
+    def _load_segment(self, payload: bytes):
+        seg = np.load(io.BytesIO(payload))
+        doc_ids, doc_len = seg["doc_ids"], seg["doc_len"]
+        if len(doc_ids) == 0:
+            return
+
+        if doc_ids.max() >= len(self.doc_len):
+            grown = np.zeros(max(int(doc_ids.max()) + 1, 2 * len(self.doc_len)), dtype=np.uint32)
+            grown[:len(self.doc_len)] = self.doc_len
+            self.doc_len = grown
+        # vector ids are never reused, so a segment only holds new docs
+        self.doc_len[doc_ids] = doc_len
+        self.num_docs += len(doc_ids)
+        self.total_len += int(doc_len.sum())
+
+        offsets, post_ids, post_tfs = seg["offsets"], seg["post_ids"], seg["post_tfs"]
+        for i, term in enumerate(_unpack_terms(seg["terms"])):
+            lo, hi = offsets[i], offsets[i + 1]
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("I"), array("H"))
+            posting[0].frombytes(post_ids[lo:hi].tobytes())
+            posting[1].frombytes(post_tfs[lo:hi].tobytes())
+
+    def clear(self):
+        """
+        Forget everything in memory; the file is rewritten on the next compacted save.
+        """
+        self._reset()
+
+
+def _pack_terms(terms: list[str]) -> np.ndarray:
+    # newline-joined UTF-8 (terms never contain whitespace), not a fixed-width str array
+    return np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8)
+
+
+def _unpack_terms(packed: np.ndarray) -> list[str]:
+    text = packed.tobytes().decode("utf-8")
+    return text.split("\n") if text else []
+
+
+def _pack_segment(ids: list[int], counters: list[Counter]) -> bytes:
+    by_term = {}
+    for doc_id, counts in zip(ids, counters):
+        for term, tf in counts.items():
+            by_term.setdefault(term, []).append((doc_id, min(tf, MAX_TF)))
+    terms = list(by_term)
+    postings = [p for t in terms for p in by_term[t]]
+
+    buf = io.BytesIO()
+    np.savez(
+        buf,
+        doc_ids=np.asarray(ids, dtype=np.int64),
+        doc_len=np.asarray([max(sum(c.values()), 1) for c in counters], dtype=np.uint32),
+        terms=_pack_terms(terms),
+        offsets=np.cumsum([0] + [len(by_term[t]) for t in terms]).astype(np.int64),
+        post_ids=np.asarray([p[0] for p in postings], dtype=np.uint32),
+        post_tfs=np.asarray([p[1] for p in postings], dtype=np.uint16),
+    )
+    return buf.getvalue()
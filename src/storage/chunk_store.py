@@ -0,0 +1,249 @@
+import fnmatch
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+
+class ChunkStore:
+    """
+    SQLite-backed chunk metadata, keyed by FAISS vector id.
+    Rows added with add() are buffered until commit(), so the chunk store
+    is persisted together with the FAISS index in FaissStore.save_index().
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = None
+        self._pending = []              # rows not yet written to disk
+        self._pending_deletes = set()   # ids to delete at next commit()
+        self._replaced = set()          # stored ids with a pending replacement row (reassign())
+        self._truncate = False          # wipe on-disk rows at next commit()
+
+    @property
+    def conn(self):
+        # opened lazily so a missing / fresh store costs nothing until used
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " id INTEGER PRIMARY KEY,"
+                " text TEXT NOT NULL,"
+                " doc_path TEXT,"
+                " chunk_id INTEGER,"
+                " start_offset INTEGER,"
+                " end_offset INTEGER,"
+                " ingested_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc_path ON chunks(doc_path)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_ingested_at ON chunks(ingested_at)")
+        return self._conn
+
+    def __len__(self):
+        stored = 0 if self._truncate else self.conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        if self._pending_deletes and stored:
+            stored -= len(self._stored_ids(self._pending_deletes))
+        return stored - len(self._replaced) + len(self._pending)
+
+    def _stored_ids(self, ids) -> list[int]:
+        ids = [int(i) for i in ids]
+        found = []
+        for i in range(0, len(ids), 900):   # stay under SQLite's host-parameter limit
+            part = ids[i:i + 900]
+            placeholders = ",".join("?" * len(part))
+            found.extend(r[0] for r in self.conn.execute(f"SELECT id FROM chunks WHERE id IN ({placeholders})", part))
+        return found
+
+    def all_ids(self) -> np.ndarray:
+        """
+        Every live vector id, stored or pending.
+        """
+        stored = [] if self._truncate else [r[0] for r in self.conn.execute("SELECT id FROM chunks") if r[0] not in self._replaced]
+        ids = np.array(stored + [r[0] for r in self._pending], dtype=np.int64)
+        if self._pending_deletes:
+            ids = ids[~np.isin(ids, np.fromiter(self._pending_deletes, dtype=np.int64))]
+        return ids
+
+    def max_id(self) -> int:
+        stored = None if self._truncate else self.conn.execute("SELECT MAX(id) FROM chunks").fetchone()[0]
+        candidates = [r[0] for r in self._pending] + ([stored] if stored is not None else [])
+        return max(candidates) if candidates else -1
+
+    def ids_for_doc(self, doc_path: str) -> list[int]:
+        ids = [] if self._truncate else [r[0] for r in self.conn.execute("SELECT id FROM chunks WHERE doc_path = ?", (doc_path,))
+                                         if r[0] not in self._replaced]
+        ids += [r[0] for r in self._pending if r[2] == doc_path]
+        return [i for i in ids if i not in self._pending_deletes]
+
+    def ids_matching(self, path_prefix: str = None, path_glob: str = None, extensions=None,
+                     ingested_after: float = None, ingested_before: float = None) -> np.ndarray:
+        """
+        Ids of rows matching every given condition. path_glob uses GLOB
+        rules (case-sensitive, "*" also matches "/"); extensions match the
+        end of doc_path case-insensitively; ingest times are epoch seconds.
+        """
+        where, args = [], []
+        if path_prefix:
+            where.append("substr(doc_path, 1, ?) = ?")
+            args += [len(path_prefix), path_prefix]
+        if path_glob:
+            where.append("doc_path GLOB ?")
+            args.append(path_glob)
+        if extensions:
+            exts = [e.lower() if e.startswith(".") else "." + e.lower() for e in extensions]
+            where.append("(" + " OR ".join("lower(doc_path) LIKE ?" for _ in exts) + ")")
+            args += ["%" + e for e in exts]
+        if ingested_after is not None:
+            where.append("ingested_at >= ?")
+            args.append(ingested_after)
+        if ingested_before is not None:
+            where.append("ingested_at < ?")
+            args.append(ingested_before)
+
+        sql = "SELECT id FROM chunks" + (" WHERE " + " AND ".join(where) if where else "")
+        ids = [] if self._truncate else [r[0] for r in self.conn.execute(sql, args) if r[0] not in self._replaced]
+
+        for r in self._pending:
+            doc_path, ingested_at = r[2] or "", r[6]
+            if path_prefix and not doc_path.startswith(path_prefix):
+                continue
+            if path_glob and not fnmatch.fnmatchcase(doc_path, path_glob):
+                continue
+            if extensions and not doc_path.lower().endswith(tuple(exts)):
+                continue
+            if ingested_after is not None and ingested_at < ingested_after:
+                continue
+            if ingested_before is not None and ingested_at >= ingested_before:
+                continue
+            ids.append(r[0])
+
+        ids = np.array(ids, dtype=np.int64)
+        if self._pending_deletes:
+            ids = ids[~np.isin(ids, np.fromiter(self._pending_deletes, dtype=np.int64))]
+        return ids
+
+    def add(self, start_id: int, texts: list[str], doc_path: str = None, chunk_ids: list[int] = None, offsets: list[tuple] = None):
+        """
+        Buffer rows for vector ids start_id .. start_id + len(texts) - 1.
+        """
+        now = time.time()
+        chunk_ids = chunk_ids if chunk_ids is not None else range(start_id, start_id + len(texts))
+        offsets = offsets if offsets is not None else [(None, None)] * len(texts)
+        for i, (text, chunk_id, (start, end)) in enumerate(zip(texts, chunk_ids, offsets)):
+            self._pending.append((start_id + i, text, doc_path, chunk_id, start, end, now))
+
+    def reassign(self, sources: dict):
+        """
+        Point rows at another source: {id: (doc_path, start, end)}.
+        Text and chunk_id stay. Written at the next commit().
+        """
+        rows = self.get_many(sources)
+        pending = {r[0] for r in self._pending}
+        self._replaced |= {i for i in rows if i not in pending}
+        self._pending = [r for r in self._pending if r[0] not in rows]
+        for i, row in rows.items():
+            doc_path, start, end = sources[i]
+            self._pending.append((i, row["text"], doc_path, row["chunk_id"], start, end, row["ingested_at"]))
+
+    def get_many(self, ids) -> dict:
+        """
+        Fetch rows for the given vector ids only. Returns {id: row dict}.
+        """
+        ids = [int(i) for i in ids if int(i) not in self._pending_deletes]
+        rows = {}
+        if not self._truncate:
+            for i in range(0, len(ids), 900):    # SQLite host-parameter limit
+                part = ids[i:i + 900]
+                placeholders = ",".join("?" * len(part))
+                cur = self.conn.execute(
+                    f"SELECT id, text, doc_path, chunk_id, start_offset, end_offset, ingested_at FROM chunks WHERE id IN ({placeholders})",
+                    part,
+                )
+                for r in cur:
+                    rows[r[0]] = self._to_dict(r)
+
+        if self._pending:
+            wanted = set(ids)
+            for r in self._pending:
+                if r[0] in wanted:
+                    rows[r[0]] = self._to_dict(r)
+        return rows
+
+    @staticmethod
+    def _to_dict(r):
+        return {
+            "id": r[0],
+            "text": r[1],
+            "doc_path": r[2],
+            "chunk_id": r[3],
+            "start_offset": r[4],
+            "end_offset": r[5],
+            "ingested_at": r[6],
+        }
+
+    def commit(self):
+        """
+        Write buffered rows (and any pending wipe) in one transaction.
+        """
+        with self.conn:
+            if self._truncate:
+                self.conn.execute("DELETE FROM chunks")
+            self.conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in self._pending_deletes])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO chunks (id, text, doc_path, chunk_id, start_offset, end_offset, ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._pending,
+            )
+        self._pending = []
+        self._pending_deletes = set()
+        self._replaced = set()
+        self._truncate = False
+
+    def delete_ids(self, ids):
+        """
+        Drop rows by vector id. Takes effect on disk at the next commit().
+        """
+        ids = {int(i) for i in ids}
+        self._pending = [r for r in self._pending if r[0] not in ids]
+        self._pending_deletes |= ids
+        self._replaced -= ids
+
+    def delete_from(self, first_id: int):
+        """
+        Delete rows with id >= first_id (orphans of an interrupted save).
+        """
+        self._pending = [r for r in self._pending if r[0] < first_id]
+        with self.conn:
+            self.conn.execute("DELETE FROM chunks WHERE id >= ?", (first_id,))
+
+    def clear(self):
+        """
+        Drop every row. Takes effect on disk at the next commit().
+        """
+        self._pending = []
+        self._pending_deletes = set()
+        self._replaced = set()
+        self._truncate = True
+
+    def discard_pending(self):
+        self._pending = []
+        self._pending_deletes = set()
+        self._replaced = set()
+        self._truncate = False
+
+    def pin(self):
+        """
+        Keep reading the rows as they are now: holds a read transaction open
+        on this connection (WAL), so commits from other connections stay
+        invisible to it. For read-only snapshots; released by close() or
+        when the store is garbage-collected.
+        """
+        self.conn.execute("BEGIN")
+        self.conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchall()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,182 @@
+"""
+Named collections: independent indexes, each with its own embedding model,
+dimension, index kind and number of shards.
+
+    src/faiss/vector_index.faiss            the "default" collection (as before)
+    src/faiss/collections/<name>/
+        collection.json                     name, embedding_model, dim, num_shards, index_type
+        shard_000.faiss (+ .meta/.log/.bm25/.db), shard_001.faiss, ...
+        manifest.db                         sync manifest (sharded collections)
+
+Run from the project root:
+    PYTHONPATH=src python -m storage.collections create papers --model sentence-transformers/all-mpnet-base-v2 --dim 768 --shards 4
+    PYTHONPATH=src python -m storage.collections list
+    PYTHONPATH=src python -m storage.collections ingest papers ./docs
+    PYTHONPATH=src python -m storage.collections rebuild papers --shard 2 --index-type hnsw
+    PYTHONPATH=src python -m storage.collections reset papers --shard 2
+    PYTHONPATH=src python -m storage.collections drop papers
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+
+from storage.faiss_store import FaissStore, INDEX_PATH, INDEX_TYPES, _atomic_write_json
+from storage.sharded_store import ShardedStore
+
+COLLECTIONS_DIR = "src/faiss/collections"
+DEFAULT_COLLECTION = "default"
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L12-v2"
+CONFIG_FILE = "collection.json"
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+def collection_dir(name: str) -> str:
+    return os.path.join(COLLECTIONS_DIR, name)
+
+
+def create_collection(name: str, embedding_model: str = DEFAULT_MODEL, dim: int = 384, num_shards: int = 1,
+                      index_type: str = "flat", **index_params) -> dict:
+    """
+    Register a new empty collection. Returns its config.
+    """
+    if name == DEFAULT_COLLECTION or not _NAME_RE.match(name or ""):
+        raise ValueError(f"Invalid collection name '{name}'.")
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+    if num_shards < 1:
+        raise ValueError("num_shards must be at least 1")
+    path = os.path.join(collection_dir(name), CONFIG_FILE)
+    if os.path.exists(path):
+        raise ValueError(f"Collection '{name}' already exists.")
+
+    config = {
+        "name": name,
+        "embedding_model": embedding_model,
+        "dim": int(dim),
+        "num_shards": int(num_shards),
+        "index_type": index_type,
+        "index_params": index_params,
+    }
+    os.makedirs(collection_dir(name), exist_ok=True)
+    _atomic_write_json(config, path)
+    print(f"[Collections] Created '{name}' ({embedding_model}, dim {dim}, {num_shards} shard(s), {index_type}).")
+    return config
+
+
+def load_config(name: str) -> dict:
+    if name == DEFAULT_COLLECTION:
+        return {"name": DEFAULT_COLLECTION, "embedding_model": DEFAULT_MODEL, "dim": 384,
+                "num_shards": 1, "index_type": "flat", "index_params": {}, "index_path": INDEX_PATH}
+    path = os.path.join(collection_dir(name), CONFIG_FILE)
+    if not os.path.exists(path):
+        raise ValueError(f"Unknown collection '{name}'.")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def list_collections() -> list[dict]:
+    configs = [load_config(DEFAULT_COLLECTION)]
+    if os.path.isdir(COLLECTIONS_DIR):
+        for name in sorted(os.listdir(COLLECTIONS_DIR)):
+            if os.path.exists(os.path.join(collection_dir(name), CONFIG_FILE)):
+                configs.append(load_config(name))
+    return configs
+
+
+def open_collection(name: str = DEFAULT_COLLECTION, mmap: bool = False):
+    """
+    FaissStore for single-shard collections, ShardedStore otherwise.
+    Both offer the same add / remove / save / search methods.
+    """
+    config = load_config(name)
+    if name == DEFAULT_COLLECTION:
+        return FaissStore(config["dim"], index_path=config["index_path"], model_name=config["embedding_model"], mmap=mmap)
+    if config["num_shards"] == 1:
+        return FaissStore(config["dim"], index_path=os.path.join(collection_dir(name), "shard_000.faiss"),
+                          model_name=config["embedding_model"], index_type=config["index_type"], mmap=mmap,
+                          **config.get("index_params", {}))
+    return ShardedStore(collection_dir(name), config["num_shards"], dim=config["dim"],
+                        model_name=config["embedding_model"], index_type=config["index_type"], mmap=mmap,
+                        **config.get("index_params", {}))
+
+
+def drop_collection(name: str):
+    if name == DEFAULT_COLLECTION:
+        raise ValueError("The default collection cannot be dropped; use reset_index instead.")
+    load_config(name)
+    shutil.rmtree(collection_dir(name))
+    print(f"[Collections] Dropped '{name}'.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage Lura collections")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("create")
+    p.add_argument("name")
+    p.add_argument("--model", default=DEFAULT_MODEL)
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--shards", type=int, default=1)
+    p.add_argument("--index-type", default="flat", choices=INDEX_TYPES)
+
+    sub.add_parser("list")
+
+    p = sub.add_parser("drop")
+    p.add_argument("name")
+
+    for command in ("reset", "rebuild"):
+        p = sub.add_parser(command)
+        p.add_argument("name")
+        p.add_argument("--shard", type=int, default=None, help="only this shard (sharded collections)")
+        if command == "rebuild":
+            p.add_argument("--index-type", default=None, choices=INDEX_TYPES)
+
+    p = sub.add_parser("ingest")
+    p.add_argument("name")
+    p.add_argument("paths", nargs="+")
+
+    args = parser.parse_args()
+
+    if args.command == "create":
+        create_collection(args.name, args.model, args.dim, args.shards, args.index_type)
+    elif args.command == "list":
+        for c in list_collections():
+            print(f"  {c['name']:<20} {c['embedding_model']:<45} dim {c['dim']:<5} "
+                  f"shards {c['num_shards']:<3} {c['index_type']}")
+    elif args.command == "drop":
+        drop_collection(args.name)
+    elif args.command == "reset":
+        store = open_collection(args.name)
+        if isinstance(store, ShardedStore) and args.shard is not None:
+            store.reset_shard(args.shard)
+        elif isinstance(store, ShardedStore):
+            for i in range(store.num_shards):
+                store.reset_shard(i)
+        else:
+            FaissStore.reset_index(store.index_path, store.model_name, store.dim, store.index_type, store.index_params)
+    elif args.command == "rebuild":
+        store = open_collection(args.name)
+        if isinstance(store, ShardedStore) and args.shard is not None:
+            store.rebuild_shard(args.shard, args.index_type)
+        else:
+            store.rebuild_index(args.index_type or store.index_type)
+            store.save_index()
+    elif args.command == "ingest":
+        from encoder.embedder import EmbeddingModel
+        from ingestion.parallel import ingest_paths_parallel, scan_files
+
+        config = load_config(args.name)
+        store = open_collection(args.name)
+        embedder = EmbeddingModel(config["embedding_model"])
+        paths = []
+        for p in args.paths:
+            paths.extend(scan_files(p) if os.path.isdir(p) else [p])
+        ingest_paths_parallel(paths, store, embedder)
+        store.save_index()
+
+
+if __name__ == "__main__":
+    main()
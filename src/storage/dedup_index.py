@@ -0,0 +1,360 @@
+import os
+import re
+import sqlite3
+import zlib
+
+import numpy as np
+
+# MinHash signature = NUM_PERM minimums of hashed word 3-shingles. LSH cuts it
+# into BANDS bands of NUM_PERM // BANDS values; two chunks sharing any band are
+# candidates (almost surely above ~0.6 Jaccard similarity) and a candidate is a
+# duplicate when the signatures agree on at least DEDUP_THRESHOLD of positions.
+NUM_PERM = 64
+BANDS = 16
+SHINGLE = 3
+DEDUP_THRESHOLD = 0.9
+
+_ROWS = NUM_PERM // BANDS
+_WORD = re.compile(r"\w+")
+
+# fixed seed: signatures and band keys are persisted
+_rng = np.random.default_rng(0x6C757261)
+_PERM_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_PERM_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_BAND_MIX = _rng.integers(1, 2**63, _ROWS, dtype=np.uint64) | np.uint64(1)
+_BAND_SALT = _rng.integers(1, 2**63, BANDS, dtype=np.uint64)
+_SHINGLE_MUL = np.uint64(0x100000001B3)
+
+
+def minhash(text: str):
+    """
+    uint32 MinHash signature of the text's word shingles, or None when the
+    text has no words.
+    """
+    words = _WORD.findall(text.lower())
+    if not words:
+        return None
+    h = np.fromiter((zlib.crc32(w.encode("utf-8")) for w in words), dtype=np.uint64, count=len(words))
+    n = max(len(h) - SHINGLE + 1, 1)
+    shingles = h[:n].copy()
+    for j in range(1, min(SHINGLE, len(h))):
+        shingles = shingles * _SHINGLE_MUL + h[j:j + n]
+    # multiply-shift hashing, one hash function per permutation
+    hashed = (np.multiply.outer(np.unique(shingles), _PERM_A) + _PERM_B) >> np.uint64(32)
+    return hashed.min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray) -> list[int]:
+    """
+    One LSH bucket per band, as signed 64-bit ints (SQLite INTEGER).
+    """
+    bands = signature.astype(np.uint64).reshape(BANDS, _ROWS)
+    keys = (bands * _BAND_MIX).sum(axis=1) + _BAND_SALT
+    return keys.view(np.int64).tolist()
+
+
+class DedupIndex:
+    """
+    Near-duplicate detection for ingest: MinHash signatures + an LSH bucket
+    table, keyed by the vector id of the chunk that was kept, and the extra
+    sources (doc_path, token offsets) of chunks that were recognised as
+    near-duplicates of it and not embedded again.
+    Lives in the chunk store's SQLite file. Like ChunkStore, changes are
+    buffered until commit(), which FaissStore.save_index() calls.
+
+    New chunks get a provisional (negative) key from assign(); add_vectors()
+    binds it to the chunk's vector id. Chunks not added yet are already
+    matched, so copies within one ingest are caught too.
+    """
+
+    def __init__(self, db_path: str, threshold: float = DEDUP_THRESHOLD):
+        self.db_path = db_path
+        self.threshold = threshold
+        self._conn = None
+        self._reset_pending()
+        self._truncate = False
+        self._any_sources = None    # cached "are there stored sources at all"
+
+    def _reset_pending(self):
+        self._signatures = {}       # key -> signature, new chunks not yet committed
+        self._buckets = {}          # band key -> [key], for _signatures
+        self._sources = []          # (key, doc_path, start, end) not yet committed
+        self._bound = {}            # provisional key -> vector id
+        self._next_key = -1
+        self._deleted = set()       # vector ids removed since the last commit
+        self._dropped_docs = set()  # doc paths whose stored sources are removed
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS minhash (id INTEGER PRIMARY KEY, signature BLOB NOT NULL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS lsh (bucket INTEGER NOT NULL, id INTEGER NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_bucket ON lsh(bucket)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_id ON lsh(id)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sources ("
+                " id INTEGER NOT NULL,"
+                " doc_path TEXT,"
+                " start_offset INTEGER,"
+                " end_offset INTEGER)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sources_id ON sources(id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sources_doc_path ON sources(doc_path)")
+        return self._conn
+
+    def _resolve(self, key: int):
+        """
+        Vector id for a key, or None for a provisional key not added yet.
+        """
+        return key if key >= 0 else self._bound.get(key)
+
+    # ----- ingest -----
+
+    def assign(self, texts: list[str], doc_path: str = None, offsets: list[tuple] = None):
+        """
+        Check a file's chunks before embedding. Near-duplicates of a known
+        chunk are recorded as another source of it. Returns (positions of
+        the chunks to embed, their keys for add_vectors(dedup_keys=...)).
+        """
+        offsets = offsets if offsets is not None else [(None, None)] * len(texts)
+        signatures = [minhash(t) for t in texts]
+        keys = [band_keys(s) if s is not None else None for s in signatures]
+        stored = self._stored_candidates([b for b in keys if b is not None])
+
+        keep, new_keys = [], []
+        for i, (sig, buckets) in enumerate(zip(signatures, keys)):
+            if sig is None:
+                keep.append(i)
+                new_keys.append(None)
+                continue
+            match = self._best_match(sig, buckets, stored)
+            if match is not None:
+                start, end = offsets[i]
+                self._sources.append((match, doc_path, start, end))
+                continue
+            key = self._next_key
+            self._next_key -= 1
+            self._signatures[key] = sig
+            for b in buckets:
+                self._buckets.setdefault(b, []).append(key)
+            keep.append(i)
+            new_keys.append(key)
+        return keep, new_keys
+
+    def _stored_candidates(self, bucket_lists: list[list[int]]) -> dict:
+        """
+        {bucket: [id]} for committed chunks in any of the given buckets.
+        """
+        if self._truncate or not bucket_lists:
+            return {}
+        wanted = list({b for buckets in bucket_lists for b in buckets})
+        found = {}
+        for i in range(0, len(wanted), 900):    # SQLite host-parameter limit
+            part = wanted[i:i + 900]
+            placeholders = ",".join("?" * len(part))
+            for bucket, vid in self.conn.execute(f"SELECT bucket, id FROM lsh WHERE bucket IN ({placeholders})", part):
+                if vid not in self._deleted:
+                    found.setdefault(bucket, []).append(vid)
+        return found
+
+    def _best_match(self, sig: np.ndarray, buckets: list[int], stored: dict):
+        candidates = set()
+        for b in buckets:
+            candidates.update(stored.get(b, ()))
+            candidates.update(self._buckets.get(b, ()))
+        if not candidates:
+            return None
+        best, best_sim = None, self.threshold
+        for key, other in self._candidate_signatures(candidates).items():
+            sim = float(np.count_nonzero(sig == other)) / NUM_PERM
+            if sim >= best_sim:
+                best, best_sim = key, sim
+        return best
+
+    def _candidate_signatures(self, keys) -> dict:
+        out, lookup = {}, []
+        for key in keys:
+            sig = self._signatures.get(key)
+            if sig is not None:
+                out[key] = sig
+            else:
+                lookup.append(key)
+        for i in range(0, len(lookup), 900):
+            part = lookup[i:i + 900]
+            placeholders = ",".join("?" * len(part))
+            for vid, blob in self.conn.execute(f"SELECT id, signature FROM minhash WHERE id IN ({placeholders})", part):
+                out[vid] = np.frombuffer(blob, dtype=np.uint32)
+        return out
+
+    def bind(self, keys, ids):
+        """
+        Provisional keys from assign() -> the vector ids they were added under.
+        """
+        for key, vid in zip(keys, ids):
+            if key is not None and key < 0:
+                self._bound[key] = int(vid)
+
+    # ----- sources -----
+
+    def sources(self, ids) -> dict:
+        """
+        {id: [(doc_path, start_offset, end_offset), ...]} of the near-duplicates
+        folded into each chunk (ids without any are left out).
+        """
+        ids = [int(i) for i in ids if int(i) not in self._deleted]
+        out = {}
+        if ids and self._has_stored_sources():
+            for i in range(0, len(ids), 900):
+                part = ids[i:i + 900]
+                placeholders = ",".join("?" * len(part))
+                cur = self.conn.execute(
+                    f"SELECT id, doc_path, start_offset, end_offset FROM sources WHERE id IN ({placeholders}) ORDER BY rowid",
+                    part,
+                )
+                for vid, doc_path, start, end in cur:
+                    if doc_path not in self._dropped_docs:
+                        out.setdefault(vid, []).append((doc_path, start, end))
+        if self._sources:
+            wanted = set(ids)
+            for key, doc_path, start, end in self._sources:
+                vid = self._resolve(key)
+                if vid in wanted:
+                    out.setdefault(vid, []).append((doc_path, start, end))
+        return out
+
+    def _has_stored_sources(self) -> bool:
+        if self._truncate:
+            return False
+        if self._any_sources is None:
+            self._any_sources = self.conn.execute("SELECT 1 FROM sources LIMIT 1").fetchone() is not None
+        return self._any_sources
+
+    def has_sources(self) -> bool:
+        return bool(self._sources) or self._has_stored_sources()
+
+    def has_doc(self, doc_path: str) -> bool:
+        """
+        True if some chunk of doc_path is stored as a source of another chunk.
+        """
+        if any(s[1] == doc_path for s in self._sources):
+            return True
+        if doc_path in self._dropped_docs or not self._has_stored_sources():
+            return False
+        return self.conn.execute("SELECT 1 FROM sources WHERE doc_path = ? LIMIT 1", (doc_path,)).fetchone() is not None
+
+    def remove_doc(self, doc_path: str):
+        """
+        Forget doc_path as a source of other chunks.
+        """
+        self._sources = [s for s in self._sources if s[1] != doc_path]
+        self._dropped_docs.add(doc_path)
+
+    def remove(self, ids):
+        """
+        Drop signatures and sources of removed vector ids.
+        """
+        ids = {int(i) for i in ids}
+        if not ids:
+            return
+        self._deleted |= ids
+        self._sources = [s for s in self._sources if self._resolve(s[0]) not in ids]
+        for key, vid in list(self._bound.items()):
+            if vid in ids:
+                del self._bound[key]
+                self._signatures.pop(key, None)
+
+    # ----- persistence -----
+
+    def commit(self):
+        """
+        Write buffered changes in one transaction. Chunks that were assigned
+        but not added yet (an ingest in progress) stay buffered.
+        """
+        rows, lsh = [], []
+        for key, sig in self._signatures.items():
+            vid = self._resolve(key)
+            if vid is not None:
+                rows.append((vid, sig.tobytes()))
+                lsh += [(b, vid) for b in band_keys(sig)]
+        sources, waiting = [], []
+        for s in self._sources:
+            vid = self._resolve(s[0])
+            if vid is None:
+                waiting.append(s)
+            else:
+                sources.append((vid,) + s[1:])
+
+        with self.conn:
+            if self._truncate:
+                for table in ("minhash", "lsh", "sources"):
+                    self.conn.execute(f"DELETE FROM {table}")
+            deleted = [(i,) for i in self._deleted]
+            for table in ("minhash", "lsh", "sources"):
+                self.conn.executemany(f"DELETE FROM {table} WHERE id = ?", deleted)
+            self.conn.executemany("DELETE FROM sources WHERE doc_path = ?", [(d,) for d in self._dropped_docs])
+            self.conn.executemany("INSERT OR REPLACE INTO minhash (id, signature) VALUES (?, ?)", rows)
+            self.conn.executemany("INSERT INTO lsh (bucket, id) VALUES (?, ?)", lsh)
+            self.conn.executemany("INSERT INTO sources (id, doc_path, start_offset, end_offset) VALUES (?, ?, ?, ?)", sources)
+
+        unbound = {k: s for k, s in self._signatures.items() if self._resolve(k) is None}
+        next_key = self._next_key
+        self._reset_pending()
+        self._next_key = next_key
+        self._signatures = unbound
+        for key, sig in unbound.items():
+            for b in band_keys(sig):
+                self._buckets.setdefault(b, []).append(key)
+        self._sources = waiting
+        self._truncate = False
+        self._any_sources = None
+
+    def discard_unbound(self):
+        """
+        Forget chunks assigned by an ingest that stopped before adding them,
+        so later copies are not folded into a chunk that was never stored.
+        """
+        for key in [k for k in self._signatures if self._resolve(k) is None]:
+            del self._signatures[key]
+        self._buckets = {b: [k for k in keys if k in self._signatures] for b, keys in self._buckets.items()}
+        self._sources = [s for s in self._sources if self._resolve(s[0]) is not None]
+
+    def delete_from(self, first_id: int):
+        """
+        Delete entries with id >= first_id (orphans of an interrupted save).
+        """
+        with self.conn:
+            for table in ("minhash", "lsh", "sources"):
+                self.conn.execute(f"DELETE FROM {table} WHERE id >= ?", (first_id,))
+        self._any_sources = None
+
+    def clear(self):
+        """
+        Drop everything. Takes effect on disk at the next commit().
+        """
+        self._reset_pending()
+        self._truncate = True
+
+    def counts(self) -> dict:
+        """
+        Committed signatures and folded-in duplicate sources.
+        """
+        if self._truncate:
+            return {"signatures": 0, "sources": 0}
+        return {
+            "signatures": self.conn.execute("SELECT COUNT(*) FROM minhash").fetchone()[0],
+            "sources": self.conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0],
+        }
+
+    def pin(self):
+        """
+        Read the tables as they are now from here on (see ChunkStore.pin()).
+        """
+        self.conn.execute("BEGIN")
+        self.conn.execute("SELECT 1 FROM sources LIMIT 1").fetchall()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
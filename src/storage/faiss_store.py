@@ -1,35 +1,116 @@
+import copy
 import faiss
 import numpy as np
 import os
 import json
+import uuid
+from collections import OrderedDict
+
+from storage.bm25_index import BM25Index
+from storage.chunk_store import ChunkStore
+from storage.dedup_index import DedupIndex
+from storage.vector_log import VectorLog
+from telemetry.tracing import traced, annotate, span
 
 INDEX_PATH = "src/faiss/vector_index.faiss"
 
+# Supported index kinds. "flat" is exact brute force, "ivf" and "hnsw" are
+# approximate and trade a little recall for much lower query latency.
+# "sq8" and "pq" compress the stored vectors (4x and 24x+ smaller for dim 384).
+INDEX_TYPES = ("flat", "ivf", "hnsw", "sq8", "pq")
+COMPRESSED_TYPES = ("sq8", "pq")
+
+DEFAULT_INDEX_PARAMS = {
+    "nlist": 1024,          # IVF: number of coarse clusters
+    "nprobe": 16,           # IVF: clusters visited per query
+    "hnsw_m": 32,           # HNSW: graph neighbours per node
+    "ef_construction": 80,  # HNSW: build-time search depth
+    "ef_search": 64,        # HNSW: query-time search depth
+    "pq_m": 16,             # PQ: sub-quantizers (must divide dim)
+    "pq_nbits": 8,          # PQ: bits per sub-quantizer code
+    "rescore": False,       # SQ8/PQ: rescore candidates with exact float32 vectors
+    "rescore_k_factor": 4,  # SQ8/PQ: candidates fetched per result when rescoring
+}
+
+# The vector log is folded back into the base index once it holds this many
+# vectors, or more than this fraction of the base index, whichever is larger.
+COMPACT_MIN_VECTORS = 20_000
+COMPACT_RATIO = 0.5
+
+# Metadata filters accepted by search_vectors / search_lexical (see ChunkStore.ids_matching).
+FILTER_KEYS = ("path_prefix", "path_glob", "extensions", "ingested_after", "ingested_before")
+# Filters matching at most this many chunks are answered by an exact scan of
+# just those vectors (kept in memory) instead of a selector over the whole index.
+SUBSET_SCAN_MAX = 10_000
+SUBSET_SCAN_BLOCK = 65_536
+FILTER_CACHE_SIZE = 16
+
+# IO_FLAG_MMAP_IFC also maps flat / SQ / PQ code arrays (faiss >= 1.9);
+# older builds only map IVF inverted lists.
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
 class FaissStore:
     """
-    Local vector database using FAISS + JSON metadata
+    Local vector database using FAISS + a SQLite chunk store.
+    The .meta file only holds the index header (model, dim, index kind, count);
+    chunk text lives in <index_path>.db and is fetched per hit.
+    Vectors added since the last full write go to an append-only
+    <index_path>.log that load_index() replays. A BM25 index over the same
+    chunks (<index_path>.bm25) serves lexical / hybrid search.
+    Near-duplicate chunks found at ingest (see dedup_chunks()) are stored
+    once, with the other copies kept as extra sources of that chunk.
+    Vectors are stored under explicit ids (IndexIDMap2, or the IVF index's
+    own ids), so documents can be removed or replaced; the vector id is the
+    chunk store key.
     """
 
-    def __init__(self, dim: int = 384, index_path: str = INDEX_PATH, model_name:str = "sentence-transformers/all-MiniLM-L12-v2"):
+    def __init__(self, dim: int = 384, index_path: str = INDEX_PATH, model_name:str = "sentence-transformers/all-MiniLM-L12-v2",
+                 index_type: str = "flat", mmap: bool = False, **index_params):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+
         self.dim = dim
         self.model_name = model_name
         self.index_path = index_path
         self.meta_path = index_path + ".meta"
-
-        self.index = faiss.IndexFlatIP(dim)
-
-        self.documents = []
-        self.doc_paths = []
-        self.chunk_ids = []
+        self.db_path = index_path + ".db"
+        self.log_path = index_path + ".log"
+        self.bm25_path = index_path + ".bm25"
+        # memory-mapped indexes share the OS page cache across processes but are read-only
+        self.mmap = mmap
+        self.read_only = False            # True for snapshot() copies
+
+        self.index_type = index_type
+        self.index_params = {**DEFAULT_INDEX_PARAMS, **index_params}
+        self.index = self._new_index()
+
+        self.chunks = ChunkStore(self.db_path)
+        self.vector_log = VectorLog(self.log_path, dim)
+        self.lexical = BM25Index(self.bm25_path)
+        self.dedup = DedupIndex(self.db_path)
+        self._unsaved = []                # (start_id, vectors) not yet persisted
+        self._unsaved_deletes = []        # id arrays removed since the last save
+        self._needs_compaction = False    # base index must be rewritten in full
+        self.next_id = 0                  # next vector id to hand out
+        self._train_buffer = []           # (vectors, ids) waiting for an untrained index
+        self._filter_cache = OrderedDict()  # filter key -> resolved id bitmap, until ids change
+        # see `version`: the generation is renewed by each save that wrote changes
+        self.generation = uuid.uuid4().hex
+        self._mutations = 0
 
         # Auto-load index + metadata if present
         if os.path.exists(self.index_path):
             self.load_index()
 
-    def add_vectors(self, vectors: np.ndarray, texts: list[str], file_path: str = None, embedder_model:str=None):
+    @traced("add_vectors")
+    def add_vectors(self, vectors: np.ndarray, texts: list[str], file_path: str = None, embedder_model:str=None, offsets: list[tuple] = None,
+                    dedup_keys: list = None):
         """
         Add vectors + metadata WITHOUT calling load_index() internally.
+        dedup_keys are the keys dedup_chunks() returned for these chunks.
         """
+        self._check_writable("ingest")
+
         if embedder_model and embedder_model != self.model_name:
             raise ValueError(
                 f"\n[ERROR] Embedding model mismatch.\n"
@@ -48,158 +129,823 @@ class FaissStore:
                 f"Run option 3 (Rebuild Index) to fix this safely.\n"
             )
         
-        self.index.add(vectors)
+        start = self.next_id
+        self._filter_cache.clear()
+        self._mutations += 1
+        self._add_to_index(vectors, np.arange(start, start + len(vectors), dtype=np.int64))
+        self._unsaved.append((start, vectors))
+        self.next_id += len(vectors)
+
+        self.chunks.add(start, texts, doc_path=file_path, offsets=offsets)
+        self.lexical.add(range(start, start + len(texts)), texts)
+        if dedup_keys is not None:
+            self.dedup.bind(dedup_keys, range(start, start + len(texts)))
+
+        annotate(vectors=len(vectors))
+        print(f"Added {len(vectors)} vectors. Total docs: {self.ntotal}")
 
-        start = len(self.documents)
 
-        self.documents.extend(texts)
-        self.doc_paths.extend([file_path] * len(texts))
+    def dedup_chunks(self, texts: list[str], file_path: str = None, offsets: list[tuple] = None):
+        """
+        Ingest-time near-duplicate check, between chunking and embedding.
+        Chunks that nearly match one already stored (or kept earlier in the
+        same ingest) become an extra source of that chunk instead of a new
+        vector. Returns (positions of the chunks to embed, dedup keys to
+        pass to add_vectors for them).
+        """
+        self._check_writable("ingest")
+        return self.dedup.assign(texts, doc_path=file_path, offsets=offsets)
+
+    def cancel_dedup(self):
+        """
+        After a failed ingest: forget chunks dedup_chunks() let through that
+        were never added, so later copies are not matched against them.
+        """
+        self.dedup.discard_unbound()
+
+    def has_doc(self, doc_path: str) -> bool:
+        """
+        True if any chunk of doc_path is indexed, as its own row or as a
+        duplicate source of another document's chunk.
+        """
+        return bool(self.chunks.ids_for_doc(doc_path)) or self.dedup.has_doc(doc_path)
 
-        self.chunk_ids.extend(range(start, start + len(texts)))
+    @property
+    def version(self) -> str:
+        """
+        Changes whenever the searchable content changes: on add / remove /
+        rebuild / reset in this process, and on every save that wrote
+        changes (so other processes that reload see a new value too).
+        """
+        return f"{self.generation}.{self._mutations}"
 
+    def _check_writable(self, action: str):
+        if self.read_only:
+            raise ValueError(f"[ERROR] This is a read-only snapshot. Use the writer store to {action}.")
+        if self.mmap:
+            raise ValueError(f"[ERROR] Index was loaded memory-mapped (read-only). Open FaissStore(mmap=False) to {action}.")
 
-        print(f"Added {len(vectors)} vectors. Total docs: {len(self.documents)}")
+    def snapshot(self, base: "FaissStore" = None) -> "FaissStore":
+        """
+        Read-only copy for concurrent readers: a cloned index, copied BM25
+        postings and its own chunk store connections, each holding a read
+        transaction open on the committed rows, so later writes to this
+        store never show through. Pending chunk rows are committed first;
+        vectors still waiting for IVF / PQ training are not included.
+        base: the previous snapshot; BM25 postings unchanged since are shared with it.
+        """
+        self.chunks.commit()
+        self.dedup.commit()
+        snap = copy.copy(self)
+        snap.index = faiss.clone_index(self.index)
+        snap.index_params = dict(self.index_params)
+        snap.chunks = ChunkStore(self.db_path)
+        snap.chunks.pin()
+        snap.dedup = DedupIndex(self.db_path)
+        snap.dedup.pin()
+        snap.lexical = self.lexical.copy(base.lexical if base is not None else None)
+        snap.vector_log = None
+        snap._train_buffer = []
+        snap._unsaved = []
+        snap._unsaved_deletes = []
+        snap._filter_cache = OrderedDict()
+        snap.read_only = True
+        return snap
+
+    def _add_to_index(self, vectors: np.ndarray, ids: np.ndarray):
+        if self.index.is_trained:
+            self.index.add_with_ids(vectors, ids)
+            return
+        # IVF / PQ: hold vectors back until there are enough to train on,
+        # instead of training on whatever the first file happened to contain
+        self._train_buffer.append((vectors, ids))
+        if sum(len(v) for v, _ in self._train_buffer) >= self._min_train_size():
+            self._flush_train_buffer()
+
+    def _min_train_size(self) -> int:
+        if self.index_type == "ivf":
+            return 39 * self.index_params["nlist"]
+        if self.index_type == "pq":
+            return 39 * (1 << self.index_params["pq_nbits"])
+        return 1
+
+    def _flush_train_buffer(self):
+        """
+        Train on everything buffered so far (shrinking nlist / code size if
+        it is still too little) and add it to the index.
+        """
+        if not self._train_buffer:
+            return
+        vectors = np.vstack([v for v, _ in self._train_buffer])
+        ids = np.concatenate([i for _, i in self._train_buffer])
+        self._train_buffer = []
+        self._train(vectors)
+        self.index.add_with_ids(vectors, ids)
 
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal + sum(len(v) for v, _ in self._train_buffer)
 
-    def save_index(self):
+    def remove_ids(self, ids) -> int:
+        """
+        Remove vectors + chunk rows by vector id. HNSW and rescoring indexes
+        can't delete in place: their rows are dropped (so the vectors never
+        come back as hits) and the vectors are purged by the next rebuild_index().
+        """
+        self._check_writable("delete")
+
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return 0
+        self._flush_train_buffer()
+        self._filter_cache.clear()
+        self._mutations += 1
+        try:
+            self.index.remove_ids(ids)
+        except RuntimeError:
+            pass
+        self.chunks.delete_ids(ids)
+        self.lexical.remove(ids)
+        self.dedup.remove(ids)
+        self._unsaved_deletes.append(ids)
+        return len(ids)
+
+    def remove_doc(self, doc_path: str) -> int:
         """
-        Save FAISS + JSON metadata properly
+        Remove every chunk ingested from doc_path. Returns the number removed.
+        Chunks that other documents still have near-duplicates of are kept
+        and handed over to one of those documents instead.
+        """
+        self._check_writable("delete")
+        ids = self.chunks.ids_for_doc(doc_path)
+        self.dedup.remove_doc(doc_path)
+        moved = {idx: sources[0] for idx, sources in self.dedup.sources(ids).items()}
+        if moved:
+            self.chunks.reassign(moved)
+            self._filter_cache.clear()
+            self._mutations += 1
+        return self.remove_ids([i for i in ids if i not in moved])
+
+    @traced("save_index")
+    def save_index(self, compact: bool = None):
+        """
+        Persist new vectors + metadata. By default only the vectors added
+        since the last save are appended to the vector log; the base index
+        is rewritten (atomically) when it doesn't exist yet, after a rebuild
+        or reset, when the log has grown too large, or when compact=True.
         """
         print("[Saving Index...]")
+        self._check_writable("save")
         os.makedirs(os.path.dirname(self.index_path) or ".", exist_ok=True)
+        self._flush_train_buffer()
 
-        # Build metadata JSON
+        if compact is None:
+            compact = (
+                self._needs_compaction
+                or not os.path.exists(self.index_path)
+                or self._log_too_big()
+            )
+
+        # Chunk rows go first: rows without vectors are dropped on load,
+        # so a crash between the two steps just loses the unsaved batch.
+        self.chunks.commit()
+        self.dedup.commit()
+
+        # rebuilt from the chunk store on load if it falls behind
+        self.lexical.save(compact=compact)
+
+        if compact:
+            _atomic_write_index(self.index, self.index_path)
+            self.vector_log.clear()
+            self._needs_compaction = False
+        else:
+            if self._unsaved:
+                start = self._unsaved[0][0]
+                self.vector_log.append(start, np.vstack([v for _, v in self._unsaved]))
+            if self._unsaved_deletes:
+                self.vector_log.append_delete(np.concatenate(self._unsaved_deletes))
+        annotate(compact=int(compact), appended=sum(len(v) for _, v in self._unsaved))
+        self._unsaved = []
+        self._unsaved_deletes = []
+
+        if self._mutations:
+            self.generation = uuid.uuid4().hex
+            self._mutations = 0
+        self._write_meta()
+        print('[Index Saving Complete]' + ('' if compact else f' (appended, {self.vector_log.num_vectors} vectors in log)'))
+
+    def _log_too_big(self) -> bool:
+        pending = self.vector_log.num_vectors + sum(len(v) for _, v in self._unsaved)
+        pending += self.vector_log.num_deleted + sum(len(i) for i in self._unsaved_deletes)
+        base = max(self.index.ntotal - pending, 0)
+        return pending >= max(COMPACT_MIN_VECTORS, COMPACT_RATIO * base)
+
+    def compact(self):
+        """
+        Fold the vector log into the base index file.
+        """
+        self.save_index(compact=True)
+
+    def _write_meta(self):
         metadata = {
             "dim": self.dim,
             "embedding_model": self.model_name,
-            "count": len(self.documents),
-            "chunks": []
+            "index_type": self.index_type,
+            "index_params": self.index_params,
+            "count": self.index.ntotal,
+            "next_id": self.next_id,
+            "log_count": self.vector_log.num_vectors,
+            "chunk_store": os.path.basename(self.db_path),
+            "generation": self.generation,
         }
-
-        for i, text in enumerate(self.documents):
-            metadata["chunks"].append({
-                "id": i,
-                "text": text,
-                "doc_path": self.doc_paths[i],
-                "chunk_id": self.chunk_ids[i]
-            })
-
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, ensure_ascii=False, indent=4)
-
-        faiss.write_index(self.index, self.index_path)
-        print('[Index Saving Complete]')
-
+        _atomic_write_json(metadata, self.meta_path)
+
+    def _reset_state(self):
+        self.index = self._new_index()
+        self._train_buffer = []
+        self.chunks.clear()
+        self.dedup.clear()
+        self.lexical.clear()
+        self._filter_cache.clear()
+        self._unsaved = []
+        self._unsaved_deletes = []
+        self._needs_compaction = True
+        self.next_id = 0
+        self.generation = uuid.uuid4().hex
+        self._mutations = 0
 
     def load_index(self):
         """
-        Safely load FAISS + JSON metadata
+        Safely load FAISS index + .meta header. Chunk text stays on disk.
         """
 
+        self._filter_cache.clear()
+
         # CASE 1: No FAISS file -> start fresh
         if not os.path.exists(self.index_path):
             print("[INFO] No index found. Creating empty index.")
-            self.index = faiss.IndexFlatIP(self.dim)
-            self.documents, self.doc_paths, self.chunk_ids = [], [], []
+            self._reset_state()
             return
 
+        # a memory-mapped index is read-only, so pending log records can't be
+        # replayed into it; load it into RAM instead until the log is compacted
+        mmap = self.mmap
+        if mmap and os.path.exists(self.log_path) and os.path.getsize(self.log_path) > 0:
+            print("[INFO] Vector log not compacted yet, loading index into memory instead of mmap.")
+            mmap = False
+
         # CASE 2: FAISS file exists: try loading
         try:
-            self.index = faiss.read_index(self.index_path)
+            if mmap:
+                self.index = faiss.read_index(self.index_path, MMAP_FLAGS)
+            else:
+                self.index = faiss.read_index(self.index_path)
         except Exception:
             print("[WARN] FAISS index corrupted. Resetting index.")
-            self.index = faiss.IndexFlatIP(self.dim)
-            self.documents, self.doc_paths, self.chunk_ids = [], [], []
+            self._reset_state()
             return
 
         if not os.path.exists(self.meta_path):
             print("[WARN] Metadata missing → starting fresh.")
-            self.documents, self.doc_paths, self.chunk_ids = [], [], []
+            self._reset_state()
             return
-        elif os.path.exists(self.meta_path):
-            try:
-                with open(self.meta_path, "r", encoding="utf-8") as f:
-                    meta = json.load(f)
-
-                self.dim = meta.get("dim", self.dim)
-                chunks = meta.get("chunks", [])
-                self.model_name = meta.get("embedding_model",self.model_name)
-                self.documents = [c["text"] for c in chunks]
-                self.doc_paths = [c["doc_path"] for c in chunks]
-                self.chunk_ids = [c["chunk_id"] for c in chunks]
-
-                if len(self.documents) != self.index.ntotal:
-                    print("[WARN] Metadata count mismatch. Resetting index.")
-                    self.index = faiss.IndexFlatIP(self.dim)
-                    self.documents, self.doc_paths, self.chunk_ids = [], [], []
-            except Exception:
-                print("[WARN] Metadata corrupted. Resetting index.")
-                self.index = faiss.IndexFlatIP(self.dim)
-                self.documents, self.doc_paths, self.chunk_ids = [], [], []
 
-    
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+
+            self.dim = meta.get("dim", self.dim)
+            self.generation = meta.get("generation", self.generation)
+            self.model_name = meta.get("embedding_model",self.model_name)
+            # indexes written before index kinds existed are always flat
+            self.index_type = meta.get("index_type", "flat")
+            self.index_params = {**DEFAULT_INDEX_PARAMS, **meta.get("index_params", {})}
+            self._apply_search_params()
+
+            if "chunks" in meta:
+                self._migrate_legacy_meta(meta["chunks"])
+
+            if not _has_explicit_ids(self.index) and not mmap:
+                self._wrap_id_map()
+            elif self.index_type == "ivf" and not mmap:
+                _ensure_ivf_id_lookup(self.index)
+
+            self._replay_log()
+
+            index_next = self._max_index_id() + 1
+            self.next_id = max(meta.get("next_id", 0), index_next, self.chunks.max_id() + 1)
+            if self.chunks.max_id() >= index_next and not self.mmap:
+                # save interrupted between the chunk commit and the vector write
+                print("[WARN] Dropping chunk rows from an interrupted save.")
+                self.chunks.delete_from(index_next)
+                self.dedup.delete_from(index_next)
+
+            self._load_lexical()
+        except Exception:
+            print("[WARN] Metadata corrupted. Resetting index.")
+            self._reset_state()
+
+    def _load_lexical(self):
+        """
+        Load the BM25 index and bring it in line with the chunk store
+        (older indexes have no .bm25 yet; a crash can leave it behind).
+        """
+        self.lexical.load()
+        chunk_ids = self.chunks.all_ids()
+        lexical_ids = self.lexical.doc_ids()
+        missing = np.setdiff1d(chunk_ids, lexical_ids)
+        stale = np.setdiff1d(lexical_ids, chunk_ids)
+        if len(stale):
+            self.lexical.remove(stale)
+        if len(missing):
+            print(f"[INFO] Building lexical index for {len(missing)} chunks.")
+            for i in range(0, len(missing), 10_000):
+                rows = self.chunks.get_many(missing[i:i + 10_000])
+                ids = sorted(rows)
+                self.lexical.add(ids, [rows[j]["text"] for j in ids])
+        if (len(missing) or len(stale)) and not self.mmap:
+            self.lexical.save(compact=True)
+
+    @traced("search_lexical")
+    def search_lexical(self, query: str, k: int = 3, filters: dict = None):
+        """
+        BM25 search over chunk text. Results have the same shape as
+        search_vectors(), with the BM25 score as "score".
+        """
+        allowed = self._filter_entry(filters)["mask"] if filters else None
+        hits = self.lexical.search(query, k, allowed=allowed)
+        rows = self.chunks.get_many([idx for idx, _ in hits])
+        results = []
+        for idx, score in hits:
+            row = rows.get(idx)
+            if row is None:
+                continue
+            results.append({
+                "id": idx,
+                "text": row["text"],
+                "doc_path": row["doc_path"],
+                "chunk_id": row["chunk_id"],
+                "score": score
+            })
+        self._attach_sources([results])
+        return results
+
+    def _replay_log(self):
+        """
+        Re-add vectors from the append log on top of the base index.
+        Records already folded into the base (crash mid-compaction) are skipped.
+        """
+        self.vector_log = VectorLog(self.log_path, self.dim)
+        self._unsaved = []
+        self._unsaved_deletes = []
+        self._train_buffer = []
+        # ids are handed out in increasing order, so anything below the
+        # base index's next id was already compacted into it
+        base_next = self._max_index_id() + 1
+        replayed = 0
+        for kind, start, data in self.vector_log.replay():
+            if kind == "add":
+                if start < base_next:
+                    continue
+                self._add_to_index(data, np.arange(start, start + len(data), dtype=np.int64))
+                replayed += len(data)
+            else:
+                try:
+                    self.index.remove_ids(data)
+                except RuntimeError:
+                    pass    # tombstoned: rows are gone, vectors purged on rebuild
+        if replayed:
+            print(f"[INFO] Replayed {replayed} vectors from the vector log.")
+
+    def _max_index_id(self) -> int:
+        ids = np.concatenate([_index_ids(self.index)] + [i for _, i in self._train_buffer])
+        return int(ids.max()) if len(ids) else -1
+
+    def _wrap_id_map(self):
+        """
+        Migrate a positional (pre-IDMap) index: vector id = old position.
+        """
+        ids, vectors = self.get_all_vectors()
+        self.index = self._new_index()
+        if len(vectors):
+            self._add_to_index(vectors, ids)
+        self._needs_compaction = True
 
-    def search_vectors(self, query_vector: np.ndarray, k: int = 3):
-        faiss.normalize_L2(query_vector)
-        scores, indices = self.index.search(query_vector, k)
+    def _migrate_legacy_meta(self, chunks: list[dict]):
+        """
+        One-time move of a pre-chunk-store .meta (all text inline) into SQLite.
+        """
+        print(f"[Migrate] Moving {len(chunks)} chunks from .meta into {self.db_path}")
+        self.chunks.clear()
+        for c in chunks:
+            self.chunks.add(c["id"], [c["text"]], doc_path=c.get("doc_path"), chunk_ids=[c.get("chunk_id", c["id"])])
+        self.chunks.commit()
+        if not self.mmap:
+            self._write_meta()
+
+    def _new_index(self, index_type: str = None):
+        """
+        Build an empty FAISS index of the requested kind (inner product metric).
+        """
+        index_type = index_type or self.index_type
+        p = self.index_params
+
+        if index_type == "flat":
+            spec = "Flat"
+        elif index_type == "ivf":
+            spec = f"IVF{p['nlist']},Flat"
+        elif index_type == "hnsw":
+            spec = f"HNSW{p['hnsw_m']},Flat"
+        elif index_type == "sq8":
+            spec = "SQ8"
+        elif index_type == "pq":
+            if self.dim % p["pq_m"] != 0:
+                raise ValueError(f"pq_m={p['pq_m']} must divide the vector dimension {self.dim}.")
+            spec = f"PQ{p['pq_m']}x{p['pq_nbits']}"
+        else:
+            raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
+
+        # keep the float32 originals in a refine index to rescore compressed hits exactly
+        if index_type in COMPRESSED_TYPES and p["rescore"]:
+            spec += ",RFlat"
+
+        if index_type == "ivf":
+            # IVF keeps its own ids; IndexIDMap2 over IVF breaks on remove_ids
+            index = faiss.index_factory(self.dim, spec, faiss.METRIC_INNER_PRODUCT)
+            _ensure_ivf_id_lookup(index)
+        else:
+            index = faiss.index_factory(self.dim, "IDMap2," + spec, faiss.METRIC_INNER_PRODUCT)
+        if index_type == "hnsw":
+            faiss.downcast_index(faiss.downcast_index(index).index).hnsw.efConstruction = p["ef_construction"]
+
+        self._apply_search_params(index, index_type)
+        return index
+
+    def _apply_search_params(self, index=None, index_type: str = None):
+        """
+        Push nprobe / efSearch / rescore k-factor onto the live index.
+        """
+        index = index if index is not None else self.index
+        index_type = index_type or self.index_type
+        ps = faiss.ParameterSpace()
+        if index_type == "ivf":
+            ps.set_index_parameter(index, "nprobe", self.index_params["nprobe"])
+        elif index_type == "hnsw":
+            ps.set_index_parameter(index, "efSearch", self.index_params["ef_search"])
+        elif index_type in COMPRESSED_TYPES and self.index_params["rescore"]:
+            ps.set_index_parameter(index, "k_factor_rf", self.index_params["rescore_k_factor"])
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None, rescore_k_factor: int = None):
+        """
+        Tune query-time recall/latency without rebuilding the index.
+        """
+        if nprobe is not None:
+            self.index_params["nprobe"] = int(nprobe)
+        if ef_search is not None:
+            self.index_params["ef_search"] = int(ef_search)
+        if rescore_k_factor is not None:
+            self.index_params["rescore_k_factor"] = int(rescore_k_factor)
+        self._apply_search_params()
+
+    def _train(self, vectors: np.ndarray):
+        """
+        Train an IVF / PQ index on the first batch it sees. FAISS needs at
+        least one training point per centroid, so nlist (IVF) or the PQ code
+        size is shrunk for small batches; call rebuild_index() once the
+        corpus has grown to retrain properly.
+        """
+        n = len(vectors)
+        if self.index_type == "ivf":
+            nlist = self.index_params["nlist"]
+            usable = max(1, n // 39)
+            if usable < nlist:
+                print(f"[WARN] Only {n} training vectors, using nlist={usable} instead of {nlist}.")
+                self.index_params["nlist"] = usable
+                self.index = self._new_index()
+        elif self.index_type == "pq":
+            nbits = self.index_params["pq_nbits"]
+            usable = max(1, min(nbits, int(np.log2(max(n, 2)))))
+            if usable < nbits:
+                print(f"[WARN] Only {n} training vectors, using pq_nbits={usable} instead of {nbits}.")
+                self.index_params["pq_nbits"] = usable
+                self.index = self._new_index()
+        self.index.train(vectors)
+
+    def get_all_vectors(self):
+        """
+        Reconstruct every stored vector. Returns (ids, vectors).
+        """
+        self._flush_train_buffer()
+        n = self.index.ntotal
+        if n == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, self.dim), dtype=np.float32)
+
+        ids = _index_ids(self.index)
+        if isinstance(faiss.downcast_index(self.index), faiss.IndexIDMap):
+            inner = faiss.downcast_index(faiss.downcast_index(self.index).index)
+            return ids, inner.reconstruct_n(0, n)
+        if self.index_type == "ivf":
+            _ensure_ivf_id_lookup(self.index)
+            return ids, self.index.reconstruct_batch(ids)
+        return ids, self.index.reconstruct_n(0, n)
+
+    def reconstruct_vectors(self, ids) -> np.ndarray:
+        """
+        Stored (normalized) vectors for the given ids, in that order.
+        Approximate for sq8 / pq indexes without rescore. Raises RuntimeError
+        for ids the index doesn't hold (e.g. in a snapshot taken while IVF / PQ
+        vectors were still waiting for training).
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        if not self.read_only and not self.mmap:
+            self._flush_train_buffer()
+        if self.index_type == "ivf":
+            _ensure_ivf_id_lookup(self.index)
+        return self.index.reconstruct_batch(ids)
+
+    def rebuild_index(self, index_type: str, **index_params):
+        """
+        Migrate the stored vectors into a new index kind (e.g. flat -> ivf).
+        Ids are kept, so the chunk store stays valid as-is; vectors whose
+        chunk rows were removed (tombstones) are dropped here.
+        Moving out of sq8 / pq without rescore carries their quantization error.
+        """
+        self._check_writable("rebuild")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}'. Choose one of {INDEX_TYPES}.")
 
-        s = scores[0]      # flatten to 1D
-        idxs = indices[0]
+        ids, vectors = self.get_all_vectors()
+        live = np.isin(ids, self.chunks.all_ids())
+        ids, vectors = ids[live], vectors[live]
 
-        if len(s) == 0:
-            return []
+        self.index_type = index_type
+        self.index_params.update(index_params)
+        self.index = self._new_index()
+        self._filter_cache.clear()
+        self._mutations += 1
 
-        top = float(s[0])
-        second = float(s[1]) if len(s) > 1 else 0.0
-        if top < 0.05:          
-            return []
+        if len(vectors):
+            self._add_to_index(vectors, ids)
+        self._unsaved = []
+        self._unsaved_deletes = []
+        self._needs_compaction = True
 
-        # if abs(top - second) < 0.005:
-        #     return []
-        # removing these two lines causes significant changes to be observed
+        print(f"[Rebuild] {len(vectors)} vectors moved into a '{index_type}' index.")
 
-        results = []
-        for idx, score in zip(idxs, s):
-            if score < 0.15:
+    def search_vectors(self, query_vector: np.ndarray, k: int = 3, filters: dict = None):
+        return self.search_many_vectors(query_vector, k, filters)[0]
+
+    @traced("search_vectors")
+    def search_many_vectors(self, query_vectors: np.ndarray, k: int = 3, filters: dict = None):
+        """
+        One FAISS search over a (n, dim) query matrix.
+        Returns a result list per query row, with the same score thresholds
+        as a single search; chunk rows for all queries are fetched at once.
+        filters (keys in FILTER_KEYS) restrict hits to matching chunks inside
+        the search itself, so selective filters still return k hits.
+        """
+        self._flush_train_buffer()
+        query_vectors = np.ascontiguousarray(query_vectors, dtype=np.float32)
+        if query_vectors.ndim == 1:
+            query_vectors = query_vectors.reshape(1, -1)
+        faiss.normalize_L2(query_vectors)
+        if self.index.ntotal == 0:
+            return [[] for _ in query_vectors]
+        annotate(queries=len(query_vectors), filtered=int(bool(filters)))
+        with span("faiss_search"):
+            if filters:
+                scores, indices = self._search_filtered(query_vectors, k, self._filter_entry(filters))
+            else:
+                scores, indices = self.index.search(query_vectors, k)
+
+        per_query = []
+        for s, idxs in zip(scores, indices):
+            if len(s) == 0:
+                per_query.append([])
+                continue
+
+            top = float(s[0])
+            second = float(s[1]) if len(s) > 1 else 0.0
+            if top < 0.05:
+                per_query.append([])
                 continue
-            if 0 <= idx < len(self.documents):
+
+            # if abs(top - second) < 0.005:
+            #     return []
+            # removing these two lines causes significant changes to be observed
+
+            per_query.append([(int(idx), float(score)) for idx, score in zip(idxs, s) if idx >= 0 and score >= 0.15])
+
+        with span("metadata_lookup") as s:
+            rows = self.chunks.get_many({idx for hits in per_query for idx, _ in hits})
+            s.set(rows=len(rows))
+
+        all_results = []
+        for hits in per_query:
+            results = []
+            for idx, score in hits:
+                row = rows.get(idx)
+                if row is None:
+                    continue
                 results.append({
                     "id": idx,
-                    "text": self.documents[idx],
-                    "doc_path": self.doc_paths[idx],
-                    "chunk_id": self.chunk_ids[idx],
-                    "score": float(score)
+                    "text": row["text"],
+                    "doc_path": row["doc_path"],
+                    "chunk_id": row["chunk_id"],
+                    "score": score
                 })
-        
-        return results
+            all_results.append(results)
+
+        self._attach_sources(all_results)
+        return all_results
+
+    def _attach_sources(self, result_lists: list[list[dict]]):
+        """
+        Hits that near-duplicates were folded into get "also_in": the other
+        documents that contain them.
+        """
+        if not self.dedup.has_sources():
+            return
+        sources = self.dedup.sources({r["id"] for results in result_lists for r in results})
+        for results in result_lists:
+            for r in results:
+                others = [doc for doc, _, _ in sources.get(r["id"], ()) if doc != r["doc_path"]]
+                if others:
+                    r["also_in"] = list(dict.fromkeys(others))
 
     
+    def _filter_entry(self, filters: dict) -> dict:
+        """
+        Resolve filters to the matching ids + a bitmap over vector ids.
+        Cached until vectors are added or removed. No vectors are read here:
+        BM25 only needs the mask.
+        """
+        unknown = set(filters) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter(s) {sorted(unknown)}. Choose from {FILTER_KEYS}.")
+        key = tuple(sorted(
+            (name, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+            for name, value in filters.items() if value is not None
+        ))
+        entry = self._filter_cache.get(key)
+        if entry is not None:
+            self._filter_cache.move_to_end(key)
+            return entry
+
+        ids = self.chunks.ids_matching(**{name: value for name, value in filters.items() if value is not None})
+        mask = np.zeros(max(self.next_id, int(ids.max()) + 1 if len(ids) else 0, 1), dtype=bool)
+        mask[ids] = True
+        bitmap = np.packbits(mask, bitorder="little")
+        entry = {
+            "ids": ids,
+            "mask": mask,
+            "bitmap": bitmap,   # must outlive the selector, which only points at it
+            "selector": faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)),
+            "vectors": None,    # small subsets: reconstructed by the first vector search
+        }
+
+        self._filter_cache[key] = entry
+        if len(self._filter_cache) > FILTER_CACHE_SIZE:
+            self._filter_cache.popitem(last=False)
+        return entry
+
+    def _search_filtered(self, query_vectors: np.ndarray, k: int, entry: dict):
+        selector_ok = self.index_type in ("flat", "ivf", "hnsw") or (
+            self.index_type == "sq8" and not self.index_params["rescore"]
+        )
+        small = len(entry["ids"]) <= SUBSET_SCAN_MAX
+        if not small and selector_ok:
+            if self.index_type == "ivf":
+                params = faiss.SearchParametersIVF(sel=entry["selector"], nprobe=self.index_params["nprobe"])
+            elif self.index_type == "hnsw":
+                params = faiss.SearchParametersHNSW(sel=entry["selector"], efSearch=self.index_params["ef_search"])
+            else:
+                params = faiss.SearchParameters(sel=entry["selector"])
+            return self.index.search(query_vectors, k, params=params)
+        # small subsets, and PQ / rescoring indexes (no selector support in FAISS)
+        if small and entry["vectors"] is None:
+            entry["vectors"] = self.reconstruct_vectors(entry["ids"])
+        return self._scan_subset(query_vectors, k, entry["ids"], entry["vectors"])
+
+    def _scan_subset(self, query_vectors: np.ndarray, k: int, ids: np.ndarray, vectors: np.ndarray = None):
+        """
+        Exact inner-product top-k over the given ids only, in blocks.
+        Same output layout as index.search (id -1 for empty slots).
+        """
+        n = len(query_vectors)
+        best_scores = np.full((n, k), -np.inf, dtype=np.float32)
+        best_ids = np.full((n, k), -1, dtype=np.int64)
+        for lo in range(0, len(ids), SUBSET_SCAN_BLOCK):
+            block_ids = ids[lo:lo + SUBSET_SCAN_BLOCK]
+            block = vectors[lo:lo + SUBSET_SCAN_BLOCK] if vectors is not None else self.index.reconstruct_batch(block_ids)
+            scores = np.hstack([best_scores, query_vectors @ block.T])
+            cand = np.hstack([best_ids, np.broadcast_to(block_ids, (n, len(block_ids)))])
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_ids = np.take_along_axis(cand, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_scores, order, axis=1), np.take_along_axis(best_ids, order, axis=1)
+
     def get_index_path(self):
         return self.index_path
     
     @staticmethod
-    def reset_index(index_path,model_name):
+    def reset_index(index_path, model_name, dim: int = None, index_type: str = None, index_params: dict = None):
         """
         Completely wipes FAISS index + metadata.
         After calling this, the system has zero documents.
+        The dimension, index kind and index params of the old index are kept
+        unless given.
         """
         meta_path = index_path + ".meta"
+        old = {}
+        if os.path.exists(meta_path):
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    old = json.load(f)
+            except (OSError, ValueError):
+                old = {}
+        dim = dim or old.get("dim") or 384
+        index_type = index_type or old.get("index_type", "flat")
+        index_params = {**old.get("index_params", {}), **(index_params or {})}
         print('Index and Meta File found\nRemoving...')
         
-        # Remove files if they exist
-        if os.path.exists(index_path):
-            os.remove(index_path)
-        if os.path.exists(meta_path):
-            os.remove(meta_path)
+        # Remove files if they exist (including SQLite's -wal / -shm side files)
+        for path in (index_path, meta_path, index_path + ".log", index_path + ".bm25", index_path + ".db", index_path + ".db-wal", index_path + ".db-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+
+        # Fresh empty index of the same kind; the new meta gets a new generation,
+        # so cached answers for the old index never match
+        empty = FaissStore(dim, index_path=index_path, model_name=model_name, index_type=index_type, **index_params)
+        empty.save_index(compact=True)
+        empty.chunks.close()
+        empty.dedup.close()
+
+        print("[OK] Index fully reset.")
 
-        # Create fresh empty index
-        dim = 384
-        empty_index = faiss.IndexFlatIP(dim)
 
-        faiss.write_index(empty_index, index_path)
+def _is_ivf(index) -> bool:
+    try:
+        faiss.extract_index_ivf(index)
+        return True
+    except RuntimeError:
+        return False
 
-        # Empty meta.json
-        with open(meta_path, "w", encoding="utf-8") as f:
-            json.dump({"dim": dim, "embedding_model": model_name, "chunks": []}, f, indent=4)
 
-        print("[OK] Index fully reset.")
\ No newline at end of file
+def _has_explicit_ids(index) -> bool:
+    return isinstance(faiss.downcast_index(index), faiss.IndexIDMap) or _is_ivf(index)
+
+
+def _ensure_ivf_id_lookup(index):
+    """
+    Hashtable direct map: lets IVF reconstruct / remove by arbitrary id.
+    """
+    ivf = faiss.extract_index_ivf(index)
+    if ivf.direct_map.type != faiss.DirectMap.Hashtable:
+        ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+
+
+def _index_ids(index) -> np.ndarray:
+    """
+    All vector ids held by an index (positions for pre-IDMap indexes).
+    """
+    idx = faiss.downcast_index(index)
+    if isinstance(idx, faiss.IndexIDMap):
+        return faiss.vector_to_array(idx.id_map).astype(np.int64)
+    if _is_ivf(index):
+        invlists = faiss.extract_index_ivf(index).invlists
+        parts = [
+            faiss.rev_swig_ptr(invlists.get_ids(l), invlists.list_size(l)).copy()
+            for l in range(invlists.nlist) if invlists.list_size(l)
+        ]
+        return np.concatenate(parts).astype(np.int64) if parts else np.zeros(0, dtype=np.int64)
+    return np.arange(index.ntotal, dtype=np.int64)
+
+
+def _fsync_file(path: str):
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+def _atomic_write_index(index, path: str):
+    """
+    Write to a temp file and rename over the target, so readers and a
+    crash mid-write only ever see the old or the new complete file.
+    """
+    tmp = path + ".tmp"
+    faiss.write_index(index, tmp)
+    _fsync_file(tmp)
+    os.replace(tmp, path)
+
+
+def _atomic_write_json(obj, path: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
@@ -0,0 +1,94 @@
+import time
+import faiss
+import numpy as np
+
+from storage.faiss_store import FaissStore, INDEX_PATH
+
+# Settings swept by default. Each entry is (index_type, build params, search params to sweep).
+DEFAULT_SWEEP = [
+    ("ivf", {}, [{"nprobe": n} for n in (1, 4, 16, 64)]),
+    ("hnsw", {}, [{"ef_search": ef} for ef in (16, 32, 64, 128)]),
+    ("sq8", {}, [{}]),
+    ("sq8", {"rescore": True}, [{"rescore_k_factor": f} for f in (2, 4)]),
+    ("pq", {}, [{}]),
+    ("pq", {"rescore": True}, [{"rescore_k_factor": f} for f in (4, 16)]),
+]
+
+
+def _latencies(index, queries: np.ndarray, k: int):
+    """Run queries one at a time (like the CLI does) and time each one."""
+    times, ids = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, I = index.search(q.reshape(1, -1), k)
+        times.append((time.perf_counter() - t0) * 1000)
+        ids.append(I[0])
+    return np.array(times), np.vstack(ids)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+    return hits / max(1, int((truth >= 0).sum()))
+
+
+def recall_report(store: FaissStore, queries: np.ndarray = None, k: int = 10, num_queries: int = 200, sweep=None):
+    """
+    Compare approximate index kinds against the exact flat baseline.
+    Queries default to a random sample of the stored vectors.
+    Returns a list of rows: index_type, params, recall@k, p50 / p99 latency (ms).
+    """
+    _, vectors = store.get_all_vectors()
+    ids = np.arange(len(vectors), dtype=np.int64)
+    if len(vectors) == 0:
+        print("[Report] Index is empty, nothing to compare.")
+        return []
+
+    if queries is None:
+        rng = np.random.default_rng(0)
+        pick = rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)
+        queries = vectors[pick]
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+    faiss.normalize_L2(queries)
+
+    # exact baseline
+    flat = FaissStore(store.dim, index_path="", index_type="flat")
+    flat._add_to_index(vectors, ids)
+    base_ms, truth = _latencies(flat.index, queries, k)
+
+    rows = [{
+        "index_type": "flat", "params": {}, "recall": 1.0,
+        "p50_ms": float(np.percentile(base_ms, 50)), "p99_ms": float(np.percentile(base_ms, 99)),
+    }]
+
+    for index_type, build_params, search_grid in (sweep or DEFAULT_SWEEP):
+        candidate = FaissStore(store.dim, index_path="", index_type=index_type, **build_params)
+        t0 = time.perf_counter()
+        candidate._add_to_index(vectors, ids)
+        candidate._flush_train_buffer()
+        build_s = time.perf_counter() - t0
+
+        for search_params in search_grid:
+            candidate.set_search_params(**search_params)
+            ms, found = _latencies(candidate.index, queries, k)
+            rows.append({
+                "index_type": index_type,
+                "params": {**build_params, **search_params},
+                "recall": _recall(found, truth),
+                "p50_ms": float(np.percentile(ms, 50)),
+                "p99_ms": float(np.percentile(ms, 99)),
+                "build_s": build_s,
+            })
+
+    print(f"\nRecall@{k} vs latency ({len(vectors)} vectors, {len(queries)} queries)\n")
+    print(f"  {'index':<6} {'params':<36} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for r in rows:
+        params = ",".join(f"{key}={val}" for key, val in r["params"].items()) or "-"
+        print(f"  {r['index_type']:<6} {params:<36} {r['recall']:>7.3f} {r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f}")
+    print()
+
+    return rows
+
+
+if __name__ == "__main__":
+    # run from the project root: PYTHONPATH=src python -m storage.index_report
+    recall_report(FaissStore(index_path=INDEX_PATH))
@@ -0,0 +1,128 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+PENDING, DONE, FAILED = "pending", "done", "failed"
+
+
+class JobStore:
+    """
+    Ingest jobs and the status of each of their files (pending / done /
+    failed with a reason), stored in the chunk store's SQLite file next to
+    the sync manifest. A file is marked done only after the index holding
+    its vectors has been saved, so a resumed job never skips lost work.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+            " id TEXT PRIMARY KEY,"
+            " root TEXT,"
+            " status TEXT,"
+            " options TEXT,"
+            " created_at REAL,"
+            " updated_at REAL,"
+            " seconds REAL DEFAULT 0,"
+            " runs INTEGER DEFAULT 0)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ingest_job_files ("
+            " job_id TEXT,"
+            " path TEXT,"
+            " status TEXT,"
+            " error TEXT,"
+            " num_chunks INTEGER DEFAULT 0,"
+            " updated_at REAL,"
+            " PRIMARY KEY (job_id, path))"
+        )
+        self.conn.commit()
+
+    def create(self, root: str, paths: list[str], options: dict = None) -> str:
+        job_id = uuid.uuid4().hex[:8]
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO ingest_jobs (id, root, status, options, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, root, PENDING, json.dumps(options or {}), now, now),
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO ingest_job_files (job_id, path, status, updated_at) VALUES (?, ?, ?, ?)",
+                [(job_id, p, PENDING, now) for p in paths],
+            )
+        return job_id
+
+    def get(self, job_id: str) -> dict:
+        """
+        The job's row plus per-status file counts, or None.
+        """
+        row = self.conn.execute(
+            "SELECT id, root, status, options, created_at, updated_at, seconds, runs FROM ingest_jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row[0], "root": row[1], "status": row[2], "options": json.loads(row[3] or "{}"),
+            "created_at": row[4], "updated_at": row[5], "seconds": row[6], "runs": row[7],
+            PENDING: 0, DONE: 0, FAILED: 0,
+        }
+        for status, n in self.conn.execute(
+                "SELECT status, COUNT(*) FROM ingest_job_files WHERE job_id = ? GROUP BY status", (job_id,)):
+            job[status] = n
+        job["chunks"] = self.conn.execute(
+            "SELECT COALESCE(SUM(num_chunks), 0) FROM ingest_job_files WHERE job_id = ? AND status = ?",
+            (job_id, DONE),
+        ).fetchone()[0]
+        return job
+
+    def list_jobs(self) -> list[dict]:
+        ids = [r[0] for r in self.conn.execute("SELECT id FROM ingest_jobs ORDER BY created_at")]
+        return [self.get(i) for i in ids]
+
+    def paths(self, job_id: str, status: str) -> list[str]:
+        cur = self.conn.execute(
+            "SELECT path FROM ingest_job_files WHERE job_id = ? AND status = ? ORDER BY rowid", (job_id, status))
+        return [r[0] for r in cur]
+
+    def failures(self, job_id: str) -> dict:
+        cur = self.conn.execute(
+            "SELECT path, error FROM ingest_job_files WHERE job_id = ? AND status = ? ORDER BY rowid",
+            (job_id, FAILED),
+        )
+        return {r[0]: r[1] for r in cur}
+
+    def mark(self, job_id: str, results: list[tuple]):
+        """
+        results: (path, status, error, num_chunks) per finished file.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE ingest_job_files SET status = ?, error = ?, num_chunks = ?, updated_at = ?"
+                " WHERE job_id = ? AND path = ?",
+                [(status, error, num_chunks, now, job_id, path) for path, status, error, num_chunks in results],
+            )
+
+    def requeue_failed(self, job_id: str) -> int:
+        with self.conn:
+            cur = self.conn.execute(
+                "UPDATE ingest_job_files SET status = ?, error = NULL, updated_at = ? WHERE job_id = ? AND status = ?",
+                (PENDING, time.time(), job_id, FAILED),
+            )
+        return cur.rowcount
+
+    def update(self, job_id: str, status: str = None, seconds: float = 0.0, new_run: bool = False):
+        with self.conn:
+            self.conn.execute(
+                "UPDATE ingest_jobs SET status = COALESCE(?, status), seconds = seconds + ?, runs = runs + ?,"
+                " updated_at = ? WHERE id = ?",
+                (status, seconds, int(new_run), time.time(), job_id),
+            )
+
+    def close(self):
+        self.conn.close()
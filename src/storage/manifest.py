@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import time
+
+
+class Manifest:
+    """
+    Per-file record of what the index holds (path, size, mtime, content hash),
+    stored in the chunk store's SQLite file. Used by sync to skip unchanged
+    files and to find files that were deleted from disk.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY,"
+            " size INTEGER,"
+            " mtime REAL,"
+            " sha256 TEXT,"
+            " num_chunks INTEGER,"
+            " synced_at REAL)"
+        )
+        self.conn.commit()
+
+    def entries(self, prefix: str = "") -> dict:
+        """
+        {path: {"size", "mtime", "sha256", "num_chunks"}} for paths under prefix.
+        """
+        cur = self.conn.execute(
+            "SELECT path, size, mtime, sha256, num_chunks FROM files WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix),
+        )
+        return {r[0]: {"size": r[1], "mtime": r[2], "sha256": r[3], "num_chunks": r[4]} for r in cur}
+
+    def upsert(self, path: str, size: int, mtime: float, sha256: str, num_chunks: int):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime, sha256, num_chunks, synced_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (path, size, mtime, sha256, num_chunks, time.time()),
+            )
+
+    def remove(self, paths):
+        with self.conn:
+            self.conn.executemany("DELETE FROM files WHERE path = ?", [(p,) for p in paths])
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM files")
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,271 @@
+import os
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+from storage.faiss_store import FaissStore
+
+
+class Shard:
+    """
+    One FaissStore plus what readers should search while it is under
+    maintenance: rebuild / reset first hand readers a snapshot, wait for
+    in-flight searches on the live store, then modify it.
+    """
+
+    def __init__(self, store: FaissStore):
+        self.store = store
+        self._view = store
+        self._active = 0
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+
+    @contextmanager
+    def reading(self):
+        with self._cond:
+            view = self._view
+            if view is self.store:
+                self._active += 1
+        try:
+            yield view
+        finally:
+            if view is self.store:
+                with self._cond:
+                    self._active -= 1
+                    self._cond.notify_all()
+
+    @contextmanager
+    def maintenance(self):
+        with self._write_lock:
+            snap = self.store.snapshot()
+            with self._cond:
+                self._view = snap
+                self._cond.wait_for(lambda: self._active == 0)
+            try:
+                yield self.store
+            finally:
+                with self._cond:
+                    self._view = self.store
+
+
+class ShardedStore:
+    """
+    One collection split over several FaissStore shards
+    (<dir>/shard_000.faiss, ...). All chunks of a document go to the same
+    shard (hash of doc_path), so removing a document touches one shard.
+    Searches fan out to every shard on a thread pool (FAISS releases the
+    GIL while searching) and the per-shard top-k are merged by score.
+    Vector ids are global: local id * num_shards + shard number.
+    Offers the FaissStore methods used by ingest, sync and Retriever.
+    """
+
+    def __init__(self, directory: str, num_shards: int, dim: int = 384,
+                 model_name: str = "sentence-transformers/all-MiniLM-L12-v2",
+                 index_type: str = "flat", mmap: bool = False, **index_params):
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+        self.directory = directory
+        self.num_shards = num_shards
+        self.dim = dim
+        self.model_name = model_name
+        self.index_type = index_type
+        self.mmap = mmap
+        self.read_only = False
+        self.index_path = os.path.join(directory, "shard_*.faiss")
+        self.db_path = os.path.join(directory, "manifest.db")   # sync manifest for the whole collection
+        self.shards = [
+            Shard(FaissStore(dim, index_path=self.shard_path(i), model_name=model_name,
+                             index_type=index_type, mmap=mmap, **index_params))
+            for i in range(num_shards)
+        ]
+        self.chunks = _ShardedChunks(self)
+        self._pool = ThreadPoolExecutor(max_workers=num_shards, thread_name_prefix="shard")
+
+    def shard_path(self, i: int) -> str:
+        return os.path.join(self.directory, f"shard_{i:03d}.faiss")
+
+    def shard_for(self, doc_path: str) -> int:
+        return zlib.crc32((doc_path or "").encode("utf-8")) % self.num_shards
+
+    def _to_global(self, shard: int, local_ids) -> list[int]:
+        return [int(i) * self.num_shards + shard for i in local_ids]
+
+    def _split(self, ids) -> dict:
+        by_shard = {}
+        for i in ids:
+            by_shard.setdefault(int(i) % self.num_shards, []).append(int(i) // self.num_shards)
+        return by_shard
+
+    # ----- FaissStore interface -----
+
+    @property
+    def ntotal(self) -> int:
+        return sum(s.store.ntotal for s in self.shards)
+
+    @property
+    def version(self) -> str:
+        return "|".join(s.store.version for s in self.shards)
+
+    def add_vectors(self, vectors: np.ndarray, texts: list[str], file_path: str = None, embedder_model: str = None, offsets: list[tuple] = None,
+                    dedup_keys: list = None):
+        self._check_writable("ingest")
+        self.shards[self.shard_for(file_path)].store.add_vectors(
+            vectors, texts, file_path=file_path, embedder_model=embedder_model, offsets=offsets, dedup_keys=dedup_keys)
+
+    def dedup_chunks(self, texts: list[str], file_path: str = None, offsets: list[tuple] = None):
+        """
+        Near-duplicates are looked up in the document's own shard only.
+        """
+        self._check_writable("ingest")
+        return self.shards[self.shard_for(file_path)].store.dedup_chunks(texts, file_path=file_path, offsets=offsets)
+
+    def cancel_dedup(self):
+        for s in self.shards:
+            s.store.cancel_dedup()
+
+    def has_doc(self, doc_path: str) -> bool:
+        return self.shards[self.shard_for(doc_path)].store.has_doc(doc_path)
+
+    def remove_ids(self, ids) -> int:
+        self._check_writable("delete")
+        return sum(self.shards[s].store.remove_ids(local) for s, local in self._split(ids).items())
+
+    def remove_doc(self, doc_path: str) -> int:
+        self._check_writable("delete")
+        return self.shards[self.shard_for(doc_path)].store.remove_doc(doc_path)
+
+    def save_index(self, compact: bool = None):
+        self._check_writable("save")
+        for s in self.shards:
+            s.store.save_index(compact=compact)
+
+    def compact(self):
+        self.save_index(compact=True)
+
+    def rebuild_index(self, index_type: str, **index_params):
+        """
+        Rebuild shard by shard; while one shard is rebuilt, queries read
+        its snapshot and the other shards as usual.
+        """
+        for i in range(self.num_shards):
+            self.rebuild_shard(i, index_type, **index_params)
+        self.index_type = index_type
+
+    def rebuild_shard(self, i: int, index_type: str = None, **index_params):
+        self._check_writable("rebuild")
+        with self.shards[i].maintenance() as store:
+            store.rebuild_index(index_type or store.index_type, **index_params)
+            store.save_index()
+
+    def reset_shard(self, i: int):
+        """
+        Empty one shard (its documents are gone from the collection).
+        """
+        self._check_writable("reset")
+        with self.shards[i].maintenance() as store:
+            store._reset_state()
+            store.save_index(compact=True)
+        print(f"[Shards] Shard {i} reset.")
+
+    def set_search_params(self, nprobe: int = None, ef_search: int = None, rescore_k_factor: int = None):
+        for s in self.shards:
+            s.store.set_search_params(nprobe=nprobe, ef_search=ef_search, rescore_k_factor=rescore_k_factor)
+
+    def snapshot(self, base: "ShardedStore" = None) -> "ShardedStore":
+        snap = ShardedStore.__new__(ShardedStore)
+        snap.__dict__.update(self.__dict__)
+        bases = [b.store for b in base.shards] if base is not None else [None] * len(self.shards)
+        snap.shards = [Shard(s.store.snapshot(b)) for s, b in zip(self.shards, bases)]
+        snap.chunks = _ShardedChunks(snap)
+        snap.read_only = True
+        return snap
+
+    def _check_writable(self, action: str):
+        if self.read_only:
+            raise ValueError(f"[ERROR] This is a read-only snapshot. Use the writer store to {action}.")
+
+    # ----- fan-out search -----
+
+    def _fan_out(self, fn):
+        """
+        Run fn(shard number, store) on every shard in parallel.
+        """
+        def run(i):
+            with self.shards[i].reading() as store:
+                return fn(i, store)
+        return list(self._pool.map(run, range(self.num_shards)))
+
+    def _merge(self, per_shard: list[list[dict]], k: int) -> list[dict]:
+        merged = []
+        for shard, results in enumerate(per_shard):
+            for r in results:
+                merged.append({**r, "id": r["id"] * self.num_shards + shard, "shard": shard})
+        merged.sort(key=lambda r: -r["score"])
+        return merged[:k]
+
+    def search_vectors(self, query_vector: np.ndarray, k: int = 3, filters: dict = None):
+        return self.search_many_vectors(query_vector, k, filters)[0]
+
+    def search_many_vectors(self, query_vectors: np.ndarray, k: int = 3, filters: dict = None):
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        if query_vectors.ndim == 1:
+            query_vectors = query_vectors.reshape(1, -1)
+        # each shard normalizes its own copy in place
+        per_shard = self._fan_out(lambda i, store: store.search_many_vectors(query_vectors.copy(), k, filters))
+        return [self._merge([results[q] for results in per_shard], k) for q in range(len(query_vectors))]
+
+    def search_lexical(self, query: str, k: int = 3, filters: dict = None):
+        """
+        BM25 per shard, merged by score (IDF is per shard, so scores are
+        comparable as long as documents are spread evenly).
+        """
+        return self._merge(self._fan_out(lambda i, store: store.search_lexical(query, k, filters)), k)
+
+    def reconstruct_vectors(self, ids) -> np.ndarray:
+        ids = np.asarray(ids, dtype=np.int64)
+        out = np.zeros((len(ids), self.dim), dtype=np.float32)
+        shard_of = ids % self.num_shards
+        for shard in np.unique(shard_of):
+            rows = np.flatnonzero(shard_of == shard)
+            with self.shards[shard].reading() as store:
+                out[rows] = store.reconstruct_vectors(ids[rows] // self.num_shards)
+        return out
+
+    def get_all_vectors(self):
+        ids, vectors = [], []
+        for i, s in enumerate(self.shards):
+            local, vecs = s.store.get_all_vectors()
+            ids.append(local * self.num_shards + i)
+            vectors.append(vecs)
+        return np.concatenate(ids), np.vstack(vectors)
+
+
+class _ShardedChunks:
+    """
+    The parts of ChunkStore that callers use on a collection, over global ids.
+    """
+
+    def __init__(self, sharded: ShardedStore):
+        self.sharded = sharded
+
+    def __len__(self):
+        return sum(len(s.store.chunks) for s in self.sharded.shards)
+
+    def ids_for_doc(self, doc_path: str) -> list[int]:
+        shard = self.sharded.shard_for(doc_path)
+        return self.sharded._to_global(shard, self.sharded.shards[shard].store.chunks.ids_for_doc(doc_path))
+
+    def all_ids(self) -> np.ndarray:
+        n = self.sharded.num_shards
+        return np.concatenate([s.store.chunks.all_ids() * n + i for i, s in enumerate(self.sharded.shards)])
+
+    def get_many(self, ids) -> dict:
+        rows = {}
+        for shard, local in self.sharded._split(ids).items():
+            for i, row in self.sharded.shards[shard].store.chunks.get_many(local).items():
+                gid = i * self.sharded.num_shards + shard
+                rows[gid] = {**row, "id": gid}
+        return rows
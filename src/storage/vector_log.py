@@ -0,0 +1,88 @@
+import os
+import struct
+import numpy as np
+
+# add record    = header (b"VLOG", first vector id, count) + count * dim float32
+# delete record = header (b"VDEL", 0, count) + count * int64 ids
+_HEADER = struct.Struct("<4sQI")
+_MAGIC = b"VLOG"
+_MAGIC_DELETE = b"VDEL"
+
+
+class VectorLog:
+    """
+    Append-only log of vectors added (and ids removed) since the last full index write.
+    Each save appends one record and fsyncs it, so ingest cost grows with
+    the new data only. A torn record at the tail (crash mid-append) is
+    ignored on replay and cut off before the next append.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.num_vectors = 0    # vectors in complete add records
+        self.num_deleted = 0    # ids in complete delete records
+        self._good_bytes = 0    # file offset after the last complete record
+
+    def append(self, start_id: int, vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._write(_MAGIC, start_id, len(vectors), vectors.tobytes())
+        self.num_vectors += len(vectors)
+
+    def append_delete(self, ids):
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self._write(_MAGIC_DELETE, 0, len(ids), ids.tobytes())
+        self.num_deleted += len(ids)
+
+    def _write(self, magic: bytes, start_id: int, n: int, payload: bytes):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+        with open(self.path, "ab") as f:
+            if f.tell() != self._good_bytes:
+                f.truncate(self._good_bytes)
+                f.seek(self._good_bytes)
+            f.write(_HEADER.pack(magic, start_id, n))
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            self._good_bytes = f.tell()
+
+    def replay(self):
+        """
+        Yield ("add", start_id, vectors) / ("delete", None, ids) for every
+        complete record, in order.
+        """
+        self.num_vectors = 0
+        self.num_deleted = 0
+        self._good_bytes = 0
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rb") as f:
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                magic, start_id, n = _HEADER.unpack(header)
+                size = n * (self.dim * 4 if magic == _MAGIC else 8)
+                payload = f.read(size)
+                if magic not in (_MAGIC, _MAGIC_DELETE) or len(payload) < size:
+                    print(f"[WARN] Ignoring torn record at the end of {self.path}")
+                    break
+                self._good_bytes = f.tell()
+                if magic == _MAGIC:
+                    self.num_vectors += n
+                    yield "add", start_id, np.frombuffer(payload, dtype=np.float32).reshape(n, self.dim)
+                else:
+                    self.num_deleted += n
+                    yield "delete", None, np.frombuffer(payload, dtype=np.int64)
+
+    def clear(self):
+        """
+        Drop all records (after they were compacted into the base index).
+        """
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.num_vectors = 0
+        self.num_deleted = 0
+        self._good_bytes = 0
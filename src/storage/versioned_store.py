@@ -0,0 +1,103 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from storage.faiss_store import FaissStore
+
+PUBLISH_EVERY = 10.0    # seconds between snapshot swaps during a long write job
+PUBLISH_SHARE = 0.05    # ... stretched so building snapshots takes at most this share of the writer's time
+
+
+class VersionedStore:
+    """
+    Snapshot isolation for one process that serves queries while it ingests.
+
+    Readers call current() and search the returned FaissStore snapshot,
+    which is immutable. All writes run as jobs on one background writer
+    thread against the private writer store. After a job (and every
+    PUBLISH_EVERY seconds during long ingests) a fresh snapshot is built
+    off the query path and swapped in with a single reference assignment,
+    so a reader sees either the old or the new version, never a mix.
+    A snapshot costs a copy of the FAISS index, so publishes are skipped
+    when nothing changed and spaced out further as the index grows; BM25
+    postings that didn't change are shared with the previous version.
+    Holds two copies of the index in memory while both versions are live.
+    """
+
+    def __init__(self, store: FaissStore, publish_every: float = PUBLISH_EVERY):
+        self.writer = store
+        self.publish_every = publish_every
+        self.version = 0
+        self._current = store.snapshot()
+        self._published_at = time.monotonic()
+        self._publish_seconds = 0.0     # how long the last snapshot took to build
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        self._publish_lock = threading.Lock()
+
+    def current(self) -> FaissStore:
+        """
+        The latest published snapshot. Keep using the same object for the
+        whole request; call current() again for the next one.
+        """
+        return self._current
+
+    def publish(self):
+        """
+        Make everything the writer has added so far visible to new readers.
+        Called on the writer thread (or when no job is running). A no-op
+        when the writer hasn't changed since the current version.
+        """
+        with self._publish_lock:
+            if self.writer.version == self._current.version:
+                self._published_at = time.monotonic()
+                return
+            t0 = time.monotonic()
+            snap = self.writer.snapshot(self._current)
+            self.version += 1
+            self._current = snap
+            self._published_at = time.monotonic()
+            self._publish_seconds = self._published_at - t0
+        print(f"[VersionedStore] Published version {self.version} ({snap.ntotal} vectors, "
+              f"{self._publish_seconds * 1000:.0f} ms).")
+
+    def publish_interval(self) -> float:
+        """
+        Seconds between publishes during a job: publish_every, or longer once
+        building a snapshot of this index takes more than PUBLISH_SHARE of that.
+        """
+        return max(self.publish_every, self._publish_seconds / PUBLISH_SHARE)
+
+    def maybe_publish(self):
+        if time.monotonic() - self._published_at >= self.publish_interval():
+            self.publish()
+
+    def submit(self, job, *args, save: bool = True, **kwargs):
+        """
+        Run job(writer_store, *args, **kwargs) on the writer thread, then
+        save the index and publish a new version. Returns a Future.
+        """
+        def run():
+            try:
+                return job(self.writer, *args, **kwargs)
+            finally:
+                if save:
+                    self.writer.save_index()
+                self.publish()
+        return self._pool.submit(run)
+
+    def ingest_paths(self, paths: list[str], embedder, **ingest_kwargs):
+        """
+        Background ingest; partial results become searchable every
+        publish_every seconds, at file boundaries. Returns a Future of IngestStats.
+        """
+        from ingestion.parallel import ingest_paths_parallel
+
+        def job(store):
+            def on_file_done(path, num_chunks, error):
+                self.maybe_publish()
+            return ingest_paths_parallel(paths, store, embedder, on_file_done=on_file_done, **ingest_kwargs)
+
+        return self.submit(job)
+
+    def close(self):
+        self._pool.shutdown(wait=True)
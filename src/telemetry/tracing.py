@@ -0,0 +1,302 @@
+"""
+Lightweight tracing: timed spans around the pipeline stages, aggregated
+into counters / histograms (Prometheus text or JSON) and optionally
+written as one JSON line per span.
+
+Off by default. Turn it on with LURA_TRACE=1 (metrics only) and/or
+LURA_TRACE_LOG=<file or "-" for stderr> (metrics + structured logs), or
+call enable(). When off, a traced function costs one flag check.
+
+Summarize a span log written by any process:
+    PYTHONPATH=src python -m telemetry.tracing trace.jsonl
+"""
+import atexit
+import bisect
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+# histogram bucket upper bounds, seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RECENT_SAMPLES = 1024       # durations kept per span name for p50 / p99
+
+_current = contextvars.ContextVar("lura_span", default=None)
+_log_lock = threading.Lock()
+
+
+class _State:
+    enabled = False
+    log = None              # open file for structured logs, or None
+
+
+_state = _State()
+
+
+class _Metric:
+    __slots__ = ("count", "errors", "total", "buckets", "recent", "attrs")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)     # last one is +Inf
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+        self.attrs = {}                             # numeric attribute -> running sum
+
+
+class Registry:
+    """
+    Per span name: call count, error count, total seconds, a latency
+    histogram, recent durations and sums of numeric attributes
+    (e.g. vectors, completion_tokens).
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float, attrs: dict, error: bool = False):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = _Metric()
+            m.count += 1
+            m.errors += error
+            m.total += seconds
+            m.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            m.recent.append(seconds)
+            for key, value in attrs.items():
+                # rates don't add up; stats() derives them from the sums instead
+                if isinstance(value, (int, float)) and not isinstance(value, bool) and not key.endswith("_per_s"):
+                    m.attrs[key] = m.attrs.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def stats(self) -> dict:
+        out = {}
+        with self._lock:
+            for name, m in sorted(self._metrics.items()):
+                recent = sorted(m.recent)
+                entry = {
+                    "count": m.count,
+                    "errors": m.errors,
+                    "total_s": round(m.total, 6),
+                    "mean_ms": round(m.total / m.count * 1000, 3),
+                    "p50_ms": round(_quantile(recent, 0.50) * 1000, 3),
+                    "p99_ms": round(_quantile(recent, 0.99) * 1000, 3),
+                }
+                entry.update({key: round(v, 6) for key, v in m.attrs.items()})
+                if m.attrs.get("completion_tokens") and m.attrs.get("decode_s"):
+                    entry["tokens_per_s"] = round(m.attrs["completion_tokens"] / m.attrs["decode_s"], 2)
+                out[name] = entry
+        return out
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP lura_span_seconds Time spent in each pipeline stage.",
+            "# TYPE lura_span_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self._metrics.items())
+            for name, m in items:
+                cumulative = 0
+                for bound, n in zip(BUCKETS + ("+Inf",), m.buckets):
+                    cumulative += n
+                    lines.append(f'lura_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'lura_span_seconds_sum{{span="{name}"}} {m.total:.6f}')
+                lines.append(f'lura_span_seconds_count{{span="{name}"}} {m.count}')
+            lines += ["# HELP lura_span_errors_total Spans that ended with an exception.",
+                      "# TYPE lura_span_errors_total counter"]
+            lines += [f'lura_span_errors_total{{span="{name}"}} {m.errors}' for name, m in items]
+            lines += ["# HELP lura_span_attribute_total Sum of numeric span attributes (items, tokens, ...).",
+                      "# TYPE lura_span_attribute_total counter"]
+            for name, m in items:
+                for key, value in sorted(m.attrs.items()):
+                    lines.append(f'lura_span_attribute_total{{span="{name}",attribute="{key}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "parent", "started", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        parent = _current.get()
+        self.parent = parent.name if parent else None
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        _current.reset(self._token)
+        registry.record(self.name, seconds, self.attrs, error=exc_type is not None)
+        if _state.log is not None:
+            record = {"ts": round(time.time(), 6), "trace": self.trace_id, "span": self.name,
+                      "parent": self.parent, "duration_ms": round(seconds * 1000, 3), **self.attrs}
+            if exc_type is not None:
+                record["error"] = exc_type.__name__
+            _write_log(record)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    """
+    with span("search_vectors", k=5) as s: ...; s.set(hits=3)
+    """
+    if not _state.enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def traced(name: str):
+    """
+    Decorator: run the function inside span(name).
+    """
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            with Span(name, {}):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def record(name: str, seconds: float, **attrs):
+    """
+    Record a span timed elsewhere (e.g. in a worker process).
+    """
+    if not _state.enabled:
+        return
+    parent = _current.get()
+    registry.record(name, seconds, attrs)
+    if _state.log is not None:
+        _write_log({"ts": round(time.time(), 6), "trace": parent.trace_id if parent else uuid.uuid4().hex[:16],
+                    "span": name, "parent": parent.name if parent else None,
+                    "duration_ms": round(seconds * 1000, 3), **attrs})
+
+
+def annotate(**attrs):
+    """
+    Add attributes to the innermost open span (no-op when tracing is off).
+    """
+    if _state.enabled:
+        current = _current.get()
+        if current is not None:
+            current.attrs.update(attrs)
+
+
+def enabled() -> bool:
+    return _state.enabled
+
+
+def enable(log_path: str = None):
+    """
+    Start recording spans; log_path also writes one JSON line per span
+    ("-" for stderr).
+    """
+    if log_path == "-":
+        _state.log = sys.stderr
+    elif log_path:
+        # buffered; flushed by disable() and at exit
+        _state.log = open(log_path, "a", encoding="utf-8")
+    _state.enabled = True
+
+
+def disable():
+    _state.enabled = False
+    with _log_lock:
+        if _state.log is not None and _state.log is not sys.stderr:
+            _state.log.close()
+        _state.log = None
+
+
+def stats() -> dict:
+    return registry.stats()
+
+
+def prometheus_text() -> str:
+    return registry.prometheus()
+
+
+
+def _write_log(record: dict):
+    line = json.dumps(record, default=str)
+    with _log_lock:
+        log = _state.log
+        if log is not None:
+            log.write(line + "\n")
+
+
+def _quantile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(log_path: str) -> dict:
+    """
+    Aggregate a structured span log into the same shape as stats().
+    """
+    reg = Registry()
+    with open(log_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            attrs = {k: v for k, v in record.items()
+                     if k not in ("ts", "trace", "span", "parent", "duration_ms", "error")}
+            reg.record(record["span"], record["duration_ms"] / 1000, attrs, error="error" in record)
+    return reg.stats()
+
+
+atexit.register(disable)
+
+if os.environ.get("LURA_TRACE_LOG"):
+    enable(os.environ["LURA_TRACE_LOG"])
+elif os.environ.get("LURA_TRACE", "").lower() in ("1", "true", "on", "yes"):
+    enable()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: PYTHONPATH=src python -m telemetry.tracing <span log .jsonl>")
+        sys.exit(1)
+    print(json.dumps(summarize(sys.argv[1]), indent=2))
@@ -0,0 +1,58 @@
+import os
+import re
+import sys
+
+import numpy as np
+import pytest
+
+# modules are imported the way the app runs them: rooted at src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from benchmarks.fakes import FakeEmbeddingModel  # noqa: E402
+
+DIM = 32
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "vector_index.faiss")
+
+
+@pytest.fixture
+def embedder():
+    return FakeEmbeddingModel(model_name="test/fake-embedder", dim=DIM)
+
+
+def make_store(index_path, index_type="flat", **index_params):
+    from storage.faiss_store import FaissStore
+    return FaissStore(DIM, index_path=index_path, model_name="test/fake-embedder", index_type=index_type,
+                      **index_params)
+
+
+def add_doc(store, embedder, doc_path, texts):
+    store.add_vectors(embedder.embed_texts(texts), texts, file_path=doc_path, embedder_model=embedder.model_name,
+                      offsets=[(i, i + 1) for i in range(len(texts))])
+
+
+def doc_texts(name, n):
+    return [f"{name} chunk {i} about topic{i} and word{i * 7}" for i in range(n)]
+
+
+class WhitespaceEncoding:
+    """
+    tiktoken stand-in (the real encodings are downloaded on first use):
+    one token per word, with its leading space.
+    """
+
+    def encode(self, text):
+        return re.findall(r" ?\S+", text)
+
+    def decode_tokens_bytes(self, tokens):
+        return [t.encode("utf-8") for t in tokens]
+
+
+@pytest.fixture
+def offline_tokenizer(monkeypatch):
+    # ingest worker processes are forked, so they inherit the patch
+    import ingestion.chunker
+    monkeypatch.setattr(ingestion.chunker, "get_encoding", lambda name="cl100k_base": WhitespaceEncoding())
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from conftest import DIM, make_store, add_doc, doc_texts
+
+import pipeline.retrieve as retrieve
+from benchmarks.fakes import FakeEmbeddingModel
+from interface.api import LuraService, QueryBatcher, HTTPError
+from pipeline.retrieve import Retriever
+
+
+@pytest.fixture
+def service(index_path, embedder, monkeypatch):
+    store = make_store(index_path)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 5))
+    store.save_index()
+    monkeypatch.setattr(retrieve, "EmbeddingModel", lambda *a, **kw: FakeEmbeddingModel("test/fake-embedder", DIM))
+    Retriever._instance = None
+    yield LuraService(index_path=index_path, load_llm=False)
+    Retriever._instance = None
+
+
+def with_batcher(service, coro_fn):
+    async def go():
+        service.batcher = QueryBatcher(service, window_ms=50)
+        task = asyncio.create_task(service.batcher.run())
+        try:
+            return await coro_fn()
+        finally:
+            task.cancel()
+    return asyncio.run(go())
+
+
+@pytest.mark.parametrize("body", [
+    {"k": 0},
+    {"k": "3"},
+    {"mode": "semantic"},
+    {"filters": ["path_prefix"]},
+    {"filters": {"bogus": 1}},
+])
+def test_bad_search_params_are_400(service, body):
+    service.llm = object()   # rag checks its params before touching the LLM
+    for handler, field in ((service.search, "query"), (service.rag, "question")):
+        with pytest.raises(HTTPError) as err:
+            with_batcher(service, lambda: handler({field: "a chunk 1", **body}))
+        assert err.value.status == 400
+
+
+def test_failing_query_does_not_fail_its_batch(service):
+    async def queries():
+        # straight to the batcher, past the handler checks
+        return await asyncio.gather(
+            service.batcher.search("a chunk 1", 2, "dense", None),
+            service.batcher.search("a chunk 2", 2, "dense", {"bogus": 1}),
+            service.batcher.search("a chunk 3", 2, "hybrid", {"path_prefix": "/docs"}),
+            service.batcher.search("a chunk 4", 2, "lexical", {"bogus": 1}),
+            return_exceptions=True,
+        )
+
+    ok, bad, ok_filtered, bad_lexical = with_batcher(service, queries)
+    assert service.batcher.batches == 1
+    assert len(ok) == 2 and len(ok_filtered) == 2
+    assert isinstance(bad, ValueError) and isinstance(bad_lexical, ValueError)
@@ -0,0 +1,19 @@
+from conftest import make_store, add_doc, doc_texts
+
+from cli import read_index_header
+
+
+def test_header_counts_log_vectors_once(index_path, embedder):
+    store = make_store(index_path)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 10))
+    store.save_index(compact=True)
+    add_doc(store, embedder, "/docs/b.txt", doc_texts("b", 5))
+    store.save_index(compact=False)
+
+    header = read_index_header(index_path)
+    assert header["vectors"] == 15
+    assert make_store(index_path).ntotal == 15
+
+
+def test_header_without_index(index_path):
+    assert read_index_header(index_path) is None
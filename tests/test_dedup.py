@@ -0,0 +1,49 @@
+from conftest import make_store
+
+BOILERPLATE = ("This document is provided for information only and does not constitute legal advice. "
+               "All rights reserved. No part of this publication may be reproduced, stored in a retrieval system "
+               "or transmitted in any form without the prior written permission of the publisher. ")
+
+
+def _ingest(store, embedder, doc_path, texts):
+    offsets = [(i * 100, i * 100 + 99) for i in range(len(texts))]
+    keep, keys = store.dedup_chunks(texts, file_path=doc_path, offsets=offsets)
+    kept = [texts[i] for i in keep]
+    if kept:
+        store.add_vectors(embedder.embed_texts(kept), kept, file_path=doc_path, embedder_model=embedder.model_name,
+                          offsets=[offsets[i] for i in keep], dedup_keys=keys)
+    return keep
+
+
+def _unique(name):
+    return f"{name} " + " ".join(f"{name}word{i}" for i in range(40))
+
+
+def test_near_duplicates_fold_into_one_vector(index_path, embedder):
+    store = make_store(index_path)
+    assert _ingest(store, embedder, "/docs/a.txt", [BOILERPLATE + "Edition 1.", _unique("alpha")]) == [0, 1]
+    store.save_index()
+    # one word differs: still a near-duplicate
+    assert _ingest(store, embedder, "/docs/b.txt", [BOILERPLATE + "Edition 2.", _unique("beta")]) == [1]
+    store.save_index()
+    assert store.ntotal == 3
+
+    reloaded = make_store(index_path)
+    hit = reloaded.search_vectors(embedder.embed_query(BOILERPLATE), k=1)[0]
+    assert hit["doc_path"] == "/docs/a.txt"
+    assert hit["also_in"] == ["/docs/b.txt"]
+    assert reloaded.has_doc("/docs/b.txt")
+
+    # the shared chunk outlives the document it was first stored under
+    reloaded.remove_doc("/docs/a.txt")
+    reloaded.save_index()
+    hit = make_store(index_path).search_vectors(embedder.embed_query(BOILERPLATE), k=1)[0]
+    assert hit["doc_path"] == "/docs/b.txt"
+    assert not hit.get("also_in")
+
+
+def test_copies_within_one_ingest_are_caught(index_path, embedder):
+    store = make_store(index_path)
+    assert _ingest(store, embedder, "/docs/a.txt", [BOILERPLATE, _unique("alpha"), BOILERPLATE]) == [0, 1]
+    store.save_index()
+    assert make_store(index_path).ntotal == 2
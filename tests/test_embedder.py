@@ -0,0 +1,41 @@
+import numpy as np
+
+import encoder.embedder as embedder_module
+from encoder.embedder import EmbeddingModel
+
+
+class _Backend:
+    dim = 4
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+        self.calls = 0
+
+    def encode(self, texts, batch_size):
+        self.calls += 1
+        return np.full((len(texts), self.dim), self.value, dtype=np.float32)
+
+    def set_threads(self, n):
+        pass
+
+
+def _model(monkeypatch, tmp_path, name, value):
+    backend = _Backend(name, value)
+    monkeypatch.setattr(embedder_module, "load_backend", lambda *a: backend)
+    monkeypatch.setattr(embedder_module, "load_tuning", lambda *a, **kw: {})
+    model = EmbeddingModel("test/model", cache_path=str(tmp_path / "cache.db"), backend=name, validate=False)
+    return model, backend
+
+
+def test_cache_is_kept_apart_per_backend(monkeypatch, tmp_path):
+    torch_model, torch_backend = _model(monkeypatch, tmp_path, "torch", 1.0)
+    assert torch_model.embed_texts(["same chunk"])[0, 0] == 1.0
+
+    int8_model, int8_backend = _model(monkeypatch, tmp_path, "int8", 2.0)
+    assert int8_model.embed_texts(["same chunk"])[0, 0] == 2.0
+    assert int8_backend.calls == 1
+
+    # each backend still hits its own rows
+    assert torch_model.embed_texts(["same chunk"])[0, 0] == 1.0
+    assert torch_backend.calls == 1
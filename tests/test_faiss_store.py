@@ -0,0 +1,141 @@
+import pytest
+
+from conftest import DIM, make_store, add_doc, doc_texts
+
+import storage.faiss_store as faiss_store
+from storage.faiss_store import FaissStore
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf", "pq"])
+def test_reset_keeps_index_kind(index_path, embedder, index_type):
+    params = {"nlist": 4} if index_type == "ivf" else {"pq_m": 8} if index_type == "pq" else {"hnsw_m": 16}
+    store = make_store(index_path, index_type, **params)
+    if index_type == "hnsw":
+        add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 5))
+    store.save_index()
+
+    FaissStore.reset_index(index_path, store.model_name)
+
+    reloaded = make_store(index_path)     # kind comes from the meta, not the argument
+    assert reloaded.index_type == index_type
+    assert reloaded.ntotal == 0
+    for key, value in params.items():
+        assert reloaded.index_params[key] == value
+    assert reloaded.dim == DIM
+
+
+def test_snapshot_keeps_rows_deleted_later(index_path, embedder):
+    store = make_store(index_path)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 5))
+    add_doc(store, embedder, "/docs/b.txt", doc_texts("b", 5))
+    store.save_index()
+    snap = store.snapshot()
+
+    store.remove_doc("/docs/a.txt")
+    store.save_index()
+
+    query = embedder.embed_query(doc_texts("a", 5)[2])
+    hits = snap.search_vectors(query, k=3)
+    assert hits and hits[0]["doc_path"] == "/docs/a.txt"
+    assert hits[0]["text"] == doc_texts("a", 5)[2]
+    assert not any(h["doc_path"] == "/docs/a.txt" for h in store.search_vectors(query, k=3))
+
+
+def test_snapshot_survives_reset_and_reingest(index_path, embedder):
+    store = make_store(index_path)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 5))
+    store.save_index()
+    snap = store.snapshot()
+
+    # ids restart at 0 with other text
+    store._reset_state()
+    add_doc(store, embedder, "/docs/z.txt", doc_texts("z", 5))
+    store.save_index()
+
+    hits = snap.search_vectors(embedder.embed_query(doc_texts("a", 5)[0]), k=5)
+    assert {h["doc_path"] for h in hits} == {"/docs/a.txt"}
+    assert hits[0]["text"] == doc_texts("a", 5)[0]
+
+
+def test_appended_vectors_replay_on_load(index_path, embedder):
+    store = make_store(index_path)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 10))
+    store.save_index(compact=True)
+    add_doc(store, embedder, "/docs/b.txt", doc_texts("b", 5))
+    store.save_index(compact=False)
+    assert store.vector_log.num_vectors == 5
+
+    reloaded = make_store(index_path)
+    assert reloaded.ntotal == 15
+    assert len(reloaded.chunks) == 15
+    hits = reloaded.search_vectors(embedder.embed_query(doc_texts("b", 5)[3]), k=1)
+    assert hits[0]["doc_path"] == "/docs/b.txt"
+    assert hits[0]["text"] == doc_texts("b", 5)[3]
+
+    # compaction folds the log into the base index without changing results
+    reloaded.compact()
+    assert reloaded.vector_log.num_vectors == 0
+    again = make_store(index_path)
+    assert again.ntotal == 15
+    assert again.search_vectors(embedder.embed_query(doc_texts("b", 5)[3]), k=1)[0]["id"] == hits[0]["id"]
+
+
+def test_ivf_trains_once_enough_vectors_arrive(index_path, embedder):
+    store = make_store(index_path, "ivf", nlist=4, nprobe=4)
+    for d in range(20):
+        add_doc(store, embedder, f"/docs/{d}.txt", doc_texts(f"d{d}", 10))
+    store.save_index()
+
+    reloaded = make_store(index_path)
+    assert reloaded.index_type == "ivf"
+    assert reloaded.ntotal == 200
+    assert reloaded.search_vectors(embedder.embed_query(doc_texts("d7", 10)[4]), k=1)[0]["doc_path"] == "/docs/7.txt"
+
+
+@pytest.mark.parametrize("index_type", ["flat", "hnsw"])
+def test_remove_doc(index_path, embedder, index_type):
+    store = make_store(index_path, index_type)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 6))
+    add_doc(store, embedder, "/docs/b.txt", doc_texts("b", 6))
+    store.save_index()
+
+    assert store.remove_doc("/docs/a.txt") == 6
+    store.save_index()
+
+    for s in (store, make_store(index_path)):
+        assert len(s.chunks) == 6
+        assert not s.has_doc("/docs/a.txt")
+        hits = s.search_vectors(embedder.embed_query(doc_texts("a", 6)[1]), k=6)
+        assert hits and all(h["doc_path"] == "/docs/b.txt" for h in hits)
+        assert all(h["doc_path"] == "/docs/b.txt" for h in s.search_lexical("a chunk 1", k=6))
+    if index_type == "flat":
+        assert make_store(index_path).ntotal == 6
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw"])
+@pytest.mark.parametrize("scan_max", [0, 10_000])
+def test_filtered_search_matches_filtering_afterwards(index_path, embedder, monkeypatch, index_type, scan_max):
+    # scan_max 0: every subset goes through the FAISS selector; else the small-subset scan
+    monkeypatch.setattr(faiss_store, "SUBSET_SCAN_MAX", scan_max)
+    params = {"nlist": 2, "nprobe": 2} if index_type == "ivf" else {}
+    store = make_store(index_path, index_type, **params)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 60))
+    add_doc(store, embedder, "/other/b.txt", doc_texts("b", 60))
+    query = embedder.embed_query(doc_texts("a", 60)[7])
+
+    everything = store.search_vectors(query.copy(), k=store.ntotal)
+    expected = [r for r in everything if r["doc_path"].startswith("/docs")][:5]
+    found = store.search_vectors(query.copy(), k=5, filters={"path_prefix": "/docs"})
+    # the fake embedder gives many chunks the same score: ids may swap within a tie
+    assert [round(r["score"], 4) for r in found] == [round(r["score"], 4) for r in expected]
+    assert all(r["doc_path"] == "/docs/a.txt" for r in found)
+    assert [r["id"] for r in found[:2]] == [r["id"] for r in expected[:2]]
+
+
+def test_filtered_lexical_search_on_untrained_ivf(index_path, embedder):
+    store = make_store(index_path, "ivf", nlist=16)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 20))
+    add_doc(store, embedder, "/other/b.txt", doc_texts("b", 20))
+    hits = store.search_lexical("chunk", k=10, filters={"path_prefix": "/docs"})
+    assert hits and all(r["doc_path"] == "/docs/a.txt" for r in hits)
+    assert not store.index.is_trained
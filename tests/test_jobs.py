@@ -0,0 +1,79 @@
+import os
+import subprocess
+import sys
+import textwrap
+from collections import Counter
+
+from conftest import DIM, make_store
+
+from ingestion.jobs import resume_job
+from storage.job_store import JobStore, DONE, PENDING
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(TESTS), "src")
+
+# runs a job in a child process whose embedder kills it (no cleanup) on its 6th batch
+KILLED_RUN = textwrap.dedent("""
+    import os, sys
+    sys.path[:0] = [{src!r}, {tests!r}]
+    import ingestion.chunker
+    from conftest import WhitespaceEncoding, make_store
+    from benchmarks.fakes import FakeEmbeddingModel
+    from ingestion.jobs import start_job
+    ingestion.chunker.get_encoding = lambda name="cl100k_base": WhitespaceEncoding()
+
+    class Dying(FakeEmbeddingModel):
+        calls = 0
+        def embed_texts(self, texts, use_cache=True):
+            Dying.calls += 1
+            if Dying.calls > 5:
+                os._exit(9)
+            return super().embed_texts(texts)
+
+    start_job({docs!r}, make_store({index!r}), Dying("test/fake-embedder", {dim}),
+              workers=1, batch_size=4, checkpoint_files=2, checkpoint_every=1e9)
+""")
+
+
+def _make_docs(directory, n):
+    os.makedirs(directory)
+    for i in range(n):
+        with open(os.path.join(directory, f"f{i:02d}.txt"), "w", encoding="utf-8") as f:
+            # 1100 words -> 3 chunks of at most 500 tokens with 50 overlap
+            f.write(" ".join(f"file{i} w{j}" for j in range(550)))
+    with open(os.path.join(directory, "broken.pdf"), "wb") as f:
+        f.write(b"not a pdf")
+
+
+def test_resume_after_kill(tmp_path, index_path, embedder, offline_tokenizer):
+    docs = str(tmp_path / "docs")
+    _make_docs(docs, 12)
+
+    code = KILLED_RUN.format(src=SRC, tests=TESTS, docs=docs, index=index_path, dim=DIM)
+    killed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    assert killed.returncode == 9, killed.stdout + killed.stderr
+
+    jobs = JobStore(index_path + ".db")
+    job = jobs.list_jobs()[-1]
+    committed = set(jobs.paths(job["id"], DONE))
+    assert 0 < len(committed) < 12 and job[PENDING] > 0
+    jobs.close()
+
+    embedded = []
+    original = embedder.embed_texts
+    embedder.embed_texts = lambda texts, use_cache=True: embedded.extend(texts) or original(texts)
+
+    store = make_store(index_path)
+    summary = resume_job(job["id"], store, embedder)
+    # committed files are not embedded again
+    assert len(embedded) == 3 * (12 - len(committed))
+    assert summary["status"] == "done"
+    assert summary["done"] == 12 and summary["pending"] == 0
+    assert list(summary["failed"]) == [os.path.join(docs, "broken.pdf")]
+
+    # every file exactly once: nothing lost at the kill, nothing embedded twice
+    reloaded = make_store(index_path)
+    rows = reloaded.chunks.get_many(reloaded.chunks.all_ids())
+    per_file = Counter(r["doc_path"] for r in rows.values())
+    assert len(per_file) == 12 and set(per_file.values()) == {3}
+    assert reloaded.ntotal == 36
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import DIM, make_store, add_doc, doc_texts
+
+import pipeline.retrieve as retrieve
+from benchmarks.fakes import FakeEmbeddingModel
+from pipeline.retrieve import Retriever, diversify_results
+
+
+@pytest.fixture
+def retriever_index(index_path, embedder, monkeypatch):
+    store = make_store(index_path)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 5))
+    store.save_index()
+    monkeypatch.setattr(retrieve, "EmbeddingModel", lambda *a, **kw: FakeEmbeddingModel("test/fake-embedder", DIM))
+    Retriever._instance = None
+    yield index_path
+    Retriever._instance = None
+
+
+def test_options_apply_to_live_instance(retriever_index):
+    first = Retriever(index_path=retriever_index)
+    assert (first.mode, first.top_k) == ("dense", 5)
+
+    second = Retriever(mode="hybrid", top_k=2, mmr_lambda=None)
+    assert second is first
+    assert (first.mode, first.top_k, first.mmr_lambda) == ("hybrid", 2, None)
+    assert len(first.search("a chunk 1")) == 2
+
+    # not given: left as they are
+    Retriever()
+    assert (first.mode, first.top_k) == ("hybrid", 2)
+
+
+def test_conflicting_index_raises(retriever_index, tmp_path):
+    Retriever(index_path=retriever_index)
+    with pytest.raises(ValueError):
+        Retriever(index_path=str(tmp_path / "other.faiss"))
+    with pytest.raises(ValueError):
+        Retriever(mmap=True)
+
+
+def test_mmr_on_untrained_ivf(index_path, embedder):
+    store = make_store(index_path, "ivf", nlist=16)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 20))
+    assert not store.index.is_trained
+
+    # the snapshot's BM25 has the chunks, its index doesn't (yet): relevance order
+    snap = store.snapshot()
+    hits = snap.search_lexical("chunk", k=10)
+    assert diversify_results([hits], 3, snap, relative=True) == [hits[:3]]
+
+    # the writer trains on what it has buffered and diversifies as usual
+    hits = store.search_lexical("chunk", k=10)
+    picked = diversify_results([hits], 3, store, relative=True)[0]
+    assert store.index.is_trained
+    assert len(picked) == 3 and {r["id"] for r in picked} <= {r["id"] for r in hits}
@@ -0,0 +1,52 @@
+from conftest import make_store, add_doc, doc_texts
+
+from storage.versioned_store import VersionedStore
+
+
+def test_publish_skips_unchanged_writer(index_path, embedder):
+    store = make_store(index_path)
+    add_doc(store, embedder, "/docs/a.txt", doc_texts("a", 5))
+    versions = VersionedStore(store)
+    first = versions.current()
+
+    versions.publish()
+    assert versions.version == 0 and versions.current() is first
+
+    add_doc(store, embedder, "/docs/b.txt", doc_texts("b", 5))
+    versions.publish()
+    assert versions.version == 1 and versions.current().ntotal == 10
+    assert first.ntotal == 5
+    versions.close()
+
+
+def test_snapshot_shares_unchanged_postings(index_path, embedder):
+    store = make_store(index_path)
+    add_doc(store, embedder, "/docs/a.txt", ["alpha beta", "alpha gamma"])
+    versions = VersionedStore(store)
+    first = versions.current()
+
+    add_doc(store, embedder, "/docs/b.txt", ["alpha delta"])
+    versions.publish()
+    second = versions.current()
+    # untouched by the add: the same arrays; appended to: a new copy
+    assert second.lexical.postings["beta"] is first.lexical.postings["beta"]
+    assert second.lexical.postings["alpha"] is not first.lexical.postings["alpha"]
+    assert len(first.search_lexical("alpha", k=10)) == 2
+    assert len(second.search_lexical("alpha", k=10)) == 3
+
+    # compaction rewrites posting lists: nothing is shared across it
+    store.remove_doc("/docs/a.txt")
+    store.save_index(compact=True)
+    versions.publish()
+    third = versions.current()
+    assert third.lexical.postings["delta"] is not second.lexical.postings["delta"]
+    assert [r["doc_path"] for r in third.search_lexical("alpha", k=10)] == ["/docs/b.txt"]
+    versions.close()
+
+
+def test_publish_interval_grows_with_snapshot_cost(index_path):
+    versions = VersionedStore(make_store(index_path), publish_every=10.0)
+    assert versions.publish_interval() == 10.0
+    versions._publish_seconds = 2.0
+    assert versions.publish_interval() == 40.0
+    versions.close()